@@ -0,0 +1,351 @@
+import base64
+import io
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import matplotlib.dates as mdates
+from matplotlib.artist import setp
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RENDER_OPTIONS = {
+    'width_inches': 12,
+    'height_inches': 8,
+    'figure_dpi': 100,   # Layout DPI of the figure
+    'dpi': 150,          # Output DPI of the PNG
+    'max_points': 2000   # Longer series are reduced to about this many points before plotting (None disables)
+}
+
+SERIES_COLORS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd']
+
+_local = threading.local()
+
+
+def _get_figure(options):
+    """Per-thread (or per-process) figure, cleared and reused across renders instead of recreated"""
+    size = (options['width_inches'], options['height_inches'])
+    fig = getattr(_local, 'figure', None)
+    if fig is None or tuple(fig.get_size_inches()) != size or fig.dpi != options['figure_dpi']:
+        fig = Figure(figsize=size, dpi=options['figure_dpi'])
+        FigureCanvasAgg(fig)
+        _local.figure = fig
+    else:
+        fig.clear()
+    fig.patch.set_facecolor('white')
+    return fig
+
+
+def downsample_indices(y_arrays, max_points):
+    """Row indices that keep the min and max of each bucket of every series, so peaks survive.
+
+    Returns None when the series are already short enough.
+    """
+    n = len(y_arrays[0]) if y_arrays else 0
+    if not max_points or n <= max_points:
+        return None
+    buckets = max(1, max_points // (2 * len(y_arrays)))
+    width = -(-n // buckets)
+    starts = np.arange(buckets) * width
+    keep = [np.array([0, n - 1])]
+    for y in y_arrays:
+        # Pad to equal-width buckets; the padding never wins a min or max
+        lows = np.concatenate([y, np.full(buckets * width - n, np.inf)]).reshape(buckets, width)
+        highs = np.concatenate([y, np.full(buckets * width - n, -np.inf)]).reshape(buckets, width)
+        keep.append(starts + lows.argmin(axis=1))
+        keep.append(starts + highs.argmax(axis=1))
+    keep = np.unique(np.concatenate(keep))
+    return keep[keep < n]
+
+
+def prepare_series(columns, column_arrays, graph_config, max_points=None):
+    """Extract (and optionally downsample) the x values and numeric y series a graph config refers to.
+
+    column_arrays holds one NumPy array per result column (see columnar.to_column_arrays).
+    Returns None if nothing plottable remains.
+    """
+    x_col_idx = graph_config['x_col']
+    row_count = len(column_arrays[0]) if column_arrays else 0
+    if not row_count or x_col_idx >= len(columns):
+        logger.error(f"X column index {x_col_idx} out of range. Max index: {len(columns) - 1}")
+        return None
+
+    x_array = column_arrays[x_col_idx]
+    x_name = columns[x_col_idx].lower()
+    # Hour:minute tick labels are used for DATETIME values and parsed date strings, not for plain DATEs
+    x_is_time = False
+    if 'date' in x_name:
+        if x_array.dtype.kind == 'M':
+            x_values = pd.Series(x_array)
+            x_is_time = np.datetime_data(x_array.dtype)[0] != 'D'
+        elif isinstance(x_array[0], str):
+            x_values = pd.to_datetime(pd.Series(x_array), errors='coerce')
+            x_is_time = True
+        else:
+            x_values = pd.Series(x_array)
+    elif 'hour' in x_name or 'block' in x_name:
+        x_values = pd.Series(x_array) if x_array.dtype.kind in 'iuf' else pd.to_numeric(pd.Series(x_array), errors='coerce')
+    else:
+        x_values = pd.Series(np.arange(row_count))
+
+    series = []
+    for i, y_col_idx in enumerate(graph_config['y_cols']):
+        if y_col_idx >= len(columns):
+            logger.warning(f"Y column index {y_col_idx} out of range. Skipping.")
+            continue
+        y_array = column_arrays[y_col_idx]
+        if y_array.dtype.kind in 'iuf':
+            y_numeric = y_array.astype(np.float64)
+        else:
+            y_numeric = pd.to_numeric(pd.Series(y_array), errors='coerce').to_numpy(dtype=np.float64)
+        valid = ~np.isnan(y_numeric)
+        if not valid.any():
+            logger.warning(f"No valid numeric data in column {graph_config['y_labels'][i]}")
+            continue
+        series.append((graph_config['y_labels'][i], np.where(valid, y_numeric, 0.0)))
+    if not series:
+        logger.error("No data was successfully plotted")
+        return None
+
+    indices = downsample_indices([y for _, y in series], max_points)
+    if indices is not None:
+        x_values = x_values.iloc[indices]
+        series = [(label, y[indices]) for label, y in series]
+    return {
+        'x_values': x_values.reset_index(drop=True),
+        'x_is_time': x_is_time,
+        'series': series,
+        'source_rows': row_count
+    }
+
+
+def lttb_indices(x, y, threshold):
+    """Largest-Triangle-Three-Buckets: indices of ``threshold`` points that best preserve the series shape"""
+    n = len(y)
+    if not threshold or threshold >= n or threshold < 3:
+        return np.arange(n)
+    every = (n - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[avg_start:avg_end].mean()
+        avg_y = y[avg_start:avg_end].mean()
+
+        range_start = int(i * every) + 1
+        range_end = int((i + 1) * every) + 1
+        areas = np.abs((x[a] - avg_x) * (y[range_start:range_end] - y[a])
+                       - (x[a] - x[range_start:range_end]) * (avg_y - y[a]))
+        a = range_start + int(areas.argmax())
+        indices[i + 1] = a
+    return indices
+
+
+def _json_x_values(x_values, with_time=True):
+    if 'datetime' in str(x_values.dtype):
+        return [None if pd.isna(v) else (v.isoformat() if with_time else v.date().isoformat()) for v in x_values]
+    if x_values.dtype == object:
+        return [v.isoformat() if hasattr(v, 'isoformat') else v for v in x_values]
+    return [None if pd.isna(v) else v for v in x_values.tolist()]
+
+
+def chart_data(columns, column_arrays, graph_config, max_points=1000):
+    """Columnar series for client-side charting, LTTB-reduced to at most ``max_points`` points.
+
+    Buckets are chosen on the first series and shared by the others so all series keep one x axis.
+    """
+    prepared = prepare_series(columns, column_arrays, graph_config)
+    if prepared is None:
+        return None
+    x_values = prepared['x_values']
+    if 'datetime' in str(x_values.dtype):
+        x_numeric = x_values.astype('int64').to_numpy(dtype=np.float64)
+    elif x_values.dtype.kind in 'iuf' and not x_values.isna().any():
+        x_numeric = x_values.to_numpy(dtype=np.float64)
+    else:
+        x_numeric = np.arange(len(x_values), dtype=np.float64)
+
+    indices = lttb_indices(x_numeric, prepared['series'][0][1], max_points)
+    return {
+        'x': _json_x_values(x_values.iloc[indices], with_time=prepared['x_is_time']),
+        'series': [{'label': label, 'values': y[indices].tolist()} for label, y in prepared['series']],
+        'points': len(indices),
+        'source_points': prepared['source_rows']
+    }
+
+
+def render_series(prepared, graph_config, options):
+    """Render prepared series to PNG bytes with the object-oriented Figure/Agg API.
+
+    Runs on a pool worker; no pyplot global state is touched.
+    """
+    fig = _get_figure(options)
+    try:
+        ax = fig.add_subplot(111)
+        x_values = prepared['x_values']
+        for i, (y_label, y) in enumerate(prepared['series']):
+            color = SERIES_COLORS[i % len(SERIES_COLORS)]
+            if graph_config['type'] == 'area':
+                ax.fill_between(x_values, y, alpha=0.6, label=y_label, color=color)
+                ax.plot(x_values, y, linewidth=2, color=color, alpha=0.8)
+            else:  # line
+                ax.plot(x_values, y, marker='o', markersize=3, linewidth=2, label=y_label, color=color)
+
+        ax.set_title("Market Data Analysis", fontsize=16, fontweight='bold', pad=20)
+        ax.set_xlabel(graph_config['x_label'], fontsize=12, fontweight='bold')
+        ax.set_ylabel(', '.join(graph_config['y_labels']), fontsize=12, fontweight='bold')
+
+        if prepared['x_is_time'] and 'datetime' in str(x_values.dtype):
+            ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
+            ax.xaxis.set_major_locator(mdates.HourLocator(interval=max(1, len(x_values) // 10)))
+            setp(ax.xaxis.get_majorticklabels(), rotation=45, ha='right')
+        elif 'block' in graph_config['x_label'].lower():
+            # For time blocks, show every nth tick
+            step = max(1, len(x_values) // 20)
+            ax.set_xticks(x_values[::step])
+            setp(ax.xaxis.get_majorticklabels(), rotation=45, ha='right')
+
+        ax.legend(fontsize=10, loc='best')
+        ax.grid(True, alpha=0.3, linestyle='-', linewidth=0.5)
+        ax.set_facecolor('#f8f9fa')
+        ax.margins(x=0.02, y=0.05)
+        fig.tight_layout()
+
+        img_buffer = io.BytesIO()
+        fig.savefig(img_buffer, format='png', dpi=options['dpi'], bbox_inches='tight',
+                    facecolor='white', edgecolor='none', pad_inches=0.2)
+        return img_buffer.getvalue()
+    finally:
+        # Drop the artists now so the reused figure doesn't hold on to the data between renders
+        fig.clear()
+
+
+class ChartRenderer:
+    """Renders graphs on a worker pool using per-worker reusable Agg figures.
+
+    Series extraction and downsampling happen on the calling thread, so only the reduced
+    series are handed to the pool (which keeps pickling cheap when ``use_processes`` is set).
+    """
+
+    def __init__(self, max_workers=2, use_processes=False, timeout=60, **options):
+        self.options = dict(DEFAULT_RENDER_OPTIONS, **options)
+        self.timeout = timeout
+        self.use_processes = use_processes
+        if use_processes:
+            self._executor = ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='chart-render')
+        self._lock = threading.Lock()
+        self.renders = 0
+        self.failures = 0
+        self.downsampled = 0
+        self.render_seconds = 0.0
+
+    def render(self, columns, column_arrays, graph_config):
+        """PNG bytes for the graph config, or None if nothing could be plotted"""
+        start = time.perf_counter()
+        try:
+            prepared = prepare_series(columns, column_arrays, graph_config, self.options['max_points'])
+            if prepared is None:
+                return None
+            future = self._executor.submit(render_series, prepared, graph_config, self.options)
+            png = future.result(timeout=self.timeout)
+        except Exception as e:
+            logger.error(f"Graph generation failed: {e}")
+            with self._lock:
+                self.failures += 1
+            return None
+        with self._lock:
+            self.renders += 1
+            self.render_seconds += time.perf_counter() - start
+            if len(prepared['x_values']) < prepared['source_rows']:
+                self.downsampled += 1
+        return png
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'renders': self.renders,
+                'failures': self.failures,
+                'downsampled': self.downsampled,
+                'avg_render_seconds': round(self.render_seconds / self.renders, 4) if self.renders else None,
+                'executor': 'process' if self.use_processes else 'thread',
+                'options': dict(self.options)
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _benchmark(requests_count=16, concurrency=4, row_count=5000):
+    """Wall time of concurrent renders: legacy pyplot path versus the pooled OO renderer"""
+    import datetime as dt
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from columnar import to_column_arrays
+
+    start_day = dt.datetime(2024, 1, 1)
+    rows = [(start_day + dt.timedelta(minutes=15 * i), float(3000 + 1500 * np.sin(i / 50)), float(i % 96))
+            for i in range(row_count)]
+    columns = ['Record_Date', 'MCP_Rs_MWh', 'Time_Block']
+    graph_config = {'type': 'line', 'x_col': 0, 'y_cols': [1], 'x_label': 'Record_Date', 'y_labels': ['MCP_Rs_MWh']}
+    pyplot_lock = threading.Lock()  # pyplot's global figure state is not thread-safe
+
+    def legacy_render():
+        with pyplot_lock:
+            plt.clf()
+            plt.close('all')
+            fig, ax = plt.subplots(figsize=(12, 8), dpi=100)
+            df = pd.DataFrame(rows, columns=columns)
+            ax.plot(df.iloc[:, 0], pd.to_numeric(df.iloc[:, 1], errors='coerce').fillna(0),
+                    marker='o', markersize=3, linewidth=2, label='MCP_Rs_MWh', color=SERIES_COLORS[0])
+            ax.set_title("Market Data Analysis", fontsize=16, fontweight='bold', pad=20)
+            ax.set_xlabel('Record_Date', fontsize=12, fontweight='bold')
+            ax.set_ylabel('MCP_Rs_MWh', fontsize=12, fontweight='bold')
+            ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
+            ax.xaxis.set_major_locator(mdates.HourLocator(interval=max(1, len(rows) // 10)))
+            ax.legend(fontsize=10, loc='best')
+            ax.grid(True, alpha=0.3, linestyle='-', linewidth=0.5)
+            ax.margins(x=0.02, y=0.05)
+            plt.tight_layout()
+            buffer = io.BytesIO()
+            plt.savefig(buffer, format='png', dpi=150, bbox_inches='tight',
+                        facecolor='white', edgecolor='none', pad_inches=0.2)
+            plt.close(fig)
+            return base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+    def timed(fn):
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            start = time.perf_counter()
+            list(pool.map(lambda _: fn(), range(requests_count)))
+            return time.perf_counter() - start
+
+    cases = [("pyplot (serialised)", legacy_render)]
+    renderers = [
+        ("Figure/Agg thread pool, full series", ChartRenderer(max_workers=concurrency, max_points=None)),
+        ("Figure/Agg thread pool, downsampled", ChartRenderer(max_workers=concurrency)),
+        ("Figure/Agg process pool, downsampled", ChartRenderer(max_workers=concurrency, use_processes=True)),
+    ]
+    for label, renderer in renderers:
+        renderer.render(columns, to_column_arrays(rows, len(columns)), graph_config)  # warm up outside the timed run
+        cases.append((label, lambda renderer=renderer: renderer.render(
+            columns, to_column_arrays(rows, len(columns)), graph_config)))
+
+    print(f"{requests_count} renders of {row_count} rows, {concurrency} concurrent requests")
+    for label, fn in cases:
+        seconds = timed(fn)
+        print(f"{label:40s} {seconds:7.2f}s total  {seconds / requests_count * 1000:8.1f} ms/render")
+    for _, renderer in renderers:
+        renderer.shutdown()
+
+
+if __name__ == '__main__':
+    _benchmark()
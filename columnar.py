@@ -0,0 +1,165 @@
+import datetime
+from decimal import Decimal
+import numpy as np
+from mysql.connector.constants import FieldType
+
+INTEGER_TYPES = {FieldType.TINY, FieldType.SHORT, FieldType.INT24, FieldType.LONG, FieldType.LONGLONG, FieldType.YEAR}
+FLOAT_TYPES = {FieldType.FLOAT, FieldType.DOUBLE}
+DECIMAL_TYPES = {FieldType.DECIMAL, FieldType.NEWDECIMAL}
+DATE_TYPES = {FieldType.DATE, FieldType.NEWDATE}
+DATETIME_TYPES = {FieldType.DATETIME, FieldType.TIMESTAMP}
+
+
+def _infer_kind(values):
+    """Array kind for a column without a MySQL type code, from the Python types of its values"""
+    present = [v for v in values if v is not None]
+    if not present:
+        return 'object'
+    if all(isinstance(v, (int, np.integer)) and not isinstance(v, bool) for v in present):
+        return 'int'
+    if all(isinstance(v, Decimal) for v in present):
+        return 'decimal'
+    if all(isinstance(v, (int, float, Decimal, np.integer, np.floating)) and not isinstance(v, bool) for v in present):
+        return 'float'
+    if all(isinstance(v, datetime.datetime) for v in present):
+        return 'datetime'
+    if all(isinstance(v, datetime.date) and not isinstance(v, datetime.datetime) for v in present):
+        return 'date'
+    return 'object'
+
+
+def _kind_for_type_code(type_code):
+    if type_code in INTEGER_TYPES:
+        return 'int'
+    if type_code in FLOAT_TYPES:
+        return 'float'
+    if type_code in DECIMAL_TYPES:
+        return 'decimal'
+    if type_code in DATE_TYPES:
+        return 'date'
+    if type_code in DATETIME_TYPES:
+        return 'datetime'
+    return 'object'
+
+
+def column_array(values, type_code=None):
+    """Typed NumPy array for one result column.
+
+    Integers become int64 (float64 with NaN if the column has NULLs), FLOAT/DOUBLE become
+    float64, DATE becomes datetime64[D], DATETIME/TIMESTAMP datetime64[us] (NULL -> NaT);
+    DECIMAL and everything else stay object arrays, so CSV exports keep exact decimal values
+    (chartrender.prepare_series converts them to float64 for plotting). The kind comes from
+    the MySQL type code when known, otherwise it is inferred from the values.
+    """
+    kind = _kind_for_type_code(type_code) if type_code is not None else _infer_kind(values)
+    try:
+        if kind == 'int':
+            if any(v is None for v in values):
+                return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+            return np.array(values, dtype=np.int64)
+        if kind == 'float':
+            return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        if kind == 'date':
+            return np.array(values, dtype='datetime64[D]')
+        if kind == 'datetime':
+            return np.array(values, dtype='datetime64[us]')
+    except (TypeError, ValueError, OverflowError):
+        pass  # Unexpected values for the declared type; keep them as objects
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def to_column_arrays(rows, column_count, type_codes=None):
+    """Split row tuples into one typed array per column (type_codes from cursor.description, if available)"""
+    type_codes = type_codes or [None] * column_count
+    columns = list(zip(*rows)) if rows else [()] * column_count
+    return [column_array(list(values), type_code) for values, type_code in zip(columns, type_codes)]
+
+
+def column_kinds(description):
+    """Array kind ('int', 'float', 'decimal', 'date', 'datetime' or 'object') of each column of a cursor.description"""
+    return [_kind_for_type_code(desc[1]) for desc in description]
+
+
+def fetch_column_arrays(cursor, batch_rows=5000, budget=None):
+    """Fetch a result set with fetchmany straight into typed column arrays.
+
+    Each batch is converted to per-column arrays and its row tuples are dropped, so the
+    full result never exists as Python tuples. Returns (column_arrays, row_count).
+
+    budget, if given (e.g. guardrails.FetchBudget), trims each batch with budget.take() and
+    fetching stops once budget.truncated is set, leaving the rest of the result unread.
+    """
+    type_codes = [desc[1] for desc in cursor.description]
+    chunks = [[] for _ in type_codes]
+    row_count = 0
+    while True:
+        batch = cursor.fetchmany(batch_rows)
+        if budget is not None:
+            batch = budget.take(batch)
+        if not batch:
+            break
+        row_count += len(batch)
+        for chunk, array in zip(chunks, to_column_arrays(batch, len(type_codes), type_codes)):
+            chunk.append(array)
+        if budget is not None and budget.truncated:
+            break
+    column_arrays = [
+        np.concatenate(chunk) if chunk else column_array([], type_code)
+        for chunk, type_code in zip(chunks, type_codes)
+    ]
+    return column_arrays, row_count
+
+
+def _python_values(array, kind=None):
+    """Column values as Python objects, with NaN/NaT as None and NULL-bearing integer columns back as ints"""
+    if array.dtype.kind == 'f':
+        mask = np.isnan(array)
+        if not mask.any():
+            return array.astype(np.int64).tolist() if kind == 'int' else array.tolist()
+        values = (np.where(mask, 0, array).astype(np.int64) if kind == 'int' else array).astype(object)
+        values[mask] = None
+        return values.tolist()
+    # tolist() turns datetime64[D]/[us] into date/datetime objects and NaT into None
+    return array.tolist()
+
+
+def iter_rows(column_arrays, kinds=None, batch_rows=5000):
+    """Yield row tuples from column arrays a batch at a time (e.g. for CSV export)"""
+    kinds = kinds or [None] * len(column_arrays)
+    row_count = len(column_arrays[0]) if column_arrays else 0
+    for start in range(0, row_count, batch_rows):
+        yield from zip(*(_python_values(array[start:start + batch_rows], kind)
+                         for array, kind in zip(column_arrays, kinds)))
+
+
+def column_to_json(array, kind=None):
+    """JSON-ready list for one column; dates and datetimes become ISO 8601 strings"""
+    if array.dtype.kind == 'M':
+        unit = 'D' if np.datetime_data(array.dtype)[0] == 'D' else 's'
+        values = np.datetime_as_string(array, unit=unit).astype(object)
+        values[np.isnat(array)] = None
+        return values.tolist()
+    values = _python_values(array, kind)
+    if array.dtype.kind == 'O':
+        return [v.isoformat() if hasattr(v, 'isoformat') else (str(v) if isinstance(v, Decimal) else v)
+                for v in values]
+    return values
+
+
+def is_numeric_array(array, sample_size=5):
+    """True for numeric arrays, and for object arrays whose first few values parse as numbers"""
+    if array.dtype.kind in 'iuf':
+        return True
+    if array.dtype.kind != 'O':
+        return False
+    for value in array[:sample_size]:
+        if value is None or isinstance(value, bool):
+            continue
+        try:
+            float(value)
+            return True
+        except (TypeError, ValueError):
+            continue
+    return False
@@ -0,0 +1,195 @@
+import threading
+import time
+import logging
+from contextlib import contextmanager
+import mysql.connector
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(RuntimeError):
+    """Raised when no pooled connection becomes free within the checkout timeout"""
+
+
+def _close_quietly(conn):
+    """Close a connection, without draining a result set the caller stopped reading part way"""
+    try:
+        cmysql = getattr(conn, '_cmysql', None)
+        if cmysql is not None and getattr(conn, 'unread_result', False):
+            # The C extension's close() frees, i.e. reads to the end, the pending result first
+            cmysql.close()
+        else:
+            # The pure-Python close() sends QUIT without reading pending rows
+            conn.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    """Thread-safe, bounded pool of MySQL connections.
+
+    Connections are created lazily up to ``pool_size``. Callers that find the pool
+    exhausted wait up to ``checkout_timeout`` seconds for a connection to be returned.
+    Idle connections that have not been used for ``health_check_after`` seconds are
+    pinged (and transparently reconnected) before being handed out.
+    """
+
+    def __init__(self, db_config, pool_size=5, checkout_timeout=10.0, health_check_after=30.0):
+        self.db_config = dict(db_config)
+        self.pool_size = pool_size
+        self.checkout_timeout = checkout_timeout
+        self.health_check_after = health_check_after
+
+        self._cond = threading.Condition()
+        self._idle = []  # LIFO stack of (connection, last_used_monotonic)
+        self._created = 0
+        self._in_use = 0
+        self._closed = False
+
+        # Metrics
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+        self._connects = 0
+        self._health_check_failures = 0
+        self._discarded = 0
+
+    def _create_connection(self):
+        conn = mysql.connector.connect(**self.db_config)
+        with self._cond:
+            self._connects += 1
+        return conn
+
+    def _health_check(self, conn):
+        """Ping a stale idle connection, replacing it if the server went away"""
+        try:
+            conn.ping(reconnect=True, attempts=1, delay=0)
+            return conn
+        except mysql.connector.Error as e:
+            logger.warning(f"Pooled connection failed health check, reconnecting: {e}")
+            with self._cond:
+                self._health_check_failures += 1
+            _close_quietly(conn)
+            return self._create_connection()
+
+    def acquire(self, timeout=None):
+        """Borrow a connection, waiting up to ``timeout`` seconds if the pool is exhausted"""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        waited = False
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._created < self.pool_size:
+                    self._created += 1
+                    conn, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(
+                        f"Timed out after {timeout}s waiting for a database connection "
+                        f"({self._in_use}/{self.pool_size} in use)"
+                    )
+                waited = True
+                self._cond.wait(remaining)
+
+            self._in_use += 1
+            self._checkouts += 1
+            if waited:
+                wait_time = time.monotonic() - start
+                self._waits += 1
+                self._wait_time_total += wait_time
+                self._wait_time_max = max(self._wait_time_max, wait_time)
+
+        # Connect / ping outside the lock so slow handshakes don't block other borrowers
+        try:
+            if conn is None:
+                conn = self._create_connection()
+            elif time.monotonic() - last_used > self.health_check_after:
+                conn = self._health_check(conn)
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._created -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def release(self, conn, discard=False):
+        """Return a borrowed connection; broken connections are closed instead of pooled.
+
+        A connection with an unread result (an unbuffered fetch stopped early) is closed too:
+        rollback() would first read every remaining row into memory.
+        """
+        if not discard and getattr(conn, 'unread_result', False):
+            discard = True
+        if not discard:
+            try:
+                # End any open transaction so the next borrower sees fresh data
+                conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._closed:
+                self._created -= 1
+                self._discarded += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+        if discard or self._closed:
+            _close_quietly(conn)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Context manager that borrows a connection and always returns it"""
+        conn = self.acquire(timeout)
+        discard = False
+        try:
+            yield conn
+        except (mysql.connector.InterfaceError, mysql.connector.OperationalError):
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def close_all(self):
+        """Close idle connections and stop handing out new ones"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            _close_quietly(conn)
+        logger.info(f"Connection pool closed ({len(idle)} idle connections released)")
+
+    def get_stats(self):
+        """Snapshot of pool occupancy and checkout metrics"""
+        with self._cond:
+            return {
+                'pool_size': self.pool_size,
+                'connections_open': self._created,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'wait_time_total_seconds': round(self._wait_time_total, 4),
+                'wait_time_avg_seconds': round(self._wait_time_total / self._waits, 4) if self._waits else 0.0,
+                'wait_time_max_seconds': round(self._wait_time_max, 4),
+                'timeouts': self._timeouts,
+                'connects': self._connects,
+                'health_check_failures': self._health_check_failures,
+                'discarded': self._discarded
+            }
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import threading
+import logging
+from collections import OrderedDict
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def graph_fingerprint(columns, column_arrays, graph_config, render_options=None, chunk_rows=5000):
+    """Content hash of everything that determines a rendered graph.
+
+    Only the columns the graph config plots are hashed, so extra result columns don't
+    split the cache. Typed arrays are hashed from their raw buffers.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(
+        {'columns': list(columns), 'config': graph_config, 'options': render_options or {}},
+        sort_keys=True, default=str
+    ).encode('utf-8'))
+    for i in [graph_config['x_col']] + list(graph_config['y_cols']):
+        if i >= len(column_arrays):
+            continue
+        array = column_arrays[i]
+        digest.update(f"{i}:{array.dtype.str}:{len(array)}".encode('utf-8'))
+        if array.dtype.kind == 'O':
+            for start in range(0, len(array), chunk_rows):
+                digest.update(repr(array[start:start + chunk_rows].tolist()).encode('utf-8'))
+        else:
+            digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+class GraphCache:
+    """In-memory LRU cache of rendered PNGs keyed by graph_fingerprint, bounded by count and bytes.
+
+    Entries never go stale (the key changes whenever the data or config does), so there is no TTL.
+    """
+
+    def __init__(self, max_entries=500, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # fingerprint -> PNG bytes, least recently used first
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            png = self._entries.get(key)
+            if png is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return png
+
+    def put(self, key, png):
+        if len(png) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = png
+            self._bytes += len(png)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
@@ -0,0 +1,196 @@
+import sys
+import threading
+import logging
+from contextlib import contextmanager
+from sqlrewrite import parse, Token, Group, SQLParseError
+
+logger = logging.getLogger(__name__)
+
+QUERY_TIMEOUT_ERRNO = 3024      # ER_QUERY_TIMEOUT: maximum statement execution time exceeded
+QUERY_INTERRUPTED_ERRNO = 1317  # ER_QUERY_INTERRUPTED: KILL QUERY
+
+# FetchBudget.truncated reasons, and the guardrail event each one is counted as
+TRUNCATED_MAX_ROWS = 'max_rows'
+TRUNCATED_MAX_BYTES = 'max_bytes'
+TRUNCATION_EVENTS = {TRUNCATED_MAX_ROWS: 'truncated_rows', TRUNCATED_MAX_BYTES: 'truncated_bytes'}
+
+
+_STATEMENT_WORDS = ('SELECT', 'INSERT', 'REPLACE', 'UPDATE', 'DELETE')
+
+
+def _first_select(group):
+    """Path of token indexes to the statement's first SELECT keyword, or None if it isn't a SELECT.
+
+    Looks through WITH ... AS (...) definitions to the main statement and into the leading
+    parentheses of a query expression such as (SELECT ...) UNION (SELECT ...).
+    """
+    significant = [(i, node) for i, node in enumerate(group.tokens)
+                   if not (isinstance(node, Token) and node.kind in ('ws', 'comment'))]
+    if not significant:
+        return None
+    first_index, first = significant[0]
+    if isinstance(first, Group):
+        inner = _first_select(first)
+        return [first_index] + inner if inner is not None else None
+    if not first.is_word('SELECT', 'WITH'):
+        return None
+    for i, node in significant:
+        if isinstance(node, Token) and node.is_word(*_STATEMENT_WORDS):
+            return [i] if node.is_word('SELECT') else None
+    return None
+
+
+def is_select_statement(sql):
+    """True for a SELECT, WITH ... SELECT or parenthesized query expression, however it is spaced or commented"""
+    try:
+        return _first_select(parse(sql)) is not None
+    except SQLParseError:
+        return False
+
+
+def add_execution_time_hint(sql, max_ms):
+    """Add a /*+ MAX_EXECUTION_TIME(ms) */ optimizer hint after the statement's first SELECT keyword.
+
+    MySQL only honours the hint on SELECT statements; anything else, or SQL that already
+    carries the hint, is returned unchanged.
+    """
+    if not max_ms or 'MAX_EXECUTION_TIME' in sql.upper():
+        return sql
+    try:
+        tree = parse(sql)
+    except SQLParseError:
+        return sql
+    path = _first_select(tree)
+    if path is None:
+        return sql
+    group = tree
+    for index in path[:-1]:
+        group = group.tokens[index]
+    group.tokens.insert(path[-1] + 1, Token('comment', f" /*+ MAX_EXECUTION_TIME({int(max_ms)}) */"))
+    return tree.sql()
+
+
+class FetchBudget:
+    """Row and byte allowance for one result set, consumed batch by batch.
+
+    take(batch) returns the part of the batch that fits; once a cap is hit, truncated is set
+    to TRUNCATED_MAX_ROWS or TRUNCATED_MAX_BYTES and nothing more is accepted. Bytes are estimated from a
+    sample of each batch, like the result cache does.
+    """
+
+    def __init__(self, max_rows=None, max_bytes=None, sample_size=20):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.sample_size = sample_size
+        self.rows = 0
+        self.bytes = 0
+        self.truncated = None
+
+    def _row_bytes(self, batch):
+        sample = batch[:self.sample_size]
+        return sum(sys.getsizeof(row) + sum(sys.getsizeof(cell) for cell in row) for row in sample) / len(sample)
+
+    def take(self, batch):
+        if self.truncated or not batch:
+            return batch[:0]
+        keep = len(batch)
+        if self.max_rows is not None and self.rows + keep > self.max_rows:
+            keep = max(self.max_rows - self.rows, 0)
+            self.truncated = TRUNCATED_MAX_ROWS
+        if self.max_bytes is not None and keep:
+            per_row = self._row_bytes(batch)
+            if self.bytes + per_row * keep > self.max_bytes:
+                keep = max(int((self.max_bytes - self.bytes) / per_row), 0)
+                self.truncated = TRUNCATED_MAX_BYTES
+            self.bytes += int(per_row * keep)
+        self.rows += keep
+        return batch[:keep]
+
+    @property
+    def event(self):
+        """Guardrail event name for the truncation reason, or None if nothing was cut"""
+        return TRUNCATION_EVENTS.get(self.truncated)
+
+    def to_dict(self):
+        return {'max_rows': self.max_rows, 'max_bytes': self.max_bytes, 'rows': self.rows,
+                'estimated_bytes': self.bytes, 'truncated': self.truncated is not None,
+                'truncated_reason': self.truncated}
+
+
+class QueryCanceller:
+    """Tracks which MySQL connection is running each request's statement so another thread can
+    stop it with KILL QUERY (e.g. when the client disconnects or cancels its job).
+
+    connect() must return a new, dedicated connection: the KILL has to work even when every
+    pooled connection is busy. Tokens cancelled before their statement starts are remembered,
+    so the statement is never sent, until release(token) forgets them.
+    """
+
+    def __init__(self, connect, max_cancelled=1000):
+        self.connect = connect
+        self.max_cancelled = max_cancelled
+        self._lock = threading.Lock()
+        self._running = {}      # token -> connection id
+        self._cancelled = {}    # token -> True, insertion ordered
+        self.kills = 0
+        self.kill_failures = 0
+
+    @contextmanager
+    def running(self, token, conn):
+        """Register conn as running token's statement for the duration of a with-block"""
+        if token is None:
+            yield
+            return
+        with self._lock:
+            self._running[token] = conn.connection_id
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._running.pop(token, None)
+
+    def is_cancelled(self, token):
+        with self._lock:
+            return token is not None and token in self._cancelled
+
+    def release(self, token):
+        """Forget a token once its request is over, so a reused token doesn't start out cancelled"""
+        if token is None:
+            return
+        with self._lock:
+            self._cancelled.pop(token, None)
+            self._running.pop(token, None)
+
+    def cancel(self, token):
+        """Mark token cancelled and kill its statement if one is running; True if a KILL was sent"""
+        with self._lock:
+            self._cancelled[token] = True
+            while len(self._cancelled) > self.max_cancelled:
+                self._cancelled.pop(next(iter(self._cancelled)))
+            connection_id = self._running.get(token)
+        return connection_id is not None and self.kill(connection_id)
+
+    def kill(self, connection_id):
+        """KILL QUERY on a connection id from a separate connection"""
+        try:
+            conn = self.connect()
+            try:
+                cursor = conn.cursor()
+                cursor.execute(f"KILL QUERY {int(connection_id)}")
+                cursor.close()
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.warning(f"KILL QUERY {connection_id} failed: {e}")
+            with self._lock:
+                self.kill_failures += 1
+            return False
+        with self._lock:
+            self.kills += 1
+        logger.info(f"Killed query on connection {connection_id}")
+        return True
+
+    def get_stats(self):
+        with self._lock:
+            return {'running': len(self._running), 'cancelled_tokens': len(self._cancelled),
+                    'kills': self.kills, 'kill_failures': self.kill_failures}
@@ -1,6 +1,10 @@
 import holidays
+import numpy as np
 import re
-from datetime import datetime, timedelta
+import threading
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import datetime, timedelta, date as date_cls
 
 HOLIDAY_CONFIG = {
     'country': 'IN',
@@ -17,26 +21,197 @@ HOLIDAY_KEYWORDS = [
     'religious festival', 'cultural event', 'traditional celebration', 'non working'
 ]
 
+# HOLIDAY_KEYWORDS that name no particular festival
+GENERIC_HOLIDAY_KEYWORDS = {
+    'holiday', 'holidays', 'festival', 'festivals', 'celebration', 'celebrations',
+    'vacation', 'leave', 'off day', 'public holiday', 'national holiday',
+    'religious festival', 'cultural event', 'traditional celebration', 'non working'
+}
+
 # Add weekend-related keywords
 WEEKEND_KEYWORDS = [
     'weekend', 'weekends', 'saturday', 'sunday', 'sat', 'sun',
     'week end', 'off days', 'non-working days'
 ]
 
+# Prompt budget for the holiday list injected by build_holiday_context
+HOLIDAY_CONTEXT_CONFIG = {
+    'token_budget': 400,         # Approximate tokens the holiday list may use in the prompt
+    'default_past_days': 365,    # Window before today used when the query names no dates
+    'default_future_days': 30    # Window after today used when the query names no dates
+}
+
+WEEKEND_DAY_NAMES = {5: 'Saturday', 6: 'Sunday'}
+
+# date.toordinal() of 1970-01-01, the zero of numpy's datetime64[D]
+EPOCH_ORDINAL = 719163
+
+# One immutable generation of the HolidayCalendar index; load_years replaces it whole
+_HolidayIndex = namedtuple('_HolidayIndex', 'years ordinals names months day_numbers name_array')
+
+
+class HolidayCalendar:
+    """In-memory holiday index built once per year.
+
+    Holidays are kept as a sorted array of date ordinals with a parallel array of names,
+    plus (year, month) buckets, so lookups and range queries are O(log n) bisects instead
+    of rebuilding the ``holidays`` table on every call. Years outside the preloaded range
+    are loaded on first use.
+    """
+
+    def __init__(self, country, state, years):
+        self.country = country
+        self.state = state
+        self.base_years = sorted(set(years))
+        self._lock = threading.Lock()
+        self._index = _HolidayIndex(
+            years=frozenset(),
+            ordinals=(),
+            names=(),
+            months={},  # (year, month) -> ((date, name), ...)
+            day_numbers=np.empty(0, dtype=np.int64),  # holidays as days since 1970-01-01
+            name_array=np.empty(0, dtype=object),
+        )
+        self.load_years(years)
+
+    def load_years(self, years):
+        """Add any years not yet indexed"""
+        with self._lock:
+            index = self._index
+            missing = sorted(set(years) - index.years)
+            if not missing:
+                return
+            table = holidays.country_holidays(country=self.country, state=self.state, years=missing)
+            merged = dict(zip(index.ordinals, index.names))
+            for day, name in table.items():
+                merged[day.toordinal()] = name
+            ordered = sorted(merged.items())
+            months = {}
+            for ordinal, name in ordered:
+                day = date_cls.fromordinal(ordinal)
+                months.setdefault((day.year, day.month), []).append((day, name))
+            ordinals = tuple(o for o, _ in ordered)
+            names = tuple(n for _, n in ordered)
+            day_numbers = np.array(ordinals, dtype=np.int64) - EPOCH_ORDINAL
+            day_numbers.flags.writeable = False
+            name_array = np.array(names, dtype=object)
+            name_array.flags.writeable = False
+            # A single attribute assignment publishes the new generation; lock-free readers
+            # take one reference to self._index and so see either the old index or the new one
+            self._index = _HolidayIndex(
+                years=index.years | frozenset(missing),
+                ordinals=ordinals,
+                names=names,
+                months={key: tuple(items) for key, items in months.items()},
+                day_numbers=day_numbers,
+                name_array=name_array,
+            )
+
+    def _index_for(self, years):
+        """Current index, loading any of years it does not cover yet"""
+        index = self._index
+        if not index.years.issuperset(years):
+            self.load_years(years)
+            index = self._index
+        return index
+
+    def holiday_name(self, day):
+        """Holiday name for a date, or None"""
+        index = self._index_for([day.year])
+        ordinals, names = index.ordinals, index.names
+        i = bisect_left(ordinals, day.toordinal())
+        if i < len(ordinals) and ordinals[i] == day.toordinal():
+            return names[i]
+        return None
+
+    def holidays_in_range(self, start_date, end_date):
+        """Sorted (date, name) pairs for holidays between start_date and end_date inclusive"""
+        index = self._index_for(range(start_date.year, end_date.year + 1))
+        ordinals, names = index.ordinals, index.names
+        lo = bisect_left(ordinals, start_date.toordinal())
+        hi = bisect_right(ordinals, end_date.toordinal())
+        return [(date_cls.fromordinal(ordinals[i]), names[i]) for i in range(lo, hi)]
+
+    def holidays_for(self, years=None, months=None):
+        """Holidays in the configured years, optionally restricted to some years and/or months"""
+        years = sorted(set(years) & set(self.base_years)) if years else self.base_years
+        months = sorted(set(months)) if months else range(1, 13)
+        index_months = self._index.months
+        result = []
+        for year in years:
+            for month in months:
+                result.extend(index_months.get((year, month), ()))
+        return result
+
+    def classify_days(self, day_numbers, valid):
+        """Vectorized weekend/holiday lookup for int64 days since 1970-01-01.
+
+        Returns (is_weekend, is_holiday, holiday_name) arrays; entries where valid is False
+        are never weekends or holidays.
+        """
+        index = self._index
+        if valid.any():
+            first = int(day_numbers[valid].min()) + EPOCH_ORDINAL
+            last = int(day_numbers[valid].max()) + EPOCH_ORDINAL
+            index = self._index_for(range(date_cls.fromordinal(first).year, date_cls.fromordinal(last).year + 1))
+
+        # 1970-01-01 was a Thursday (weekday 3)
+        is_weekend = valid & ((day_numbers + 3) % 7 >= 5)
+
+        holiday_days, holiday_names = index.day_numbers, index.name_array
+        holiday_name = np.full(day_numbers.shape, None, dtype=object)
+        if len(holiday_days):
+            pos = np.searchsorted(holiday_days, day_numbers)
+            pos_clipped = np.minimum(pos, len(holiday_days) - 1)
+            is_holiday = valid & (holiday_days[pos_clipped] == day_numbers)
+            holiday_name[is_holiday] = holiday_names[pos_clipped[is_holiday]]
+        else:
+            is_holiday = np.zeros(day_numbers.shape, dtype=bool)
+        return is_weekend, is_holiday, holiday_name
+
+    def weekends_in_range(self, start_date, end_date):
+        """Weekend dates between start_date and end_date inclusive, stepping only over Saturdays and Sundays"""
+        weekends = []
+        first_saturday = start_date + timedelta(days=(5 - start_date.weekday()) % 7)
+        if start_date.weekday() == 6:
+            weekends.append(start_date)
+        saturday = first_saturday
+        week = timedelta(days=7)
+        sunday_offset = timedelta(days=1)
+        while saturday <= end_date:
+            weekends.append(saturday)
+            sunday = saturday + sunday_offset
+            if sunday <= end_date:
+                weekends.append(sunday)
+            saturday += week
+        return weekends
+
+    def non_working_days_in_range(self, start_date, end_date):
+        """Sorted (date, reason) pairs for weekends and holidays; holidays take precedence as the reason"""
+        days = {day: WEEKEND_DAY_NAMES[day.weekday()] for day in self.weekends_in_range(start_date, end_date)}
+        days.update(self.holidays_in_range(start_date, end_date))
+        return sorted(days.items())
+
+
+_calendar = None
+_calendar_lock = threading.Lock()
+
+def get_holiday_calendar():
+    """Shared HolidayCalendar for HOLIDAY_CONFIG, built on first use"""
+    global _calendar
+    if _calendar is None:
+        with _calendar_lock:
+            if _calendar is None:
+                _calendar = HolidayCalendar(
+                    HOLIDAY_CONFIG['country'], HOLIDAY_CONFIG['state'], HOLIDAY_CONFIG['years']
+                )
+    return _calendar
+
+def _format_holidays(holiday_items):
+    return '\n'.join(f"{day.isoformat()}: {name}" for day, name in holiday_items)
+
 def get_holiday_dates():
-    india_holidays = holidays.country_holidays(
-        country=HOLIDAY_CONFIG['country'],
-        state=HOLIDAY_CONFIG['state'],
-        years=HOLIDAY_CONFIG['years']
-    )
-    
-    holiday_list = []
-    for date, name in sorted(india_holidays.items()):
-        holiday_list.append(f"{date.strftime('%Y-%m-%d')}: {name}")
-    
-    holiday_dates_string = '\n'.join(holiday_list)
-    
-    return holiday_dates_string
+    return _format_holidays(get_holiday_calendar().holidays_for())
 
 def is_weekend(date):
     """Check if a given date is a weekend (Saturday=5, Sunday=6)"""
@@ -44,16 +219,10 @@ def is_weekend(date):
 
 def get_weekends_in_range(start_date, end_date):
     """Get all weekend dates in a given range"""
-    weekends = []
-    current_date = start_date
-    
-    while current_date <= end_date:
-        if is_weekend(current_date):
-            day_name = current_date.strftime('%A')
-            weekends.append(f"{current_date.strftime('%Y-%m-%d')}: {day_name}")
-        current_date += timedelta(days=1)
-    
-    return weekends
+    return [
+        f"{day.isoformat()}: {WEEKEND_DAY_NAMES[day.weekday()]}"
+        for day in get_holiday_calendar().weekends_in_range(start_date, end_date)
+    ]
 
 def get_weekends_for_year(year):
     """Get all weekends for a specific year"""
@@ -119,23 +288,117 @@ def infer_holiday_context(query):
     
     filters = parse_date_filters(query)
     
-    india_holidays = holidays.country_holidays(
-        country=HOLIDAY_CONFIG['country'],
-        state=HOLIDAY_CONFIG['state'],
-        years=HOLIDAY_CONFIG['years']
-    )
-    
-    filtered_holidays = _filter_holidays_by_query(india_holidays, filters)
-    
-    if not filters['years'] and not filters['months']:
-        filtered_holidays = india_holidays
+    filtered_holidays = get_holiday_calendar().holidays_for(filters['years'], filters['months'])
     
-    holiday_list = []
-    for date, name in sorted(filtered_holidays.items()):
-        holiday_list.append(f"{date.strftime('%Y-%m-%d')}: {name}")
-    
-    holiday_dates_string = '\n'.join(holiday_list)
-    return holiday_dates_string
+    return _format_holidays(filtered_holidays)
+
+def estimate_tokens(text):
+    """Rough LLM token count (about 4 characters per token for English/SQL/dates)"""
+    return (len(text) + 3) // 4
+
+def _month_bounds(year, month):
+    start = date_cls(year, month, 1)
+    end = date_cls(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    return start, end
+
+def resolve_relative_range(query, today=None):
+    """Resolve relative wording ("last month", "past 3 weeks", "this year") to a (start, end) date range, or None"""
+    today = today or date_cls.today()
+    query_lower = query.lower()
+
+    match = re.search(r'\b(?:last|past|previous)\s+(\d+)\s+(day|week|month|year)s?\b', query_lower)
+    if match:
+        count, unit = int(match.group(1)), match.group(2)
+        days = {'day': 1, 'week': 7, 'month': 31, 'year': 366}[unit] * count
+        return today - timedelta(days=days), today
+
+    if re.search(r'\b(today|tonight)\b', query_lower):
+        return today, today
+    if re.search(r'\byesterday\b', query_lower):
+        return today - timedelta(days=1), today - timedelta(days=1)
+    if re.search(r'\b(this|current)\s+week\b', query_lower):
+        return today - timedelta(days=today.weekday()), today - timedelta(days=today.weekday()) + timedelta(days=6)
+    if re.search(r'\b(last|past|previous)\s+week\b', query_lower):
+        return today - timedelta(days=7), today
+    if re.search(r'\b(this|current)\s+month\b', query_lower):
+        return _month_bounds(today.year, today.month)
+    if re.search(r'\b(last|past|previous)\s+month\b', query_lower):
+        first_of_month = today.replace(day=1)
+        previous = first_of_month - timedelta(days=1)
+        return _month_bounds(previous.year, previous.month)
+    if re.search(r'\b(this|current)\s+year\b', query_lower):
+        return date_cls(today.year, 1, 1), date_cls(today.year, 12, 31)
+    if re.search(r'\b(last|past|previous)\s+year\b', query_lower):
+        return date_cls(today.year - 1, 1, 1), date_cls(today.year - 1, 12, 31)
+    return None
+
+def _compact_holidays(holiday_items):
+    """One line per holiday name listing all its dates, e.g. "Diwali: 2023-11-12, 2024-10-31" """
+    by_name = {}
+    for day, name in holiday_items:
+        by_name.setdefault(name, []).append(day.isoformat())
+    return '\n'.join(f"{name}: {', '.join(days)}" for name, days in by_name.items())
+
+def build_holiday_context(query, today=None, token_budget=None):
+    """Holiday list for the LLM prompt, limited to the dates the query can plausibly need.
+
+    Unlike infer_holiday_context, which returns every configured year when the query names
+    no year or month, the dates are narrowed to, in order of preference: holidays named in the
+    query, explicit years/months, relative ranges such as "last month", or a default window
+    around today. If the list exceeds token_budget it is regrouped by holiday name and, if
+    still too long, trimmed to the holidays nearest today.
+    """
+    query_lower = query.lower()
+    if not any(keyword in query_lower for keyword in HOLIDAY_KEYWORDS):
+        return ""
+
+    today = today or date_cls.today()
+    token_budget = token_budget or HOLIDAY_CONTEXT_CONFIG['token_budget']
+    calendar_index = get_holiday_calendar()
+    filters = parse_date_filters(query)
+
+    # A specific festival ("diwali", "holi") only needs its own dates
+    festivals = [keyword for keyword in HOLIDAY_KEYWORDS
+                 if keyword not in GENERIC_HOLIDAY_KEYWORDS and re.search(rf'\b{re.escape(keyword)}\b', query_lower)]
+
+    date_range = None if filters['years'] else resolve_relative_range(query, today)
+    if date_range is not None:
+        items = calendar_index.holidays_in_range(*date_range)
+        if filters['months']:
+            items = [(day, name) for day, name in items if day.month in filters['months']]
+    elif filters['years'] or filters['months'] or festivals:
+        items = calendar_index.holidays_for(filters['years'], filters['months'])
+    else:
+        items = calendar_index.holidays_in_range(
+            today - timedelta(days=HOLIDAY_CONTEXT_CONFIG['default_past_days']),
+            today + timedelta(days=HOLIDAY_CONTEXT_CONFIG['default_future_days'])
+        )
+
+    if festivals:
+        named = [(day, name) for day, name in items
+                 if any(re.search(rf'\b{re.escape(festival)}\b', name.lower()) for festival in festivals)]
+        if named:
+            items = named
+
+    context = _format_holidays(items)
+    if estimate_tokens(context) <= token_budget:
+        return context
+
+    context = _compact_holidays(items)
+    if estimate_tokens(context) <= token_budget:
+        return context
+
+    # Keep the holidays closest to today until the budget is used up
+    kept = []
+    used = 0
+    for day, name in sorted(items, key=lambda item: abs((item[0] - today).days)):
+        cost = estimate_tokens(f"{day.isoformat()}: {name}\n")
+        if used + cost > token_budget:
+            break
+        kept.append((day, name))
+        used += cost
+    omitted = len(items) - len(kept)
+    return _format_holidays(sorted(kept)) + f"\n(... {omitted} more holidays further from today omitted)"
 
 def infer_combined_context(query):
     """Combine holiday and weekend context based on query"""
@@ -161,17 +424,48 @@ def is_non_working_day(date):
         return True, "Weekend"
     
     # Check if it's a holiday
-    india_holidays = holidays.country_holidays(
-        country=HOLIDAY_CONFIG['country'],
-        state=HOLIDAY_CONFIG['state'],
-        years=[date.year]
-    )
-    
-    if date in india_holidays:
-        return True, india_holidays[date]
+    holiday_name = get_holiday_calendar().holiday_name(date)
+    if holiday_name is not None:
+        return True, holiday_name
     
     return False, None
 
+def classify_non_working_days(dates):
+    """Bulk version of is_non_working_day for arrays of dates.
+
+    Accepts a numpy datetime64 array, a pandas Series/DatetimeIndex, or any sequence of
+    dates/datetimes/ISO strings, and classifies every element in one vectorized pass.
+    Missing values (NaT/None) are never non-working days.
+
+    Returns:
+        dict with boolean arrays 'is_weekend', 'is_holiday' and 'is_non_working', and an
+        object array 'holiday_name' (None where the date is not a holiday). For a pandas
+        Series input a DataFrame with the same index is returned instead.
+    """
+    index = getattr(dates, 'index', None)
+    if callable(index):  # list.index / tuple.index, not a pandas index
+        index = None
+    values = dates.to_numpy() if hasattr(dates, 'to_numpy') else dates
+    values = np.asarray(values)
+    if values.dtype == object:
+        values = np.array([np.datetime64('NaT') if v is None else np.datetime64(v, 'D') for v in values.ravel()],
+                          dtype='datetime64[D]').reshape(values.shape)
+    days = values.astype('datetime64[D]')
+    valid = ~np.isnat(days)
+    day_numbers = days.view(np.int64)
+
+    is_weekend, is_holiday, holiday_name = get_holiday_calendar().classify_days(day_numbers, valid)
+    result = {
+        'is_weekend': is_weekend,
+        'is_holiday': is_holiday,
+        'is_non_working': is_weekend | is_holiday,
+        'holiday_name': holiday_name
+    }
+    if index is not None:
+        import pandas as pd
+        return pd.DataFrame(result, index=index)
+    return result
+
 def parse_date_filters(query):
     """
     Parse query to extract specific year, month, or date filters.
@@ -194,10 +488,11 @@ def parse_date_filters(query):
     }
     
     for month_name, month_num in month_patterns.items():
-        if month_name in query_lower:
+        # Whole words only, so "market" is not read as March or "decrease" as December
+        if re.search(rf'\b{month_name}\b', query_lower) and month_num not in filters['months']:
             filters['months'].append(month_num)
     
-    numeric_months = re.findall(r'\b(1[0-2]|[1-9])\s*(?:st|nd|rd|th)?\s*(?:month|/)', query_lower)
+    numeric_months = re.findall(r'\b(1[0-2]|[1-9])\s*(?:st|nd|rd|th)?\s*(?:month\b|/)', query_lower)
     if numeric_months:
         filters['months'].extend([int(m) for m in numeric_months])
     
@@ -219,3 +514,50 @@ def _filter_holidays_by_query(all_holidays, filters):
             filtered_holidays[date] = name
     
     return filtered_holidays
+
+def _benchmark(number=200):
+    """Per-call cost of the calendar index versus rebuilding the holidays table each call"""
+    import timeit
+
+    def legacy_is_non_working_day(day):
+        if is_weekend(day):
+            return True, "Weekend"
+        table = holidays.country_holidays(
+            country=HOLIDAY_CONFIG['country'], state=HOLIDAY_CONFIG['state'], years=[day.year]
+        )
+        return (True, table[day]) if day in table else (False, None)
+
+    def legacy_infer_holiday_context(query):
+        filters = parse_date_filters(query)
+        table = holidays.country_holidays(
+            country=HOLIDAY_CONFIG['country'], state=HOLIDAY_CONFIG['state'], years=HOLIDAY_CONFIG['years']
+        )
+        if filters['years'] or filters['months']:
+            table = _filter_holidays_by_query(table, filters)
+        return '\n'.join(f"{day.strftime('%Y-%m-%d')}: {name}" for day, name in sorted(table.items()))
+
+    def legacy_weekends(start_date, end_date):
+        weekends = []
+        current_date = start_date
+        while current_date <= end_date:
+            if is_weekend(current_date):
+                weekends.append(f"{current_date.strftime('%Y-%m-%d')}: {current_date.strftime('%A')}")
+            current_date += timedelta(days=1)
+        return weekends
+
+    get_holiday_calendar()  # build the index outside the timed loops
+    day = datetime(2024, 8, 15).date()
+    start, end = datetime(2024, 1, 1).date(), datetime(2024, 12, 31).date()
+    cases = [
+        ("is_non_working_day", lambda: legacy_is_non_working_day(day), lambda: is_non_working_day(day)),
+        ("infer_holiday_context", lambda: legacy_infer_holiday_context("holidays in 2024"),
+         lambda: infer_holiday_context("holidays in 2024")),
+        ("get_weekends_in_range (1 year)", lambda: legacy_weekends(start, end), lambda: get_weekends_in_range(start, end)),
+    ]
+    for label, before, after in cases:
+        before_us = timeit.timeit(before, number=number) / number * 1e6
+        after_us = timeit.timeit(after, number=number) / number * 1e6
+        print(f"{label:32s} before {before_us:10.1f} us/call   after {after_us:8.1f} us/call   ({before_us / after_us:.0f}x)")
+
+if __name__ == '__main__':
+    _benchmark()
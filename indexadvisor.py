@@ -0,0 +1,310 @@
+import json
+import re
+import threading
+import time
+import logging
+from collections import OrderedDict
+from sqlrewrite import rewrite_sql
+
+logger = logging.getLogger(__name__)
+
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+_TABLE_RE = re.compile(r'\b(?:FROM|JOIN)\s+`?(\w+)`?(?:\s+(?:AS\s+)?`?(\w+)`?)?', re.IGNORECASE)
+_CLAUSE_RE = re.compile(r'\b(WHERE|GROUP\s+BY|HAVING|ORDER\s+BY|LIMIT)\b', re.IGNORECASE)
+_COLUMN = r'(?:`?(\w+)`?\s*\.\s*)?`?(\w+)`?'
+_PREDICATE_RE = re.compile(_COLUMN + r'\s*(<=>|>=|<=|<>|!=|=|>|<|\bNOT\s+IN\b|\bIN\b|\bBETWEEN\b|\bLIKE\b)',
+                           re.IGNORECASE)
+_WRAPPED_PREDICATE_RE = re.compile(r'\b([A-Z_]+)\s*\(\s*' + _COLUMN + r'\s*\)\s*(>=|<=|<>|!=|=|>|<|\bIN\b|\bBETWEEN\b)',
+                                   re.IGNORECASE)
+_JOIN_EQ_RE = re.compile(_COLUMN + r'\s*=\s*' + _COLUMN)
+_WRAPPED_COLUMN_RE = re.compile(r'\b[A-Z_]+\s*\(\s*' + _COLUMN + r'\s*\)', re.IGNORECASE)
+
+_KEYWORDS = {
+    'AND', 'OR', 'NOT', 'NULL', 'IS', 'IN', 'BETWEEN', 'LIKE', 'INTERVAL', 'DAY', 'MONTH', 'YEAR', 'CURDATE',
+    'CURRENT_DATE', 'NOW', 'SELECT', 'FROM', 'WHERE', 'ON', 'CASE', 'WHEN', 'THEN', 'ELSE', 'END', 'TRUE', 'FALSE'
+}
+_EQUALITY_OPS = {'=', '<=>', 'IN'}
+_RANGE_OPS = {'>', '<', '>=', '<=', 'BETWEEN', 'LIKE'}
+
+
+def _mask_strings(sql):
+    """Blank out string literal contents, keeping offsets, so they can't match column patterns"""
+    return _STRING_RE.sub(lambda m: m.group(0)[0] + ' ' * (len(m.group(0)) - 2) + m.group(0)[-1], sql)
+
+
+def _clauses(sql):
+    """Map of clause name ('SELECT', 'WHERE', 'GROUP BY', ...) -> text for the outermost statement"""
+    parts = {}
+    boundaries = []
+    for match in _CLAUSE_RE.finditer(sql):
+        depth = sql.count('(', 0, match.start()) - sql.count(')', 0, match.start())
+        if depth == 0:
+            boundaries.append((re.sub(r'\s+', ' ', match.group(1).upper()), match.start(), match.end()))
+    parts['SELECT'] = sql[:boundaries[0][1]] if boundaries else sql
+    for i, (name, start, end) in enumerate(boundaries):
+        stop = boundaries[i + 1][1] if i + 1 < len(boundaries) else len(sql)
+        parts.setdefault(name, sql[end:stop])
+    return parts
+
+
+def extract_access_pattern(sql):
+    """Per-table column usage of a SELECT: equality and range filters, function-wrapped (non-sargable)
+    filters, GROUP BY and ORDER BY columns. Unqualified columns are attributed only when the query
+    reads a single table."""
+    masked = _mask_strings(sql)
+    aliases = OrderedDict()
+    for table, alias in _TABLE_RE.findall(masked):
+        aliases[table.lower()] = table
+        if alias and alias.upper() not in _KEYWORDS | {'WHERE', 'GROUP', 'ORDER', 'LIMIT', 'JOIN', 'INNER', 'LEFT',
+                                                      'RIGHT', 'CROSS', 'STRAIGHT_JOIN', 'HAVING'}:
+            aliases[alias.lower()] = table
+    tables = list(OrderedDict.fromkeys(aliases.values()))
+    patterns = {t: {'equality': [], 'range': [], 'wrapped': [], 'group_by': [], 'order_by': []} for t in tables}
+
+    def resolve(qualifier, column):
+        if column.upper() in _KEYWORDS or column.isdigit():
+            return None
+        if qualifier:
+            return aliases.get(qualifier.lower())
+        return tables[0] if len(tables) == 1 else None
+
+    def add(kind, qualifier, column):
+        table = resolve(qualifier, column)
+        if table is not None and column not in patterns[table][kind]:
+            patterns[table][kind].append(column)
+
+    clauses = _clauses(masked)
+    where = clauses.get('WHERE', '')
+    # Join conditions are equality lookups on both sides
+    for condition in re.findall(r'\bON\b(.*?)(?=\bJOIN\b|$)', clauses['SELECT'], re.IGNORECASE | re.DOTALL):
+        for left_qualifier, left, right_qualifier, right in _JOIN_EQ_RE.findall(condition):
+            add('equality', left_qualifier, left)
+            add('equality', right_qualifier, right)
+        where += ' ' + _JOIN_EQ_RE.sub(' ', condition)
+    for function, qualifier, column, op in _WRAPPED_PREDICATE_RE.findall(where):
+        if function.upper() not in ('SUM', 'AVG', 'MIN', 'MAX', 'COUNT'):
+            add('wrapped', qualifier, column)
+    plain = _WRAPPED_PREDICATE_RE.sub(' ', where)
+    for qualifier, column, op in _PREDICATE_RE.findall(plain):
+        op = re.sub(r'\s+', ' ', op.upper())
+        if op in _EQUALITY_OPS:
+            add('equality', qualifier, column)
+        elif op in _RANGE_OPS:
+            add('range', qualifier, column)
+    for name, kind in (('GROUP BY', 'group_by'), ('ORDER BY', 'order_by')):
+        for item in clauses.get(name, '').split(','):
+            match = _WRAPPED_COLUMN_RE.search(item) or re.match(r'\s*' + _COLUMN, item)
+            if match:
+                add(kind, match.group(1), match.group(2))
+    return patterns
+
+
+def sargable_suggestions(sql):
+    """Range rewrites for predicates that wrap a column in DATE()/YEAR() (see sqlrewrite.rewrite_sql)"""
+    _, rewrites = rewrite_sql(sql, date_columns=None)
+    return [{'original': r['original'], 'rewrite': r['rewritten']} for r in rewrites if r['rule'].startswith('sargable_')]
+
+
+def summarize_plan(plan):
+    """Flatten an EXPLAIN FORMAT=JSON document into per-table access info and filesort/temporary flags"""
+    summary = {'tables': [], 'full_scans': [], 'using_filesort': False, 'using_temporary_table': False,
+               'rows_examined': 0, 'query_cost': None}
+    cost = plan.get('query_block', {}).get('cost_info', {}).get('query_cost')
+    if cost is not None:
+        summary['query_cost'] = float(cost)
+
+    def walk(node):
+        if isinstance(node, dict):
+            if node.get('using_filesort'):
+                summary['using_filesort'] = True
+            if node.get('using_temporary_table'):
+                summary['using_temporary_table'] = True
+            if 'table_name' in node and 'access_type' in node:
+                table = {
+                    'table': node['table_name'],
+                    'access_type': node['access_type'],
+                    'key': node.get('key'),
+                    'possible_keys': node.get('possible_keys', []),
+                    'rows_examined': node.get('rows_examined_per_scan', 0)
+                }
+                summary['tables'].append(table)
+                summary['rows_examined'] += table['rows_examined'] or 0
+                if table['access_type'] in ('ALL', 'index'):
+                    summary['full_scans'].append(table['table'])
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(plan)
+    return summary
+
+
+def explain(cursor, sql):
+    """Run EXPLAIN FORMAT=JSON for a statement on an open cursor and return the summarized plan"""
+    cursor.execute(f"EXPLAIN FORMAT=JSON {sql.strip().rstrip(';')}")
+    row = cursor.fetchone()
+    cursor.fetchall()  # Drain any remaining rows so the cursor can be reused
+    return summarize_plan(json.loads(row[0]))
+
+
+def recommend_index(pattern, max_columns=4, column_order=()):
+    """Composite index columns for one access pattern: equality columns, then one range column
+    (function-wrapped filters count as ranges once rewritten), else the GROUP BY/ORDER BY columns.
+
+    Equality columns named in column_order come first, in that order (e.g. the natural
+    Record_Date, Record_Hour, Time_Block hierarchy), followed by the rest as they appeared.
+    """
+    rank = {c.lower(): i for i, c in enumerate(column_order)}
+    columns = sorted(pattern['equality'], key=lambda c: rank.get(c.lower(), len(rank)))
+    ranges = [c for c in pattern['range'] + pattern['wrapped'] if c not in columns]
+    if ranges:
+        # Index order only helps up to the first range column
+        columns.append(ranges[0])
+    else:
+        columns.extend(c for c in pattern['group_by'] + pattern['order_by'] if c not in columns)
+    return tuple(columns[:max_columns])
+
+
+class IndexAdvisor:
+    """Aggregates per-table access patterns and EXPLAIN findings across executed queries.
+
+    Every recorded statement contributes its filter/grouping pattern per table; patterns seen at
+    least min_occurrences times whose plans showed full scans or filesort/temporary tables become
+    composite index recommendations, unless an existing index already starts with those columns.
+    """
+
+    def __init__(self, min_occurrences=3, max_patterns=500, max_examples=3, column_order=()):
+        self.min_occurrences = min_occurrences
+        self.column_order = tuple(column_order)
+        self.max_patterns = max_patterns
+        self.max_examples = max_examples
+        self._lock = threading.Lock()
+        self._patterns = OrderedDict()  # (table, index columns) -> aggregate, least recently seen first
+        self.statements = 0
+        self.full_scans = 0
+        self.filesorts = 0
+        self.temporary_tables = 0
+        self.explain_failures = 0
+
+    def record(self, sql, plan=None, duration=None):
+        """Add one executed statement and its summarized plan (None if EXPLAIN wasn't run)"""
+        try:
+            patterns = extract_access_pattern(sql)
+        except Exception as e:
+            logger.debug(f"Could not extract access pattern: {e}")
+            return
+        suggestions = sargable_suggestions(sql)
+        full_scan_tables = set(plan['full_scans']) if plan else set()
+        with self._lock:
+            self.statements += 1
+            if plan:
+                self.full_scans += bool(plan['full_scans'])
+                self.filesorts += plan['using_filesort']
+                self.temporary_tables += plan['using_temporary_table']
+            for table, pattern in patterns.items():
+                columns = recommend_index(pattern, column_order=self.column_order)
+                if not columns:
+                    continue
+                key = (table, columns)
+                entry = self._patterns.pop(key, None) or {
+                    'table': table, 'columns': list(columns), 'count': 0, 'bad_plans': 0, 'explained': 0,
+                    'rows_examined': 0, 'total_seconds': 0.0, 'wrapped_columns': [], 'examples': [],
+                    'sargable_rewrites': []
+                }
+                entry['count'] += 1
+                entry['last_seen'] = time.time()
+                if duration is not None:
+                    entry['total_seconds'] += duration
+                if plan:
+                    entry['explained'] += 1
+                    entry['rows_examined'] += sum(t['rows_examined'] or 0 for t in plan['tables']
+                                                  if t['table'] == table)
+                    if table in full_scan_tables or plan['using_filesort'] or plan['using_temporary_table']:
+                        entry['bad_plans'] += 1
+                for column in pattern['wrapped']:
+                    if column not in entry['wrapped_columns']:
+                        entry['wrapped_columns'].append(column)
+                for suggestion in suggestions:
+                    if suggestion not in entry['sargable_rewrites'] and len(entry['sargable_rewrites']) < self.max_examples:
+                        entry['sargable_rewrites'].append(suggestion)
+                if len(entry['examples']) < self.max_examples and sql not in entry['examples']:
+                    entry['examples'].append(sql)
+                self._patterns[key] = entry
+            while len(self._patterns) > self.max_patterns:
+                self._patterns.popitem(last=False)
+
+    def record_explain_failure(self):
+        with self._lock:
+            self.explain_failures += 1
+
+    def patterns(self):
+        with self._lock:
+            return sorted((dict(e) for e in self._patterns.values()), key=lambda e: e['count'], reverse=True)
+
+    def recommendations(self, existing_indexes=None):
+        """Index recommendations, most frequent pattern first.
+
+        existing_indexes maps table -> list of column lists (from SHOW INDEX); patterns an existing
+        index already serves as a leftmost prefix are skipped.
+        """
+        existing_indexes = existing_indexes or {}
+        by_index = OrderedDict()
+        for entry in self.patterns():
+            if entry['count'] < self.min_occurrences:
+                continue
+            if entry['explained'] and not entry['bad_plans']:
+                continue  # MySQL already plans this pattern well
+            columns = entry['columns']
+            covered = any([c.lower() for c in index[:len(columns)]] == [c.lower() for c in columns]
+                          for index in existing_indexes.get(entry['table'], []))
+            if covered and not entry['wrapped_columns']:
+                continue
+            key = (entry['table'], tuple(columns))
+            if key in by_index:
+                continue
+            name = f"idx_{entry['table']}_{'_'.join(c.lower() for c in columns)}"[:64]
+            recommendation = {
+                'table': entry['table'],
+                'columns': columns,
+                'ddl': None if covered else f"CREATE INDEX `{name}` ON `{entry['table']}` "
+                                            f"({', '.join(f'`{c}`' for c in columns)});",
+                'queries': entry['count'],
+                'bad_plans': entry['bad_plans'],
+                'avg_rows_examined': round(entry['rows_examined'] / entry['explained']) if entry['explained'] else None,
+                'avg_seconds': round(entry['total_seconds'] / entry['count'], 4),
+                'examples': entry['examples'],
+                'sargable_rewrites': entry['sargable_rewrites']
+            }
+            if entry['wrapped_columns']:
+                recommendation['note'] = (f"{', '.join(entry['wrapped_columns'])} is filtered through a function, "
+                                          f"which prevents index use; rewrite those predicates as ranges")
+            by_index[key] = recommendation
+        return list(by_index.values())
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'statements': self.statements,
+                'patterns': len(self._patterns),
+                'full_scans': self.full_scans,
+                'filesorts': self.filesorts,
+                'temporary_tables': self.temporary_tables,
+                'explain_failures': self.explain_failures,
+                'min_occurrences': self.min_occurrences
+            }
+
+
+def existing_indexes(cursor, tables):
+    """table -> list of index column lists, from SHOW INDEX"""
+    indexes = {}
+    for table in tables:
+        cursor.execute(f"SHOW INDEX FROM `{table}`")
+        names = [d[0] for d in cursor.description]
+        by_key = OrderedDict()
+        for row in cursor.fetchall():
+            info = dict(zip(names, row))
+            by_key.setdefault(info['Key_name'], []).append((info['Seq_in_index'], info['Column_name']))
+        indexes[table] = [[column for _, column in sorted(parts)] for parts in by_key.values()]
+    return indexes
@@ -0,0 +1,155 @@
+import threading
+import time
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """One submitted pipeline run with its stage events and final result"""
+
+    def __init__(self, job_id, description):
+        self.job_id = job_id
+        self.description = description
+        self.status = 'queued'
+        self.events = []
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.cancel_requested = False
+        self.future = None
+
+    def to_dict(self, include_result=True):
+        data = {
+            'job_id': self.job_id,
+            'status': self.status,
+            'description': self.description,
+            'events': list(self.events),
+            'created_at': self.created_at,
+            'finished_at': self.finished_at
+        }
+        if include_result and self.status in ('done', 'failed', 'cancelled'):
+            data['result'] = self.result
+            data['error'] = self.error
+        return data
+
+
+class JobQueue:
+    """Runs long pipeline calls on a worker pool and records stage-level progress.
+
+    ``submit(fn, ...)`` calls ``fn(..., progress=callback)`` on a worker thread, where
+    ``callback(stage, **details)`` appends a progress event. Finished jobs are kept for
+    ``retention_seconds`` so clients can collect results.
+    """
+
+    def __init__(self, max_workers=4, retention_seconds=3600, max_jobs=1000):
+        self.retention_seconds = retention_seconds
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='query-job')
+        self._cond = threading.Condition()
+        self._jobs = {}
+
+    def _add_event(self, job, stage, **details):
+        with self._cond:
+            self._append_event(job, stage, **details)
+
+    def _append_event(self, job, stage, **details):
+        # Caller holds self._cond
+        job.events.append(dict(details, stage=stage, seq=len(job.events), timestamp=time.time()))
+        self._cond.notify_all()
+
+    def _prune(self):
+        now = time.time()
+        finished = sorted(
+            (job for job in self._jobs.values() if job.finished_at is not None),
+            key=lambda job: job.finished_at
+        )
+        for job in finished:
+            if now - job.finished_at > self.retention_seconds or len(self._jobs) > self.max_jobs:
+                del self._jobs[job.job_id]
+
+    def _finish(self, job, status, result=None, error=None):
+        # Caller holds self._cond
+        job.result = result
+        job.error = error
+        job.status = status
+        job.finished_at = time.time()
+        # Appended under the same lock so waiters never see finished_at without the final event
+        self._append_event(job, status)
+
+    def _run(self, job, fn, args, kwargs):
+        with self._cond:
+            if job.finished_at is not None:
+                return
+            if job.cancel_requested:
+                # Cancelled while queued, after its future could no longer be cancelled
+                self._finish(job, 'cancelled', error='Cancelled')
+                return
+            job.status = 'running'
+            self._append_event(job, 'started')
+        try:
+            result = fn(*args, progress=lambda stage, **details: self._add_event(job, stage, **details), **kwargs)
+            status, error = 'done', None
+            if isinstance(result, dict) and result.get('error'):
+                status, error = 'failed', result['error']
+            if job.cancel_requested and status == 'failed':
+                status = 'cancelled'
+        except Exception as e:
+            logger.error(f"Job {job.job_id} failed: {e}")
+            result, status, error = None, 'failed', str(e)
+        with self._cond:
+            self._finish(job, status, result, error)
+
+    def submit(self, fn, *args, description=None, job_id=None, **kwargs):
+        """Queue fn for execution and return the new Job immediately"""
+        job = Job(job_id or uuid.uuid4().hex, description)
+        with self._cond:
+            self._prune()
+            self._jobs[job.job_id] = job
+            self._append_event(job, 'queued')
+            # Under the lock, so cancel() never sees a queued job without its future
+            job.future = self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def cancel(self, job_id):
+        """Cancel a queued job outright, or flag a running one as cancelled.
+
+        A running job is not interrupted here; the caller stops its work (e.g. kills its SQL) and
+        the job then finishes with status 'cancelled'. Returns the job, or None if unknown.
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished_at is not None:
+                return job
+            job.cancel_requested = True
+            if job.status == 'queued' and job.future.cancel():
+                self._finish(job, 'cancelled', error='Cancelled')
+        return job
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def wait_for_events(self, job, after_seq, timeout=15.0):
+        """Block until the job has events with seq > after_seq (or timeout); return them"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while len(job.events) <= after_seq + 1 and job.finished_at is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return job.events[after_seq + 1:]
+
+    def get_stats(self):
+        with self._cond:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {'jobs': len(self._jobs), 'by_status': counts}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,129 @@
+import json
+import os
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# A load_duration above this means Ollama (re)loaded the model for the request
+MODEL_LOAD_THRESHOLD_SECONDS = 1.0
+
+
+def _seconds(nanoseconds):
+    return round(nanoseconds / 1e9, 4) if nanoseconds is not None else None
+
+
+def _rate(count, seconds):
+    return round(count / seconds, 2) if count and seconds else None
+
+
+def extract_ollama_timings(result):
+    """Timing/throughput fields from an Ollama /api/generate final response (durations are in ns)"""
+    prompt_eval_seconds = _seconds(result.get('prompt_eval_duration'))
+    eval_seconds = _seconds(result.get('eval_duration'))
+    load_seconds = _seconds(result.get('load_duration'))
+    return {
+        'prompt_eval_count': result.get('prompt_eval_count'),
+        'prompt_eval_seconds': prompt_eval_seconds,
+        'eval_count': result.get('eval_count'),
+        'eval_seconds': eval_seconds,
+        'load_seconds': load_seconds,
+        'total_seconds': _seconds(result.get('total_duration')),
+        'prompt_tokens_per_sec': _rate(result.get('prompt_eval_count'), prompt_eval_seconds),
+        'eval_tokens_per_sec': _rate(result.get('eval_count'), eval_seconds),
+        'model_loaded': bool(load_seconds and load_seconds > MODEL_LOAD_THRESHOLD_SECONDS)
+    }
+
+
+def estimate_stream_timings(prompt_tokens, token_events, ttft_seconds, eval_seconds, model_resident):
+    """Timing fields for a stream closed before Ollama's final event, which carries its own timings.
+
+    model_resident is whether Ollama had the model loaded when the request was sent (from /api/ps),
+    or None if that is unknown. A model that wasn't resident was loaded for the request, and its
+    time to first token bounds the load time; for a resident model the time to first token is
+    mostly prompt evaluation. Unknown values are None, never False or 0.
+    """
+    loaded = None if model_resident is None else not model_resident
+    prompt_eval_seconds = ttft_seconds if model_resident else None
+    return {
+        'prompt_eval_count': prompt_tokens if model_resident else None,
+        'prompt_eval_seconds': prompt_eval_seconds,
+        'eval_count': token_events,
+        'eval_seconds': eval_seconds,
+        'load_seconds': ttft_seconds if loaded else None,
+        'total_seconds': None,
+        'prompt_tokens_per_sec': _rate(prompt_tokens, prompt_eval_seconds),
+        'eval_tokens_per_sec': _rate(token_events, eval_seconds),
+        'model_loaded': loaded,
+        'timings_estimated': True
+    }
+
+
+def _tail_lines(path, limit, block_size=65536):
+    """Up to the last `limit` non-empty lines of a file, read backwards from the end in blocks"""
+    if limit <= 0 or not os.path.exists(path):
+        return []
+    with open(path, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        data = b''
+        while position > 0 and data.count(b'\n') <= limit:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    lines = [line for line in data.split(b'\n') if line.strip()]
+    if position > 0:
+        lines = lines[1:]  # Possibly cut off at the block boundary
+    return lines[-limit:]
+
+
+def read_recent_llm_metrics(path, limit=500):
+    """Last `limit` entries of the JSONL metrics store (oldest first), continuing into the rotated
+    path.1 when the current file is shorter; only the tail of each file is read"""
+    lines = _tail_lines(path, limit)
+    if len(lines) < limit:
+        lines = _tail_lines(f"{path}.1", limit - len(lines)) + lines
+    entries = []
+    for line in lines:
+        try:
+            entries.append(json.loads(line))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            continue
+    return entries
+
+
+def _percentiles(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return {'p50': None, 'p95': None, 'p99': None, 'mean': None, 'count': 0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99]).tolist()
+    return {
+        'p50': round(p50, 4),
+        'p95': round(p95, 4),
+        'p99': round(p99, 4),
+        'mean': round(float(np.mean(values)), 4),
+        'count': len(values)
+    }
+
+
+def summarize_llm_metrics(entries):
+    """Latency percentiles, throughput and model load events over a list of metrics entries"""
+    load_events = [
+        {'timestamp': e.get('timestamp'), 'model': e.get('model'), 'load_seconds': e.get('load_seconds')}
+        for e in entries if e.get('model_loaded')
+    ]
+    return {
+        'requests': len(entries),
+        'wall_seconds': _percentiles([e.get('wall_seconds') for e in entries]),
+        'time_to_first_token_seconds': _percentiles([e.get('ttft_seconds') for e in entries]),
+        'prompt_eval_seconds': _percentiles([e.get('prompt_eval_seconds') for e in entries]),
+        'eval_seconds': _percentiles([e.get('eval_seconds') for e in entries]),
+        'prompt_tokens_per_sec': _percentiles([e.get('prompt_tokens_per_sec') for e in entries]),
+        'eval_tokens_per_sec': _percentiles([e.get('eval_tokens_per_sec') for e in entries]),
+        'prompt_eval_count': _percentiles([e.get('prompt_eval_count') for e in entries]),
+        'eval_count': _percentiles([e.get('eval_count') for e in entries]),
+        'stopped_early': sum(1 for e in entries if e.get('stopped_early')),
+        'model_load_events': len(load_events),
+        'recent_load_events': load_events[-10:],
+        'models': sorted({e.get('model') for e in entries if e.get('model')})
+    }
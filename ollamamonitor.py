@@ -1,10 +1,14 @@
-from flask import Flask, jsonify, render_template_string
+from flask import Flask, Response, jsonify, render_template_string, request
 import psutil
 import time
+import threading
 import requests
 import json
 from datetime import datetime
 import logging
+import numpy as np
+from llmtelemetry import read_recent_llm_metrics, summarize_llm_metrics
+from metrics import Counter, Gauge, generate_latest, CONTENT_TYPE as METRICS_CONTENT_TYPE
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -18,27 +22,322 @@ LLM_CONFIG = {
     'model_name': 'llama2'  # Replace with your actual model name
 }
 
+MONITOR_CONFIG = {
+    'sample_interval_seconds': 2,         # How often the background sampler records system metrics
+    'history_size': 1800,                 # Samples kept in the ring buffer (1 hour at 2s)
+    'ollama_process_names': ('ollama',),  # Processes whose name contains one of these are tracked
+    'process_refresh_samples': 15,        # Re-scan the process table every N samples
+    'tags_probe_ttl_seconds': 2,          # Reuse one /api/tags result for this long across all endpoints
+    'tags_probe_timeout_seconds': 10,
+    'llm_metrics_path': 'llm_metrics.jsonl',  # Per-request LLM timings written by webinterface7
+    'llm_metrics_window': 500,                # Most recent requests aggregated on the dashboard
+    'llm_metrics_ttl_seconds': 5              # Reuse one read + summary of the store across /metrics gauges
+}
+
+SAMPLE_FIELDS = (
+    'timestamp', 'cpu_percent', 'memory_percent', 'memory_available_gb', 'disk_usage_percent',
+    'ollama_rss_mb', 'ollama_cpu_percent', 'ollama_process_count',
+    'net_sent_bytes_per_sec', 'net_recv_bytes_per_sec'
+)
+
+
+class MetricRingBuffer:
+    """Fixed-size ring buffer of samples stored in a preallocated (capacity x fields) float array"""
+
+    def __init__(self, fields, capacity):
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        self._data = np.full((capacity, len(self.fields)), np.nan, dtype=np.float64)
+        self._next = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def append(self, values):
+        with self._lock:
+            self._data[self._next] = values
+            self._next = (self._next + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def latest(self):
+        """Most recent sample as a dict, or None if empty"""
+        with self._lock:
+            if not self._count:
+                return None
+            row = self._data[(self._next - 1) % self.capacity].copy()
+        return dict(zip(self.fields, row.tolist()))
+
+    def snapshot(self, since=None):
+        """Samples in chronological order (optionally only those with timestamp >= since)"""
+        with self._lock:
+            if self._count < self.capacity:
+                data = self._data[:self._count].copy()
+            else:
+                data = np.roll(self._data, -self._next, axis=0)
+        if since is not None and len(data):
+            data = data[data[:, 0] >= since]
+        return data
+
+    def __len__(self):
+        return self._count
+
+
+def downsample(data, points):
+    """Average consecutive samples into at most `points` buckets"""
+    if len(data) <= points or points <= 0:
+        return data
+    edges = np.linspace(0, len(data), points + 1).astype(int)
+    return np.add.reduceat(data, edges[:-1], axis=0) / np.diff(edges)[:, None]
+
+
+class SystemSampler(threading.Thread):
+    """Background thread that records system and Ollama process metrics into a ring buffer"""
+
+    def __init__(self, interval, history_size):
+        super().__init__(name='system-sampler', daemon=True)
+        self.interval = interval
+        self.buffer = MetricRingBuffer(SAMPLE_FIELDS, history_size)
+        self._stop_event = threading.Event()
+        self._processes = {}
+        self._samples_taken = 0
+        self._last_net = None
+
+    def _refresh_processes(self):
+        names = MONITOR_CONFIG['ollama_process_names']
+        current = {}
+        for proc in psutil.process_iter(['name']):
+            name = (proc.info.get('name') or '').lower()
+            if any(target in name for target in names):
+                # Reuse known Process objects so cpu_percent keeps its previous reading
+                current[proc.pid] = self._processes.get(proc.pid, proc)
+        self._processes = current
+
+    def _ollama_usage(self):
+        if self._samples_taken % MONITOR_CONFIG['process_refresh_samples'] == 0:
+            self._refresh_processes()
+        rss = 0
+        cpu = 0.0
+        for pid, proc in list(self._processes.items()):
+            try:
+                with proc.oneshot():
+                    rss += proc.memory_info().rss
+                    cpu += proc.cpu_percent(interval=None)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                self._processes.pop(pid, None)
+        return rss / (1024 ** 2), cpu, len(self._processes)
+
+    def _net_rates(self, now):
+        counters = psutil.net_io_counters()
+        previous, self._last_net = self._last_net, (now, counters.bytes_sent, counters.bytes_recv)
+        if previous is None or now <= previous[0]:
+            return 0.0, 0.0
+        elapsed = now - previous[0]
+        return (counters.bytes_sent - previous[1]) / elapsed, (counters.bytes_recv - previous[2]) / elapsed
+
+    def sample(self):
+        now = time.time()
+        memory = psutil.virtual_memory()
+        ollama_rss_mb, ollama_cpu, ollama_count = self._ollama_usage()
+        sent_rate, recv_rate = self._net_rates(now)
+        self.buffer.append((
+            now,
+            psutil.cpu_percent(interval=None),  # Usage since the previous sample; never sleeps
+            memory.percent,
+            memory.available / (1024 ** 3),
+            psutil.disk_usage('/').percent,
+            ollama_rss_mb,
+            ollama_cpu,
+            ollama_count,
+            sent_rate,
+            recv_rate
+        ))
+        self._samples_taken += 1
+
+    def run(self):
+        psutil.cpu_percent(interval=None)  # Prime the counter so the first reading is meaningful
+        while not self._stop_event.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error(f"System sampler error: {e}")
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class TagsProbe:
+    """Cached, coalesced probe of {endpoint}/api/tags over a pooled HTTP session.
+
+    Results are reused for ``ttl`` seconds. When the cache is stale, the first caller
+    performs the request and concurrent callers wait for that single in-flight probe
+    instead of issuing their own.
+    """
+
+    def __init__(self, ttl, timeout):
+        self.ttl = ttl
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._lock = threading.Lock()
+        self._result = None
+        self._expires_at = 0.0
+        self._in_flight = None
+        self.probes = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+
+    def _probe(self):
+        start_time = time.time()
+        result = {'probed_at': datetime.now().isoformat()}
+        try:
+            response = self.session.get(f"{LLM_CONFIG['endpoint']}/api/tags", timeout=self.timeout)
+            result.update(
+                ok=response.status_code == 200,
+                status_code=response.status_code,
+                data=response.json() if response.status_code == 200 else None,
+                error=None if response.status_code == 200 else response.text
+            )
+        except Exception as e:
+            result.update(ok=False, status_code=None, data=None, error=str(e))
+        result['response_time_seconds'] = round(time.time() - start_time, 2)
+        return result
+
+    def get(self):
+        """Latest /api/tags result: {'ok', 'status_code', 'data', 'error', 'response_time_seconds', 'probed_at'}"""
+        with self._lock:
+            if self._result is not None and time.monotonic() < self._expires_at:
+                self.cache_hits += 1
+                return self._result
+            in_flight = self._in_flight
+            if in_flight is None:
+                self._in_flight = in_flight = threading.Event()
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            in_flight.wait(self.timeout + 1)
+            with self._lock:
+                return self._result or {'ok': False, 'status_code': None, 'data': None,
+                                        'error': 'Timed out waiting for in-flight probe',
+                                        'response_time_seconds': None, 'probed_at': None}
+
+        result = None
+        try:
+            result = self._probe()
+        finally:
+            with self._lock:
+                if result is not None:
+                    self._result = result
+                    self._expires_at = time.monotonic() + self.ttl
+                self._in_flight = None
+            in_flight.set()
+        with self._lock:
+            self.probes += 1
+        return result
+
+
+class LLMMetricsSummary:
+    """summarize_llm_metrics() over the most recent entries of the LLM metrics store, recomputed at
+    most once per ``ttl`` seconds so every gauge of a /metrics scrape shares one read of the file"""
+
+    def __init__(self, path, window, ttl):
+        self.path = path
+        self.window = window
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._summary = None
+        self._expires_at = 0.0
+        self.reads = 0
+
+    def get(self):
+        with self._lock:
+            if self._summary is None or time.monotonic() >= self._expires_at:
+                self._summary = summarize_llm_metrics(read_recent_llm_metrics(self.path, self.window))
+                self._expires_at = time.monotonic() + self.ttl
+                self.reads += 1
+            return self._summary
+
+
+tags_probe = TagsProbe(MONITOR_CONFIG['tags_probe_ttl_seconds'], MONITOR_CONFIG['tags_probe_timeout_seconds'])
+
+sampler = SystemSampler(MONITOR_CONFIG['sample_interval_seconds'], MONITOR_CONFIG['history_size'])
+llm_metrics_summary = LLMMetricsSummary(MONITOR_CONFIG['llm_metrics_path'], MONITOR_CONFIG['llm_metrics_window'],
+                                        MONITOR_CONFIG['llm_metrics_ttl_seconds'])
+sampler.start()
+
+# Prometheus metrics served on /metrics; values are read from the sampler, probe and LLM metrics store at scrape time
+def _latest_sample(field):
+    latest = sampler.buffer.latest()
+    return latest[field] if latest is not None else None
+
+def _llm_quantiles(field):
+    summary = llm_metrics_summary.get()[field]
+    return {quantile: summary[key] for quantile, key in (('0.5', 'p50'), ('0.95', 'p95'), ('0.99', 'p99'))
+            if summary[key] is not None}
+
+for _field, _help in (
+    ('cpu_percent', 'System CPU utilisation percent'),
+    ('memory_percent', 'System memory utilisation percent'),
+    ('memory_available_gb', 'Available system memory in GB'),
+    ('disk_usage_percent', 'Root filesystem utilisation percent'),
+    ('ollama_rss_mb', 'Resident memory of Ollama processes in MB'),
+    ('ollama_cpu_percent', 'CPU utilisation of Ollama processes percent'),
+    ('ollama_process_count', 'Number of running Ollama processes'),
+    ('net_sent_bytes_per_sec', 'Network bytes sent per second'),
+    ('net_recv_bytes_per_sec', 'Network bytes received per second'),
+):
+    Gauge(f'ollama_monitor_{_field}', _help, fn=lambda field=_field: _latest_sample(field))
+
+Gauge('ollama_up', 'Whether the Ollama /api/tags probe succeeded', fn=lambda: 1 if tags_probe.get()['ok'] else 0)
+Counter('ollama_monitor_tags_probes_total', '/api/tags requests sent by the monitor', fn=lambda: tags_probe.probes)
+Counter('ollama_monitor_tags_probe_cache_hits_total', '/api/tags probes served from cache',
+        fn=lambda: tags_probe.cache_hits)
+for _field, _help in (
+    ('wall_seconds', 'LLM request wall time over recent requests'),
+    ('time_to_first_token_seconds', 'Time to first streamed token over recent requests'),
+    ('eval_tokens_per_sec', 'Generation throughput in tokens per second over recent requests'),
+    ('prompt_tokens_per_sec', 'Prompt evaluation throughput in tokens per second over recent requests'),
+):
+    Gauge(f'ollama_llm_{_field}', _help, ['quantile'], fn=lambda field=_field: _llm_quantiles(field))
+
 # Monitoring functions
 def get_ollama_status():
     """Check if Ollama is running and get basic info"""
-    try:
-        response = requests.get(f"{LLM_CONFIG['endpoint']}/api/tags", timeout=5)
-        if response.status_code == 200:
-            models = response.json()
-            return {
-                'status': 'running',
-                'models': models.get('models', []),
-                'model_count': len(models.get('models', []))
-            }
-    except Exception as e:
-        logger.error(f"Error checking Ollama status: {e}")
-        return {'status': 'not_running', 'models': [], 'model_count': 0}
+    probe = tags_probe.get()
+    if probe['ok']:
+        models = probe['data'].get('models', [])
+        return {
+            'status': 'running',
+            'models': models,
+            'model_count': len(models)
+        }
+    logger.error(f"Error checking Ollama status: {probe['error']}")
+    return {'status': 'not_running', 'models': [], 'model_count': 0}
 
 def get_system_resources():
-    """Get system resource usage"""
+    """Get system resource usage from the sampler's latest sample"""
+    latest = sampler.buffer.latest()
+    if latest is not None:
+        return {
+            'cpu_percent': round(latest['cpu_percent'], 1),
+            'memory_percent': round(latest['memory_percent'], 1),
+            'memory_available_gb': round(latest['memory_available_gb'], 2),
+            'disk_usage_percent': round(latest['disk_usage_percent'], 1),
+            'ollama_rss_mb': round(latest['ollama_rss_mb'], 1),
+            'ollama_cpu_percent': round(latest['ollama_cpu_percent'], 1),
+            'ollama_process_count': int(latest['ollama_process_count']),
+            'net_sent_bytes_per_sec': round(latest['net_sent_bytes_per_sec']),
+            'net_recv_bytes_per_sec': round(latest['net_recv_bytes_per_sec']),
+            'sampled_at': datetime.fromtimestamp(latest['timestamp']).isoformat()
+        }
     try:
+        # No sample yet (sampler just started): take a non-blocking reading
         return {
-            'cpu_percent': psutil.cpu_percent(interval=1),
+            'cpu_percent': psutil.cpu_percent(interval=None),
             'memory_percent': psutil.virtual_memory().percent,
             'memory_available_gb': round(psutil.virtual_memory().available / (1024**3), 2),
             'disk_usage_percent': psutil.disk_usage('/').percent
@@ -54,34 +353,19 @@ def get_system_resources():
 
 def test_ollama_connectivity():
     """Test basic Ollama connectivity without sending a query"""
-    start_time = time.time()
-    try:
-        # Just ping the tags endpoint to test connectivity
-        response = requests.get(f"{LLM_CONFIG['endpoint']}/api/tags", timeout=10)
-        end_time = time.time()
-        
-        if response.status_code == 200:
-            return {
-                'success': True,
-                'response_time_seconds': round(end_time - start_time, 2),
-                'status_code': response.status_code,
-                'test_type': 'connectivity_check'
-            }
-        else:
-            return {
-                'success': False,
-                'response_time_seconds': round(end_time - start_time, 2),
-                'status_code': response.status_code,
-                'error': response.text,
-                'test_type': 'connectivity_check'
-            }
-    except Exception as e:
-        return {
-            'success': False,
-            'response_time_seconds': round(time.time() - start_time, 2),
-            'error': str(e),
-            'test_type': 'connectivity_check'
-        }
+    # Just ping the tags endpoint to test connectivity (shared with the status/health checks)
+    probe = tags_probe.get()
+    result = {
+        'success': probe['ok'],
+        'response_time_seconds': probe['response_time_seconds'],
+        'test_type': 'connectivity_check',
+        'probed_at': probe['probed_at']
+    }
+    if probe['status_code'] is not None:
+        result['status_code'] = probe['status_code']
+    if not probe['ok']:
+        result['error'] = probe['error']
+    return result
 
 # Flask routes
 @app.route('/')
@@ -274,6 +558,38 @@ def index():
                         <span class="metric-label">Disk Usage:</span>
                         <span class="metric-value" id="disk-usage">-</span>
                     </div>
+                    <div class="metric">
+                        <span class="metric-label">Ollama Memory / CPU:</span>
+                        <span class="metric-value" id="ollama-process">-</span>
+                    </div>
+                </div>
+
+                <div class="card">
+                    <h3>⚡ LLM Inference</h3>
+                    <div class="metric">
+                        <span class="metric-label">Requests (recent):</span>
+                        <span class="metric-value" id="llm-requests">-</span>
+                    </div>
+                    <div class="metric">
+                        <span class="metric-label">Latency p50 / p95 / p99:</span>
+                        <span class="metric-value" id="llm-latency">-</span>
+                    </div>
+                    <div class="metric">
+                        <span class="metric-label">Time to First Token p50:</span>
+                        <span class="metric-value" id="llm-ttft">-</span>
+                    </div>
+                    <div class="metric">
+                        <span class="metric-label">Generation Speed p50:</span>
+                        <span class="metric-value" id="llm-eval-rate">-</span>
+                    </div>
+                    <div class="metric">
+                        <span class="metric-label">Prompt Speed p50:</span>
+                        <span class="metric-value" id="llm-prompt-rate">-</span>
+                    </div>
+                    <div class="metric">
+                        <span class="metric-label">Model Load Events:</span>
+                        <span class="metric-value" id="llm-loads">-</span>
+                    </div>
                 </div>
 
                 <div class="card">
@@ -326,6 +642,8 @@ def index():
                 document.getElementById('memory-usage').textContent = `${resources.memory_percent}%`;
                 document.getElementById('memory-available').textContent = `${resources.memory_available_gb} GB`;
                 document.getElementById('disk-usage').textContent = `${resources.disk_usage_percent}%`;
+                document.getElementById('ollama-process').textContent = resources.ollama_rss_mb !== undefined
+                    ? `${resources.ollama_rss_mb} MB / ${resources.ollama_cpu_percent}%` : '-';
 
                 // Update models list
                 const modelsList = document.getElementById('models-list');
@@ -337,6 +655,8 @@ def index():
                     modelsList.innerHTML = '<div class="model-item">No models found</div>';
                 }
 
+                await loadLlmMetrics();
+
                 // Update timestamp
                 document.getElementById('timestamp').textContent = 
                     `Last updated: ${new Date(data.timestamp).toLocaleString()}`;
@@ -351,6 +671,24 @@ def index():
             }
         }
 
+        async function loadLlmMetrics() {
+            const fmt = (value, unit) => value === null || value === undefined ? '-' : `${value}${unit}`;
+            try {
+                const response = await fetch('/ollama/llm-metrics');
+                const metrics = await response.json();
+                const wall = metrics.wall_seconds;
+                document.getElementById('llm-requests').textContent = metrics.requests;
+                document.getElementById('llm-latency').textContent =
+                    `${fmt(wall.p50, 's')} / ${fmt(wall.p95, 's')} / ${fmt(wall.p99, 's')}`;
+                document.getElementById('llm-ttft').textContent = fmt(metrics.time_to_first_token_seconds.p50, 's');
+                document.getElementById('llm-eval-rate').textContent = fmt(metrics.eval_tokens_per_sec.p50, ' tok/s');
+                document.getElementById('llm-prompt-rate').textContent = fmt(metrics.prompt_tokens_per_sec.p50, ' tok/s');
+                document.getElementById('llm-loads').textContent = metrics.model_load_events;
+            } catch (error) {
+                console.error('Error loading LLM metrics:', error);
+            }
+        }
+
         // Load status on page load
         loadStatus();
 
@@ -381,29 +719,79 @@ def ollama_status():
         logger.error(f"Error getting ollama status: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/ollama/models')
-def ollama_models():
-    """List all available Ollama models with details"""
+@app.route('/ollama/history')
+def ollama_history():
+    """Sampled system/Ollama metrics for the last `window` seconds, downsampled to `points` buckets"""
+    try:
+        window = request.args.get('window', default=600, type=float)
+        points = request.args.get('points', default=120, type=int)
+        fields = request.args.get('fields')
+        fields = [f for f in fields.split(',') if f in SAMPLE_FIELDS] if fields else list(SAMPLE_FIELDS[1:])
+
+        data = sampler.buffer.snapshot(since=time.time() - window)
+        data = downsample(data, points)
+        columns = {name: i for i, name in enumerate(SAMPLE_FIELDS)}
+        return jsonify({
+            'window_seconds': window,
+            'sample_interval_seconds': sampler.interval,
+            'points': len(data),
+            'timestamps': [round(t, 3) for t in data[:, 0].tolist()],
+            'series': {name: np.round(data[:, columns[name]], 3).tolist() for name in fields}
+        })
+    except Exception as e:
+        logger.error(f"Error getting metric history: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/ollama/llm-metrics')
+def ollama_llm_metrics():
+    """Percentiles of LLM latency/throughput and model load events over recent /query requests"""
     try:
-        response = requests.get(f"{LLM_CONFIG['endpoint']}/api/tags")
-        if response.status_code == 200:
-            return jsonify(response.json())
-        else:
-            return jsonify({'error': 'Failed to fetch models'}), 500
+        limit = request.args.get('limit', default=MONITOR_CONFIG['llm_metrics_window'], type=int)
+        entries = read_recent_llm_metrics(MONITOR_CONFIG['llm_metrics_path'], limit)
+        summary = summarize_llm_metrics(entries)
+        if request.args.get('include_entries'):
+            summary['entries'] = entries
+        return jsonify(summary)
     except Exception as e:
+        logger.error(f"Error reading LLM metrics: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/ollama/models')
+def ollama_models():
+    """List all available Ollama models with details"""
+    probe = tags_probe.get()
+    if probe['ok']:
+        return jsonify(probe['data'])
+    elif probe['status_code'] is not None:
+        return jsonify({'error': 'Failed to fetch models'}), 500
+    else:
+        return jsonify({'error': probe['error']}), 500
+
 @app.route('/ollama/health')
 def ollama_health():
     """Simple health check endpoint"""
-    try:
-        response = requests.get(f"{LLM_CONFIG['endpoint']}/api/tags", timeout=5)
-        if response.status_code == 200:
-            return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
-        else:
-            return jsonify({'status': 'unhealthy', 'timestamp': datetime.now().isoformat()}), 503
-    except Exception as e:
-        return jsonify({'status': 'unhealthy', 'error': str(e), 'timestamp': datetime.now().isoformat()}), 503
+    probe = tags_probe.get()
+    if probe['ok']:
+        return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
+    elif probe['status_code'] is not None:
+        return jsonify({'status': 'unhealthy', 'timestamp': datetime.now().isoformat()}), 503
+    else:
+        return jsonify({'status': 'unhealthy', 'error': probe['error'], 'timestamp': datetime.now().isoformat()}), 503
+
+@app.route('/ollama/probe-stats')
+def ollama_probe_stats():
+    """How many /api/tags requests were actually sent versus served from cache or coalesced"""
+    return jsonify({
+        'probes': tags_probe.probes,
+        'cache_hits': tags_probe.cache_hits,
+        'coalesced': tags_probe.coalesced,
+        'ttl_seconds': tags_probe.ttl
+    })
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus text exposition of system, Ollama process, probe and LLM latency metrics"""
+    return Response(generate_latest(), content_type=METRICS_CONTENT_TYPE)
 
 # Optional: Performance logging
 def log_query_performance(natural_query, sql_query, execution_time, success):
@@ -23,7 +23,7 @@ export default function Page() {
             const response = await fetch("http://localhost:5000/query", {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ query, include_csv_id: true }),
+                body: JSON.stringify({ query, include_csv_id: true, graph_mode: 'data' }),
             });
 
             if (!response.ok) {
@@ -405,11 +405,11 @@ export default function Page() {
                                 {/* Results */}
                                 {results.results && results.results.rows.length > 0 ? (
                                     <div
-                                        className={`grid gap-8 ${results.graph ? 'lg:grid-cols-2' : 'grid-cols-1'}`}
+                                        className={`grid gap-8 ${results.graph || results.chart_data ? 'lg:grid-cols-2' : 'grid-cols-1'}`}
                                         data-oid="xwrev:7"
                                     >
                                         {/* Graph */}
-                                        {results.graph && (
+                                        {(results.graph || results.chart_data) && (
                                             <div
                                                 className="text-center p-4 rounded-lg shadow-md"
                                                 style={{ backgroundColor: '#313244' }}
@@ -422,12 +422,30 @@ export default function Page() {
                                                 >
                                                     Data Visualization
                                                 </div>
-                                                <img
-                                                    src={`data:image/png;base64,${results.graph}`}
-                                                    alt="Data Visualization Chart"
-                                                    className="max-w-full h-auto block mx-auto rounded"
-                                                    data-oid="nvtrmdv"
-                                                />
+                                                {results.graph ? (
+                                                    <img
+                                                        src={`data:image/png;base64,${results.graph}`}
+                                                        alt="Data Visualization Chart"
+                                                        className="max-w-full h-auto block mx-auto rounded"
+                                                        data-oid="nvtrmdv"
+                                                    />
+                                                ) : (
+                                                    <SeriesChart
+                                                        data={results.chart_data}
+                                                        config={results.graph_config}
+                                                    />
+                                                )}
+                                                {results.graph_url && (
+                                                    <a
+                                                        href={`${API_BASE_URL}${results.graph_url.replace(/^\//, '')}`}
+                                                        target="_blank"
+                                                        rel="noreferrer"
+                                                        className="text-sm underline mt-2 inline-block"
+                                                        style={{ color: '#89b4fa' }}
+                                                    >
+                                                        Open as PNG
+                                                    </a>
+                                                )}
                                             </div>
                                         )}
 
@@ -530,3 +548,48 @@ export default function Page() {
         </div>
     );
 }
+
+const SERIES_COLORS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd'];
+
+// Draws the downsampled columnar series returned by /query with graph_mode 'data'
+function SeriesChart({ data, config }: { data: any; config: any }) {
+    const width = 600;
+    const height = 400;
+    const pad = 40;
+    const values: number[] = data.series.flatMap((s: any) => s.values);
+    const min = Math.min(0, ...values);
+    const max = Math.max(...values);
+    const span = max - min || 1;
+    const n = data.x.length;
+    const px = (i: number) => pad + (n > 1 ? (i / (n - 1)) * (width - 2 * pad) : 0);
+    const py = (v: number) => height - pad - ((v - min) / span) * (height - 2 * pad);
+
+    return (
+        <svg viewBox={`0 0 ${width} ${height}`} className="w-full h-auto rounded" style={{ background: '#f8f9fa' }}>
+            <line x1={pad} y1={height - pad} x2={width - pad} y2={height - pad} stroke="#999" />
+            <line x1={pad} y1={pad} x2={pad} y2={height - pad} stroke="#999" />
+            {data.series.map((s: any, k: number) => {
+                const points = s.values.map((v: number, i: number) => `${px(i)},${py(v)}`).join(' ');
+                const color = SERIES_COLORS[k % SERIES_COLORS.length];
+                return config.type === 'area' ? (
+                    <polygon
+                        key={s.label}
+                        points={`${px(0)},${py(min)} ${points} ${px(n - 1)},${py(min)}`}
+                        fill={color}
+                        fillOpacity={0.6}
+                        stroke={color}
+                    />
+                ) : (
+                    <polyline key={s.label} points={points} fill="none" stroke={color} strokeWidth={2} />
+                );
+            })}
+            <text x={pad} y={pad - 10} fontSize="12" fill="#333">
+                {config.y_labels.join(', ')} ({min.toFixed(1)} – {max.toFixed(1)})
+            </text>
+            <text x={pad} y={height - 10} fontSize="12" fill="#333">{data.x[0]}</text>
+            <text x={width - pad} y={height - 10} fontSize="12" fill="#333" textAnchor="end">
+                {data.x[n - 1]}
+            </text>
+        </svg>
+    );
+}
@@ -0,0 +1,335 @@
+import os
+import sys
+import time
+import threading
+import logging
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_result_bytes(rows, graph_data=None, sample_size=100):
+    """Approximate in-memory footprint of a result set from a sample of its rows"""
+    total = sys.getsizeof(rows)
+    if rows:
+        sample = rows[:sample_size]
+        sample_bytes = sum(sys.getsizeof(row) + sum(sys.getsizeof(cell) for cell in row) for row in sample)
+        total += int(sample_bytes * len(rows) / len(sample))
+    if graph_data:
+        total += sys.getsizeof(graph_data)
+    return total
+
+
+def estimate_array_bytes(column_arrays, sample_size=100):
+    """Approximate footprint of typed column arrays (object columns are sampled like rows)"""
+    total = 0
+    for array in column_arrays:
+        total += array.nbytes
+        if array.dtype.kind == 'O' and len(array):
+            sample = array[:sample_size]
+            total += int(sum(sys.getsizeof(value) for value in sample) * len(array) / len(sample))
+    return total
+
+
+# Python types stored as text in a spill file and parsed back on load; the first match wins
+_TEXT_KINDS = (
+    ('decimal', Decimal, Decimal),
+    ('datetime', datetime, datetime.fromisoformat),
+    ('date', date, date.fromisoformat),
+)
+_TEXT_PARSERS = {kind: parse for kind, _, parse in _TEXT_KINDS}
+
+
+def _column_to_array(values):
+    """Pack one result column into a typed array, a null mask and the kind needed to restore its values"""
+    mask = np.array([v is None for v in values], dtype=bool)
+    present = [v for v in values if v is not None]
+    if present and all(isinstance(v, (int, np.integer)) and not isinstance(v, bool) for v in present):
+        return np.array([0 if v is None else v for v in values], dtype=np.int64), mask, 'int'
+    if present and all(isinstance(v, (float, np.floating)) for v in present):
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64), mask, 'float'
+    # Decimals and dates are stored in their exact string form (what CSV export writes) and parsed back on load
+    kind = 'text'
+    for name, cls, _ in _TEXT_KINDS:
+        if present and all(isinstance(v, cls) for v in present):
+            kind = name
+            break
+    text = [('' if v is None else v.isoformat(' ') if isinstance(v, datetime) else str(v)) for v in values]
+    return np.array(text, dtype=np.str_), mask, kind
+
+
+def _array_to_values(data, mask, kind):
+    """Column values from _column_to_array output, with NULLs as None and text kinds parsed back"""
+    parse = _TEXT_PARSERS.get(kind)
+    return [None if null else parse(value) if parse else value for value, null in zip(data.tolist(), mask)]
+
+
+def _stored_kind(npz, i):
+    # Files written before kinds were recorded hold plain text
+    return str(npz[f'kind_{i}']) if f'kind_{i}' in npz.files else 'text'
+
+
+def save_results_npz(path, columns, rows, graph_data=None):
+    """Write a result set column-wise to a compressed .npz file"""
+    arrays = {'columns': np.array(columns, dtype=np.str_)}
+    for i in range(len(columns)):
+        data, mask, kind = _column_to_array([row[i] for row in rows])
+        arrays[f'col_{i}'] = data
+        arrays[f'mask_{i}'] = mask
+        arrays[f'kind_{i}'] = np.array(kind)
+    if graph_data:
+        arrays['graph_data'] = np.array(graph_data, dtype=np.str_)
+    np.savez_compressed(path, **arrays)
+
+
+def load_results_npz(path):
+    """Read a result set written by save_results_npz back into columns, rows and graph data"""
+    with np.load(path, allow_pickle=False) as npz:
+        columns = npz['columns'].tolist()
+        column_values = []
+        for i in range(len(columns)):
+            column_values.append(_array_to_values(npz[f'col_{i}'], npz[f'mask_{i}'], _stored_kind(npz, i)))
+        graph_data = str(npz['graph_data']) if 'graph_data' in npz.files else None
+    rows = list(zip(*column_values)) if column_values else []
+    return columns, rows, graph_data
+
+
+def save_columns_npz(path, columns, column_arrays):
+    """Write typed column arrays to a compressed .npz file; object columns are stored as text plus a null mask"""
+    arrays = {'columns': np.array(columns, dtype=np.str_)}
+    for i, array in enumerate(column_arrays):
+        if array.dtype.kind == 'O':
+            data, mask, kind = _column_to_array(array.tolist())
+            arrays[f'mask_{i}'] = mask
+            arrays[f'kind_{i}'] = np.array(kind)
+        else:
+            data = array
+        arrays[f'col_{i}'] = data
+    np.savez_compressed(path, **arrays)
+
+
+def load_columns_npz(path):
+    """Read columns and typed arrays written by save_columns_npz"""
+    with np.load(path, allow_pickle=False) as npz:
+        columns = npz['columns'].tolist()
+        column_arrays = []
+        for i in range(len(columns)):
+            data = npz[f'col_{i}']
+            if f'mask_{i}' in npz.files:
+                values = np.empty(len(data), dtype=object)
+                values[:] = _array_to_values(data, npz[f'mask_{i}'], _stored_kind(npz, i))
+                data = values
+            column_arrays.append(data)
+    return columns, column_arrays
+
+
+class ResultCache:
+    """Bounded LRU cache of query results for CSV export.
+
+    Entries expire after ``ttl_seconds``. The in-memory part is bounded by ``max_entries``
+    and ``max_bytes``; result sets larger than ``spill_threshold_bytes`` are written to
+    ``spill_dir`` as compressed npz files and only their metadata stays in memory.
+
+    Result sets with more than ``max_cached_rows`` rows, and entries evicted to stay within
+    budget, keep only their SQL (up to ``max_sql_only`` of them) so an export can re-run it.
+
+    A result can be cached either as row tuples or, with ``rows=None``, as typed
+    ``column_arrays``; ``get`` returns it in the same form.
+    """
+
+    def __init__(self, max_entries=100, max_bytes=256 * 1024 * 1024, ttl_seconds=3600,
+                 spill_threshold_bytes=8 * 1024 * 1024, spill_dir=None, max_spill_bytes=2 * 1024 * 1024 * 1024,
+                 max_cached_rows=None, max_sql_only=1000):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.spill_threshold_bytes = spill_threshold_bytes
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+        self.max_cached_rows = max_cached_rows
+        self.max_sql_only = max_sql_only
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()  # csv_id -> entry dict, least recently used first
+        self._sql_only = OrderedDict()  # csv_id -> (sql_query, created_at) for results no longer held
+        self._memory_bytes = 0
+        self._spill_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.spills = 0
+
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            self._remove_orphaned_spills()
+
+    def _remove_orphaned_spills(self):
+        """Delete spill files left by earlier processes; their index died with them. Files younger than
+        the TTL may belong to another live process sharing spill_dir and are left alone."""
+        cutoff = time.time() - (self.ttl_seconds or 0)
+        for name in os.listdir(self.spill_dir):
+            path = os.path.join(self.spill_dir, name)
+            try:
+                if name.endswith('.npz') and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError as e:
+                logger.warning(f"Could not remove orphaned spilled result {path}: {e}")
+
+    def close(self):
+        """Drop every entry, deleting this cache's spill files (call at shutdown)"""
+        with self._lock:
+            for key in list(self._entries):
+                self._drop(key)
+            self._sql_only.clear()
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, f"{key}.npz")
+
+    def _remember_sql(self, key, sql_query, created_at):
+        if not sql_query or not self.max_sql_only:
+            return
+        self._sql_only[key] = (sql_query, created_at)
+        self._sql_only.move_to_end(key)
+        while len(self._sql_only) > self.max_sql_only:
+            self._sql_only.popitem(last=False)
+
+    def _drop(self, key, keep_sql=False):
+        entry = self._entries.pop(key)
+        if keep_sql:
+            self._remember_sql(key, entry.get('sql_query'), entry['created_at'])
+        if entry.get('spill_path'):
+            self._spill_bytes -= entry['size_bytes']
+            try:
+                os.remove(entry['spill_path'])
+            except OSError as e:
+                logger.warning(f"Could not remove spilled result {entry['spill_path']}: {e}")
+        else:
+            self._memory_bytes -= entry['size_bytes']
+
+    def _expire(self, now):
+        if not self.ttl_seconds:
+            return
+        expired = [key for key, entry in self._entries.items() if now - entry['created_at'] > self.ttl_seconds]
+        for key in expired:
+            self._drop(key)
+            self.expirations += 1
+        for key in [key for key, (_, created_at) in self._sql_only.items() if now - created_at > self.ttl_seconds]:
+            del self._sql_only[key]
+
+    def _evict(self):
+        def over_budget():
+            return (len(self._entries) > self.max_entries
+                    or self._memory_bytes > self.max_bytes
+                    or self._spill_bytes > self.max_spill_bytes)
+
+        while self._entries and over_budget():
+            key = next(iter(self._entries))
+            self._drop(key, keep_sql=True)
+            self.evictions += 1
+
+    def put(self, key, columns, rows, graph_data=None, column_arrays=None, **metadata):
+        """Cache a result set; large ones are spilled to disk when a spill directory is configured"""
+        now = time.time()
+        columnar = rows is None
+        row_count = (len(column_arrays[0]) if column_arrays else 0) if columnar else len(rows)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._sql_only.pop(key, None)
+            if self.max_cached_rows is not None and row_count > self.max_cached_rows:
+                self._remember_sql(key, metadata.get('sql_query'), now)
+                return
+
+        if columnar:
+            size_bytes = estimate_array_bytes(column_arrays)
+        else:
+            size_bytes = estimate_result_bytes(rows, graph_data)
+        entry = dict(metadata, columns=list(columns), row_count=row_count, created_at=now, spill_path=None,
+                     columnar=columnar)
+
+        if self.spill_dir and size_bytes > self.spill_threshold_bytes:
+            path = self._spill_path(key)
+            if columnar:
+                save_columns_npz(path, columns, column_arrays)
+            else:
+                save_results_npz(path, columns, rows, graph_data)
+            entry['spill_path'] = path
+            entry['size_bytes'] = os.path.getsize(path)
+        else:
+            entry['rows'] = rows
+            entry['column_arrays'] = column_arrays
+            entry['graph_data'] = graph_data
+            entry['size_bytes'] = size_bytes
+
+        with self._lock:
+            self._entries[key] = entry
+            if entry['spill_path']:
+                self._spill_bytes += entry['size_bytes']
+                self.spills += 1
+            else:
+                self._memory_bytes += entry['size_bytes']
+            self._expire(now)
+            self._evict()
+
+    def get(self, key):
+        """Return a cached entry (rows loaded back from disk if spilled), or None"""
+        with self._lock:
+            self._expire(time.time())
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            entry = dict(entry)
+
+        if entry['spill_path']:
+            try:
+                if entry['columnar']:
+                    columns, column_arrays = load_columns_npz(entry['spill_path'])
+                    entry.update(columns=columns, rows=None, column_arrays=column_arrays, graph_data=None)
+                else:
+                    columns, rows, graph_data = load_results_npz(entry['spill_path'])
+                    entry.update(columns=columns, rows=rows, column_arrays=None, graph_data=graph_data)
+            except OSError as e:
+                # Evicted by another request between the lookup and the read
+                logger.warning(f"Spilled result {key} is no longer available: {e}")
+                return None
+        return entry
+
+    def get_sql(self, key):
+        """Return the SQL of a result that is no longer held (too large or evicted), or None"""
+        with self._lock:
+            self._expire(time.time())
+            entry = self._sql_only.get(key)
+            return entry[0] if entry else None
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and not (self.ttl_seconds and time.time() - entry['created_at'] > self.ttl_seconds)
+
+    def get_stats(self):
+        with self._lock:
+            spilled = sum(1 for entry in self._entries.values() if entry['spill_path'])
+            return {
+                'entries': len(self._entries),
+                'entries_in_memory': len(self._entries) - spilled,
+                'entries_spilled': spilled,
+                'entries_sql_only': len(self._sql_only),
+                'max_entries': self.max_entries,
+                'memory_bytes': self._memory_bytes,
+                'max_bytes': self.max_bytes,
+                'spill_bytes': self._spill_bytes,
+                'max_spill_bytes': self.max_spill_bytes,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'expirations': self.expirations,
+                'evictions': self.evictions,
+                'spills': self.spills
+            }
@@ -0,0 +1,573 @@
+import re
+import threading
+import time
+import logging
+from datetime import date, datetime
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_GRAINS = ('daily', 'hourly', 'monthly')
+DATE_COLUMN = 'Record_Date'
+HOUR_COLUMN = 'Record_Hour'
+MU_DIVISOR = 4000  # 96 blocks/day of MW -> MU (million units)
+NUMERIC_TYPES = {'tinyint', 'smallint', 'mediumint', 'int', 'integer', 'bigint', 'decimal', 'numeric', 'float',
+                 'double', 'real'}
+EXACT_TYPES = NUMERIC_TYPES - {'float', 'double', 'real'}
+SUM_HEADROOM_DIGITS = 10  # Extra integer digits for *_Sum columns over the source column's precision
+# Numeric columns that identify a row rather than measure it
+DIMENSION_COLUMNS = {HOUR_COLUMN, 'Time_Block', 'Session_ID', 'Session'}
+
+_AGGREGATE_RE = re.compile(r'\b(SUM|AVG|MIN|MAX|COUNT)\s*\(\s*(?:`?(\w+)`?\s*\.\s*)?`?(\w+)`?\s*\)', re.IGNORECASE)
+_COUNT_STAR_RE = re.compile(r'\bCOUNT\s*\(\s*\*\s*\)', re.IGNORECASE)
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+_FROM_RE = re.compile(r'\bFROM\s+`?(\w+)`?(?:\s+(?:AS\s+)?`?(\w+)`?)?', re.IGNORECASE)
+_ALIAS_RE = re.compile(r'\bAS\s+`?(\w+)`?', re.IGNORECASE)
+_MONTH_PART_RE = re.compile(r'\b(?:YEAR|MONTH|QUARTER)\s*\(\s*(?:`?\w+`?\s*\.\s*)?`?Record_Date`?\s*\)', re.IGNORECASE)
+# Range bounds on the first of a month, e.g. the rewriter's output for YEAR(Record_Date) = 2024. The
+# comparison must be a whole predicate: '2024-03-01' - INTERVAL 1 DAY is not a month start
+_MONTH_BOUND_RE = re.compile(
+    r"(?:(?<=\bWHERE)|(?<=\bAND)|(?<=\bOR)|(?<=\())\s*"
+    r"(?:`?\w+`?\s*\.\s*)?`?Record_Date`?\s*(?:>=|<)\s*'\d{4}-\d{2}-01'"
+    r"(?=\s*(?:\)|$|(?:AND|OR|GROUP|ORDER|LIMIT|HAVING)\b))",
+    re.IGNORECASE
+)
+_UNSUPPORTED_RE = re.compile(r'\b(?:JOIN|UNION|DISTINCT|OVER|WITH|INTO|FOR\s+UPDATE|LOCK)\b|\bSELECT\b.*\bSELECT\b',
+                             re.IGNORECASE | re.DOTALL)
+
+# Words that may appear in a routable query besides columns, aliases and the table name
+_SQL_WORDS = {
+    'SELECT', 'FROM', 'WHERE', 'AND', 'OR', 'NOT', 'IN', 'BETWEEN', 'IS', 'NULL', 'LIKE', 'GROUP', 'BY', 'ORDER',
+    'ASC', 'DESC', 'LIMIT', 'OFFSET', 'AS', 'HAVING', 'CASE', 'WHEN', 'THEN', 'ELSE', 'END', 'TRUE', 'FALSE',
+    'SUM', 'AVG', 'MIN', 'MAX', 'COUNT', 'ROUND', 'FLOOR', 'CEIL', 'CEILING', 'ABS', 'COALESCE', 'IFNULL', 'NULLIF',
+    'IF', 'CAST', 'DECIMAL', 'SIGNED', 'UNSIGNED', 'CHAR', 'DATE', 'YEAR', 'MONTH', 'QUARTER', 'WEEK', 'DAY',
+    'HOUR', 'MINUTE', 'SECOND', 'DAYNAME', 'MONTHNAME', 'WEEKDAY', 'DAYOFWEEK', 'DAYOFMONTH', 'DAYOFYEAR',
+    'YEARWEEK', 'WEEKOFYEAR', 'LAST_DAY', 'DATE_FORMAT', 'DATE_ADD', 'DATE_SUB', 'ADDDATE', 'SUBDATE', 'DATEDIFF',
+    'STR_TO_DATE', 'CURDATE', 'CURRENT_DATE', 'NOW', 'INTERVAL', 'MAKEDATE', 'CONCAT'
+}
+
+
+def _word_set(text):
+    return set(re.findall(r'\b[A-Za-z_]\w*\b', text))
+
+
+def mu_column_name(column):
+    """Name of the MU (million units) column derived from an MW volume column"""
+    stem = re.sub(r'_MWh?$', '', column, flags=re.IGNORECASE)
+    return f"{stem}_MU"
+
+
+def is_price_column(column):
+    lower = column.lower()
+    return 'mcp' in lower or 'price' in lower or '_rs_' in lower or lower.startswith('rs_')
+
+
+def is_volume_column(column):
+    return not is_price_column(column) and re.search(r'_MWh?$', column, re.IGNORECASE) is not None
+
+
+class SourceRollup:
+    """Rollup layout for one raw block-level table: its measure columns and per-grain table names"""
+
+    def __init__(self, source, volume_columns, price_columns, has_hour, date_type, measure_types=None):
+        self.source = source
+        self.volume_columns = list(volume_columns)
+        self.price_columns = list(price_columns)
+        self.has_hour = has_hour
+        self.date_type = date_type
+        self.measure_types = dict(measure_types or {})  # measure -> (DATA_TYPE, NUMERIC_PRECISION, NUMERIC_SCALE)
+        self.tables = {}            # grain -> rollup table name, for the grains this source supports
+        self.ready = set()          # grains whose rollup has been built at least once
+        self.refreshed_at = None    # time.time() of the last successful refresh
+        self.watermark = None       # Latest Record_Date aggregated
+        self.refresh_seconds = None
+        self.error = None
+
+    @property
+    def measures(self):
+        return self.volume_columns + self.price_columns
+
+    def measure_columns(self, measure):
+        """Rollup columns stored for one raw measure column"""
+        columns = [f"{measure}_Sum", f"{measure}_Count", f"{measure}_Min", f"{measure}_Max"]
+        columns.append(mu_column_name(measure) if measure in self.volume_columns else f"{measure}_Avg")
+        return columns
+
+    def rollup_columns(self):
+        columns = ['Block_Count']
+        for measure in self.measures:
+            columns.extend(self.measure_columns(measure))
+        return columns
+
+    def key_columns(self, grain):
+        return [DATE_COLUMN, HOUR_COLUMN] if grain == 'hourly' else [DATE_COLUMN]
+
+    def measure_column_types(self, measure):
+        """SQL types of measure_columns(measure); exact sources stay DECIMAL so rollups return exact values"""
+        data_type, precision, scale = self.measure_types.get(measure, ('double', None, None))
+        if data_type not in EXACT_TYPES or precision is None:
+            return ['DOUBLE', 'BIGINT', 'DOUBLE', 'DOUBLE', 'DOUBLE']
+        scale = scale or 0
+        wide = min(precision + SUM_HEADROOM_DIGITS, 65)
+        extreme = f"DECIMAL({precision},{scale})" if data_type in ('decimal', 'numeric') else 'BIGINT'
+        # MySQL gives a division (SUM/4000, AVG) four more decimal places than its operand
+        return [f"DECIMAL({wide},{scale})", 'BIGINT', extreme, extreme, f"DECIMAL({wide},{min(scale + 4, 30)})"]
+
+    def column_definitions(self, grain):
+        """(column, SQL type) for every column of the grain's rollup table, keys first"""
+        columns = [(DATE_COLUMN, 'DATE')] + ([(HOUR_COLUMN, 'INT')] if grain == 'hourly' else [])
+        columns.append(('Block_Count', 'INT'))
+        for measure in self.measures:
+            columns.extend(zip(self.measure_columns(measure), self.measure_column_types(measure)))
+        return columns
+
+
+class RollupManager:
+    """Maintains daily, hourly and monthly summary tables for block-level energy_bids_* tables.
+
+    Each rollup row stores, per measure column m, m_Sum/m_Count/m_Min/m_Max plus either the
+    MU conversion (SUM(m)/4000, for MW volume columns) or the average (for price columns), and a
+    Block_Count of raw rows. Daily and hourly rollups are aggregated from the raw table; monthly
+    rollups (keyed by the first day of the month) are aggregated from the daily rollup.
+
+    Refreshes are incremental: only Record_Dates on or after the latest date already rolled up
+    are re-aggregated (the latest day may have been partial) and upserted. Corrections to older
+    dates need refresh(full=True).
+
+    route() rewrites eligible aggregate queries over a raw table to the smallest rollup that
+    answers them exactly; anything it does not fully understand is left untouched.
+    """
+
+    def __init__(self, connection_factory, source_tables, grains=ROLLUP_GRAINS, refresh_interval=300,
+                 max_staleness=900, route_queries=True, on_refresh=None):
+        self.connection_factory = connection_factory
+        self.source_tables = list(source_tables)
+        self.grains = tuple(g for g in ROLLUP_GRAINS if g in grains)
+        self.refresh_interval = refresh_interval
+        self.max_staleness = max_staleness
+        self.route_queries = route_queries
+        self.on_refresh = on_refresh  # Called after a refresh that built new rollup tables
+        self._sources = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.routed = 0
+        self.not_routed = 0
+
+    # Maintenance
+
+    def start(self):
+        """Build/refresh the rollups now and then every refresh_interval seconds in a daemon thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='rollup-refresh', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.refresh()
+            self._stop_event.wait(self.refresh_interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def refresh(self, full=False):
+        """Refresh every source table; failures are logged per table and retried next interval"""
+        with self._refresh_lock:
+            built = False
+            for source in self.source_tables:
+                try:
+                    built |= self._refresh_source(source, full)
+                except Exception as e:
+                    logger.warning(f"Rollup refresh failed for {source}: {e}")
+                    with self._lock:
+                        if source in self._sources:
+                            self._sources[source].error = str(e)
+        if built and self.on_refresh is not None:
+            self.on_refresh()
+
+    def _discover(self, cursor, source):
+        cursor.execute(
+            "SELECT COLUMN_NAME, DATA_TYPE, NUMERIC_PRECISION, NUMERIC_SCALE FROM INFORMATION_SCHEMA.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s ORDER BY ORDINAL_POSITION",
+            (source,)
+        )
+        rows = cursor.fetchall()
+        column_types = {name: data_type.lower() for name, data_type, _, _ in rows}
+        date_type = column_types.get(DATE_COLUMN)
+        if date_type not in ('date', 'datetime', 'timestamp'):
+            return None
+        numeric = [c for c, t in column_types.items() if t in NUMERIC_TYPES and c not in DIMENSION_COLUMNS]
+        info = SourceRollup(
+            source,
+            [c for c in numeric if is_volume_column(c)],
+            [c for c in numeric if is_price_column(c)],
+            column_types.get(HOUR_COLUMN) in NUMERIC_TYPES,
+            date_type,
+            {name: (data_type.lower(), precision, scale) for name, data_type, precision, scale in rows
+             if name in numeric}
+        )
+        if not info.measures:
+            return None
+        for grain in self.grains:
+            if grain != 'hourly' or info.has_hour:
+                info.tables[grain] = f"{source}_{grain}"
+        return info
+
+    def _create_table(self, cursor, info, grain, rebuild):
+        table = info.tables[grain]
+        if rebuild:
+            cursor.execute(f"DROP TABLE IF EXISTS `{table}`")
+        keys = info.key_columns(grain)
+        not_null = set(keys) | {'Block_Count'}
+        column_defs = [f"`{c}` {sql_type}{' NOT NULL' if c in not_null else ''}"
+                       for c, sql_type in info.column_definitions(grain)]
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS `{table}` ({', '.join(column_defs)}, "
+            f"PRIMARY KEY ({', '.join(f'`{k}`' for k in keys)}))"
+        )
+
+    def _table_outdated(self, cursor, info, grain):
+        """True if the grain's rollup table exists with other columns or types than column_definitions()"""
+        cursor.execute(
+            "SELECT COLUMN_NAME, COLUMN_TYPE FROM INFORMATION_SCHEMA.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            (info.tables[grain],)
+        )
+        # Integer display widths (int(11)) are not part of the type
+        actual = {name: re.sub(r'^(?!decimal)(\w+)\(\d+\)', r'\1', column_type.lower())
+                  for name, column_type in cursor.fetchall()}
+        expected = {name: sql_type.lower() for name, sql_type in info.column_definitions(grain)}
+        return bool(actual) and actual != expected
+
+    def _aggregate_expressions(self, info, from_rollup):
+        """SELECT expressions matching rollup_columns(), from raw rows or from daily rollup rows"""
+        expressions = ['SUM(`Block_Count`)' if from_rollup else 'COUNT(*)']
+        for m in info.measures:
+            if from_rollup:
+                expressions += [f"SUM(`{m}_Sum`)", f"SUM(`{m}_Count`)", f"MIN(`{m}_Min`)", f"MAX(`{m}_Max`)"]
+                expressions.append(f"SUM(`{m}_Sum`) / {MU_DIVISOR}" if m in info.volume_columns
+                                   else f"SUM(`{m}_Sum`) / NULLIF(SUM(`{m}_Count`), 0)")
+            else:
+                expressions += [f"SUM(`{m}`)", f"COUNT(`{m}`)", f"MIN(`{m}`)", f"MAX(`{m}`)"]
+                expressions.append(f"SUM(`{m}`) / {MU_DIVISOR}" if m in info.volume_columns else f"AVG(`{m}`)")
+        return expressions
+
+    def _upsert(self, cursor, info, grain, since):
+        table = info.tables[grain]
+        keys = info.key_columns(grain)
+        columns = keys + info.rollup_columns()
+        params = ()
+        if grain == 'monthly':
+            key_exprs = [f"DATE_SUB(`{DATE_COLUMN}`, INTERVAL DAYOFMONTH(`{DATE_COLUMN}`) - 1 DAY)"]
+            aggregates = self._aggregate_expressions(info, from_rollup=True)
+            source = info.tables['daily']
+            if since is not None:
+                since = since.replace(day=1)
+        else:
+            key_exprs = [f"DATE(`{DATE_COLUMN}`)"] + ([f"`{HOUR_COLUMN}`"] if grain == 'hourly' else [])
+            aggregates = self._aggregate_expressions(info, from_rollup=False)
+            source = info.source
+        where = ''
+        if since is not None:
+            where = f" WHERE `{DATE_COLUMN}` >= %s"
+            params = (since,)
+        group_by = ', '.join(str(i + 1) for i in range(len(keys)))
+        updates = ', '.join(f"`{c}` = VALUES(`{c}`)" for c in info.rollup_columns())
+        cursor.execute(
+            f"INSERT INTO `{table}` ({', '.join(f'`{c}`' for c in columns)}) "
+            f"SELECT {', '.join(key_exprs + aggregates)} FROM `{source}`{where} GROUP BY {group_by} "
+            f"ON DUPLICATE KEY UPDATE {updates}",
+            params
+        )
+
+    def _watermark(self, cursor, table):
+        cursor.execute(f"SELECT MAX(`{DATE_COLUMN}`) FROM `{table}`")
+        value = cursor.fetchone()[0]
+        return value.date() if isinstance(value, datetime) else value
+
+    def _refresh_source(self, source, full):
+        """Refresh one source's rollups; returns True if rollup tables were (re)built"""
+        start = time.perf_counter()
+        with self.connection_factory() as conn:
+            cursor = conn.cursor()
+            try:
+                with self._lock:
+                    info = self._sources.get(source)
+                if info is None or full:
+                    info = self._discover(cursor, source)
+                    if info is None:
+                        logger.info(f"No rollups for {source}: missing table, {DATE_COLUMN} or measure columns")
+                        return False
+                built = False
+                # Daily first: the monthly rollup is aggregated from it
+                for grain in ('daily', 'hourly', 'monthly'):
+                    if grain not in info.tables or (grain == 'monthly' and 'daily' not in info.tables):
+                        continue
+                    rebuild = full or self._table_outdated(cursor, info, grain)
+                    if rebuild and not full:
+                        logger.info(f"Rebuilding {info.tables[grain]}: its columns no longer match {source}")
+                    self._create_table(cursor, info, grain, rebuild=rebuild)
+                    watermark = None if rebuild else self._watermark(cursor, info.tables[grain])
+                    self._upsert(cursor, info, grain, watermark)
+                    conn.commit()
+                    built |= grain not in info.ready
+                    info.ready.add(grain)
+                info.watermark = self._watermark(cursor, info.tables['daily']) if 'daily' in info.tables else None
+            finally:
+                cursor.close()
+        info.refreshed_at = time.time()
+        info.refresh_seconds = round(time.perf_counter() - start, 3)
+        info.error = None
+        with self._lock:
+            self._sources[source] = info
+        logger.info(f"Refreshed rollups for {source} through {info.watermark} in {info.refresh_seconds}s")
+        return built
+
+    # Schema exposure
+
+    def rollup_tables(self, sources=None):
+        """Ready rollup table names for the given source tables (all sources by default)"""
+        with self._lock:
+            infos = [self._sources[s] for s in (sources or self.source_tables) if s in self._sources]
+        return [info.tables[g] for info in infos for g in self.grains if g in info.ready]
+
+    def describe_column(self, table, column):
+        """Schema description for a rollup table column, or None if table is not a rollup"""
+        with self._lock:
+            match = next(((info, grain) for info in self._sources.values()
+                          for grain, name in info.tables.items() if name == table), None)
+        if match is None:
+            return None
+        info, grain = match
+        period = {'daily': 'day', 'hourly': 'hour', 'monthly': 'month'}[grain]
+        if column == DATE_COLUMN:
+            return "First day of the month" if grain == 'monthly' else "Date of the rollup row"
+        if column == HOUR_COLUMN:
+            return "Hour of the day (0-23)"
+        if column == 'Block_Count':
+            return f"Number of raw time blocks in the {period}"
+        for measure in info.measures:
+            sum_col, count_col, min_col, max_col, derived = info.measure_columns(measure)
+            descriptions = {
+                sum_col: f"SUM of {measure} over the {period}'s time blocks",
+                count_col: f"Non-NULL {measure} blocks in the {period}",
+                min_col: f"Lowest block {measure} in the {period}",
+                max_col: f"Highest block {measure} in the {period}",
+                derived: (f"{measure} total for the {period} in MU (SUM/{MU_DIVISOR})" if derived.endswith('_MU')
+                          else f"Average block {measure} over the {period}")
+            }
+            if column in descriptions:
+                return descriptions[column]
+        return None
+
+    def table_note(self, table):
+        """One-line summary of a rollup table for the LLM schema"""
+        with self._lock:
+            for info in self._sources.values():
+                for grain, name in info.tables.items():
+                    if name == table:
+                        return (f"{grain} rollup of {info.source}, one row per "
+                                f"{'Record_Date and Record_Hour' if grain == 'hourly' else 'Record_Date'}")
+        return None
+
+    # Query routing
+
+    def _fresh_source(self, table):
+        with self._lock:
+            info = self._sources.get(table)
+        if info is None or not info.ready or info.refreshed_at is None:
+            return None
+        if self.max_staleness is not None and time.time() - info.refreshed_at > self.max_staleness:
+            return None
+        return info
+
+    def _plan(self, sql):
+        """(rewritten_sql, info, grain) for a query a rollup answers exactly, otherwise None"""
+        body = sql.strip().rstrip(';').strip()
+        # Blank out string literals (keeping offsets) so their contents can't look like SQL
+        masked = _STRING_RE.sub(lambda m: m.group(0)[0] + ' ' * (len(m.group(0)) - 2) + m.group(0)[-1], body)
+        if not masked.upper().startswith('SELECT') or ';' in masked or _UNSUPPORTED_RE.search(masked):
+            return None
+        from_matches = list(_FROM_RE.finditer(masked))
+        if len(from_matches) != 1:
+            return None
+        source, alias = from_matches[0].group(1), from_matches[0].group(2)
+        if alias and alias.upper() in _SQL_WORDS:
+            alias = None
+        info = self._fresh_source(source)
+        if info is None or info.date_type != 'date':
+            return None  # GROUP BY Record_Date on DATETIME blocks is per block, not per day
+        qualifiers = {source.lower()} | ({alias.lower()} if alias else set())
+
+        def rollup_aggregate(match):
+            function, qualifier, column = match.group(1).upper(), match.group(2), match.group(3)
+            if (qualifier and qualifier.lower() not in qualifiers) or column not in info.measures:
+                return None
+            if function == 'SUM':
+                return f"SUM({column}_Sum)"
+            if function == 'COUNT':
+                return f"SUM({column}_Count)"
+            if function == 'MIN':
+                return f"MIN({column}_Min)"
+            if function == 'MAX':
+                return f"MAX({column}_Max)"
+            return f"(SUM({column}_Sum) / NULLIF(SUM({column}_Count), 0))"
+
+        # Analyse a copy with every rewritable aggregate replaced by a constant
+        analysis = _COUNT_STAR_RE.sub('0', masked)
+        analysis = _AGGREGATE_RE.sub(lambda m: '0' if rollup_aggregate(m) else m.group(0), analysis)
+        if analysis == masked:
+            return None  # Nothing to pre-aggregate
+        if '*' in analysis or re.search(r'\b(?:SUM|AVG|MIN|MAX|COUNT)\s*\(', analysis, re.IGNORECASE):
+            return None  # An aggregate over an expression or a dimension the rollup can't answer
+        aliases = {a.lower() for a in _ALIAS_RE.findall(analysis)} | qualifiers
+        remaining = {w for w in _word_set(analysis) if w.upper() not in _SQL_WORDS and w.lower() not in aliases}
+        if not remaining <= {DATE_COLUMN, HOUR_COLUMN}:
+            return None  # Raw measures or other columns are used outside an aggregate
+        select_list = analysis[:from_matches[0].start()]
+        if not re.search(r'\bGROUP\s+BY\b', analysis, re.IGNORECASE) and _word_set(select_list) & remaining:
+            return None  # A bare dimension next to an aggregate without GROUP BY isn't well-defined
+
+        if HOUR_COLUMN in remaining:
+            grain = 'hourly'
+        elif 'monthly' in info.ready and not re.search(
+                rf'\b{DATE_COLUMN}\b', _MONTH_PART_RE.sub('', _MONTH_BOUND_RE.sub('', body))):
+            # Record_Date is only used through YEAR()/MONTH()/QUARTER() or compared with month starts
+            grain = 'monthly'
+        else:
+            grain = 'daily'
+        if grain not in info.ready:
+            return None
+
+        table = info.tables[grain]
+        start, end = from_matches[0].span(1)
+        result = body[:start] + table + body[end:]
+        result = _COUNT_STAR_RE.sub('SUM(Block_Count)', result)
+        # Aggregates first: they drop the source/alias qualifier, which would otherwise be renamed
+        # to the rollup table in front of a raw column the rollup doesn't have
+        result = _AGGREGATE_RE.sub(lambda m: rollup_aggregate(m) or m.group(0), result)
+        result = re.sub(rf'(?<![\w.`])`?{re.escape(source)}`?\s*\.', f"{table}.", result)
+        return result + ';', info, grain
+
+    def route(self, sql):
+        """Return (sql, route) where route is None or {'source', 'table', 'grain'} if the query was rewritten"""
+        if not self.route_queries:
+            return sql, None
+        try:
+            plan = self._plan(sql)
+        except Exception as e:
+            logger.warning(f"Rollup routing skipped: {e}")
+            plan = None
+        if plan is None:
+            self.not_routed += 1
+            return sql, None
+        rewritten, info, grain = plan
+        self.routed += 1
+        return rewritten, {'source': info.source, 'table': info.tables[grain], 'grain': grain}
+
+    def get_stats(self):
+        with self._lock:
+            sources = {
+                name: {
+                    'tables': dict(info.tables),
+                    'ready': sorted(info.ready),
+                    'watermark': info.watermark.isoformat() if isinstance(info.watermark, date) else None,
+                    'refreshed_at': info.refreshed_at,
+                    'refresh_seconds': info.refresh_seconds,
+                    'volume_columns': info.volume_columns,
+                    'price_columns': info.price_columns,
+                    'error': info.error
+                }
+                for name, info in self._sources.items()
+            }
+        return {'sources': sources, 'routed': self.routed, 'not_routed': self.not_routed,
+                'route_queries': self.route_queries, 'refresh_interval': self.refresh_interval}
+
+
+# Benchmark: time eligible queries on the raw tables against their rollup-routed rewrites
+
+BENCHMARK_QUERIES = [
+    "SELECT DATE(Record_Date) AS Date, ROUND(SUM(Purchase_Bid_MW)/4000, 2) AS Purchase_Bid_MU FROM energy_bids_dam "
+    "WHERE Record_Date >= DATE_SUB(CURDATE(), INTERVAL 30 DAY) GROUP BY DATE(Record_Date);",
+    "SELECT Record_Hour, SUM(Purchase_Bid_MW) AS Purchase_Bid_MW, AVG(MCP_Rs_MWh) AS Avg_MCP FROM energy_bids_dam "
+    "WHERE DATE(Record_Date) = DATE_SUB(CURDATE(), INTERVAL 1 DAY) GROUP BY Record_Hour;",
+    "SELECT Record_Hour, SUM(MCV_MW) AS MCV_MW FROM energy_bids_rtm WHERE Record_Date >= '2024-01-01' "
+    "GROUP BY Record_Hour ORDER BY Record_Hour;",
+    "SELECT YEAR(Record_Date) AS Year, MONTH(Record_Date) AS Month, ROUND(SUM(MCV_MW)/4000, 2) AS MCV_MU, "
+    "ROUND(AVG(MCP_Rs_MWh), 2) AS Avg_MCP, MAX(MCP_Rs_MWh) AS Max_MCP FROM energy_bids_dam "
+    "GROUP BY YEAR(Record_Date), MONTH(Record_Date) ORDER BY Year, Month;",
+    "SELECT DATE(Record_Date) AS Date, ROUND(SUM(Final_Scheduled_Volume_MW)/4000, 2) AS Final_Scheduled_Volume_MU "
+    "FROM energy_bids_gdam GROUP BY DATE(Record_Date) ORDER BY Date DESC LIMIT 30;",
+]
+
+
+def _rounded(rows):
+    return sorted((tuple(round(float(v), 2) if isinstance(v, (int, float)) or hasattr(v, 'as_tuple') else v
+                         for v in row) for row in rows), key=repr)
+
+
+def benchmark(manager, connection_factory, queries=BENCHMARK_QUERIES, repeat=3):
+    """Best-of-repeat timings of each query on the raw table and on its rollup, with a result check"""
+    results = []
+    for sql in queries:
+        routed, route = manager.route(sql)
+        entry = {'sql': sql, 'routed_sql': routed if route else None, 'route': route}
+        timings = {}
+        outputs = {}
+        for label, text in (('raw', sql), ('rollup', routed if route else None)):
+            if text is None:
+                continue
+            best = None
+            with connection_factory() as conn:
+                cursor = conn.cursor()
+                try:
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        cursor.execute(text)
+                        rows = cursor.fetchall()
+                        elapsed = time.perf_counter() - start
+                        best = elapsed if best is None else min(best, elapsed)
+                except Exception as e:
+                    entry[f'{label}_error'] = str(e)
+                finally:
+                    cursor.close()
+            if best is not None:
+                timings[label] = best
+                outputs[label] = rows
+        entry['raw_ms'] = round(timings['raw'] * 1000, 2) if 'raw' in timings else None
+        entry['rollup_ms'] = round(timings['rollup'] * 1000, 2) if 'rollup' in timings else None
+        if entry['raw_ms'] and entry['rollup_ms']:
+            entry['speedup'] = round(timings['raw'] / timings['rollup'], 1)
+            entry['results_match'] = _rounded(outputs['raw']) == _rounded(outputs['rollup'])
+        results.append(entry)
+    return results
+
+
+if __name__ == '__main__':
+    import json
+    from contextlib import contextmanager
+    import mysql.connector
+
+    # Update these to match your setup
+    DB_CONFIG = {
+        'host': 'localhost',
+        'user': 'root',
+        'password': 'password1234',
+        'database': 'iexinternetdatacenter',
+        'port': 3306
+    }
+    TABLES = ['energy_bids_dam', 'energy_bids_gdam', 'energy_bids_rtm', 'energy_bids_tam', 'energy_bids_gtam']
+
+    logging.basicConfig(level=logging.INFO)
+
+    @contextmanager
+    def connect():
+        conn = mysql.connector.connect(**DB_CONFIG)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    rollups = RollupManager(connect, TABLES, max_staleness=None)
+    rollups.refresh()
+    print(json.dumps(benchmark(rollups, connect), indent=2, default=str))
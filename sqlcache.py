@@ -0,0 +1,146 @@
+import sqlite3
+import threading
+import hashlib
+import time
+import re
+import logging
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+# Words that make the generated SQL depend on the day the question is asked
+RELATIVE_DATE_WORDS = [
+    'today', 'yesterday', 'tomorrow', 'current', 'this', 'last', 'past', 'previous',
+    'recent', 'latest', 'ago', 'now', 'week', 'ytd', 'till date', 'to date'
+]
+
+
+def normalize_query(natural_query):
+    """Lowercase, drop punctuation and collapse whitespace so trivially different phrasings share a key"""
+    text = natural_query.lower()
+    text = re.sub(r"[^\w\s\-:/.]", " ", text)
+    text = re.sub(r"(?<!\d)[.:/]|[.:/](?!\d)", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def date_context_for(natural_query, today=None):
+    """Date component of the cache key.
+
+    The prompt tells the model to assume the current year when none is given, so the year
+    always participates. Queries with relative wording ("last month", "today") are pinned
+    to the current day.
+    """
+    today = today or date.today()
+    query_lower = natural_query.lower()
+    if any(re.search(rf"\b{re.escape(word)}\b", query_lower) for word in RELATIVE_DATE_WORDS):
+        return today.isoformat()
+    return str(today.year)
+
+
+def make_cache_key(natural_query, schema, model_name, holiday_context="", today=None):
+    """Hash of the normalized query plus everything else that shapes the generated SQL"""
+    parts = [
+        normalize_query(natural_query),
+        hashlib.sha256(schema.encode('utf-8')).hexdigest(),
+        model_name,
+        date_context_for(natural_query, today),
+        hashlib.sha256((holiday_context or "").encode('utf-8')).hexdigest()
+    ]
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+class SQLCache:
+    """Persistent NL->SQL cache in SQLite with TTL expiry and LRU eviction"""
+
+    def __init__(self, path='sql_cache.sqlite3', ttl_seconds=7 * 24 * 3600, max_entries=5000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS sql_cache (
+                cache_key TEXT PRIMARY KEY,
+                natural_query TEXT NOT NULL,
+                sql_query TEXT NOT NULL,
+                model_name TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_accessed REAL NOT NULL,
+                hit_count INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sql_cache_last_accessed ON sql_cache (last_accessed)")
+        self._conn.commit()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def get(self, cache_key):
+        """Return the cached SQL for a key, or None on a miss or expired entry"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sql_query, created_at FROM sql_cache WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            sql_query, created_at = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM sql_cache WHERE cache_key = ?", (cache_key,))
+                self._conn.commit()
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE sql_cache SET last_accessed = ?, hit_count = hit_count + 1 WHERE cache_key = ?",
+                (now, cache_key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return sql_query
+
+    def put(self, cache_key, natural_query, sql_query, model_name):
+        """Store generated SQL, evicting least recently used entries beyond max_entries"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """INSERT OR REPLACE INTO sql_cache
+                   (cache_key, natural_query, sql_query, model_name, created_at, last_accessed, hit_count)
+                   VALUES (?, ?, ?, ?, ?, ?, 0)""",
+                (cache_key, natural_query, sql_query, model_name, now, now)
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM sql_cache").fetchone()[0]
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    """DELETE FROM sql_cache WHERE cache_key IN (
+                           SELECT cache_key FROM sql_cache ORDER BY last_accessed ASC LIMIT ?
+                       )""",
+                    (overflow,)
+                )
+                self.evictions += overflow
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM sql_cache")
+            self._conn.commit()
+
+    def get_stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM sql_cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'expired': self.expired,
+            'evictions': self.evictions
+        }
@@ -0,0 +1,660 @@
+import re
+import logging
+from datetime import date, timedelta
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATE_COLUMNS = ('Record_Date',)
+
+_TOKEN_RE = re.compile(r"""
+     (?P<ws>\s+)
+    |(?P<comment>--[^\n]*|\#[^\n]*|/\*.*?\*/)
+    |(?P<string>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*")
+    |(?P<quoted>`(?:[^`]|``)*`)
+    |(?P<number>\d+(?:\.\d*)?(?:[eE][-+]?\d+)?|\.\d+)
+    |(?P<ident>[A-Za-z_@$][\w$]*)
+    |(?P<op><=>|>=|<=|<>|!=|:=|\|\||&&|[-+*/%=<>!~^&|])
+    |(?P<punct>[(),.;])
+""", re.VERBOSE | re.DOTALL)
+
+_AGGREGATES = {'SUM', 'AVG', 'MIN', 'MAX', 'COUNT', 'GROUP_CONCAT', 'STD', 'STDDEV', 'STDDEV_POP', 'STDDEV_SAMP',
+               'VARIANCE', 'VAR_POP', 'VAR_SAMP', 'BIT_AND', 'BIT_OR', 'BIT_XOR', 'JSON_ARRAYAGG', 'JSON_OBJECTAGG'}
+_DATE_FUNCTIONS = {'DATE', 'LAST_DAY', 'MAKEDATE'}
+_DATE_ARITHMETIC = {'DATE_SUB', 'DATE_ADD', 'SUBDATE', 'ADDDATE'}
+_CURRENT_DATE = {'CURDATE', 'CURRENT_DATE', 'UTC_DATE'}
+_CURRENT_DATETIME = {'NOW', 'SYSDATE', 'CURRENT_TIMESTAMP', 'LOCALTIME', 'LOCALTIMESTAMP', 'UTC_TIMESTAMP'}
+_DAY_UNITS = {'DAY', 'WEEK', 'MONTH', 'QUARTER', 'YEAR'}
+# Identifiers allowed inside a constant date expression (anything else may be a column)
+_CONSTANT_WORDS = (_DATE_FUNCTIONS | _DATE_ARITHMETIC | _CURRENT_DATE | _CURRENT_DATETIME | _DAY_UNITS
+                   | {'INTERVAL', 'YEAR', 'MONTH', 'DAYOFMONTH'})
+_CONDITION_END = {'AND', 'OR', 'XOR', '&&', '||'}
+_CONDITION_START = {'AND', 'OR', 'XOR', 'NOT', '&&', '||', '!'}
+_JOIN_WORDS = {'JOIN', 'INNER', 'LEFT', 'RIGHT', 'CROSS', 'NATURAL', 'STRAIGHT_JOIN', 'OUTER', 'USING'}
+_CLAUSE_WORDS = {'SELECT', 'FROM', 'WHERE', 'GROUP', 'HAVING', 'WINDOW', 'ORDER', 'LIMIT', 'UNION', 'INTERSECT',
+                 'EXCEPT', 'FOR', 'INTO', 'LOCK'}
+
+
+class SQLParseError(ValueError):
+    """Raised when SQL can't be tokenized or its parentheses don't balance"""
+
+
+class Token:
+    """One lexical token; kind is 'ws', 'comment', 'string', 'quoted', 'number', 'ident', 'op' or 'punct'"""
+    __slots__ = ('kind', 'text')
+
+    def __init__(self, kind, text):
+        self.kind = kind
+        self.text = text
+
+    @property
+    def upper(self):
+        return self.text.upper() if self.kind == 'ident' else self.text
+
+    @property
+    def name(self):
+        """Identifier name with backticks removed"""
+        return self.text[1:-1].replace('``', '`') if self.kind == 'quoted' else self.text
+
+    def is_word(self, *words):
+        return self.kind == 'ident' and self.text.upper() in words
+
+    def sql(self):
+        return self.text
+
+    def __repr__(self):
+        return f"Token({self.kind}, {self.text!r})"
+
+
+class Group:
+    """Parenthesized list of tokens and nested groups; the parsed statement itself is a Group without parens"""
+    __slots__ = ('tokens', 'parens')
+
+    def __init__(self, tokens, parens=True):
+        self.tokens = tokens
+        self.parens = parens
+
+    def sql(self):
+        inner = ''.join(node.sql() for node in self.tokens)
+        return f"({inner})" if self.parens else inner
+
+    def significant(self):
+        return [node for node in self.tokens if not _is_space(node)]
+
+    @property
+    def is_subquery(self):
+        first = next((node for node in self.tokens if not _is_space(node)), None)
+        return isinstance(first, Token) and first.is_word('SELECT', 'WITH')
+
+    def __repr__(self):
+        return f"Group({self.sql()!r})"
+
+
+def _is_space(node):
+    return isinstance(node, Token) and node.kind in ('ws', 'comment')
+
+
+def _is_word(node, *words):
+    return isinstance(node, Token) and node.is_word(*words)
+
+
+def _is_op(node, *ops):
+    return isinstance(node, Token) and node.kind in ('op', 'punct') and node.text in ops
+
+
+def tokenize(sql):
+    tokens = []
+    position = 0
+    while position < len(sql):
+        match = _TOKEN_RE.match(sql, position)
+        if match is None:
+            raise SQLParseError(f"Unexpected character {sql[position]!r} at position {position}")
+        tokens.append(Token(match.lastgroup, match.group(0)))
+        position = match.end()
+    return tokens
+
+
+def parse(sql):
+    """Parse SQL into a tree of Tokens and parenthesized Groups that round-trips to the same text"""
+    stack = [[]]
+    for token in tokenize(sql):
+        if token.text == '(' and token.kind == 'punct':
+            stack.append([])
+        elif token.text == ')' and token.kind == 'punct':
+            if len(stack) == 1:
+                raise SQLParseError("Unbalanced ')'")
+            group = Group(stack.pop())
+            stack[-1].append(group)
+        else:
+            stack[-1].append(token)
+    if len(stack) != 1:
+        raise SQLParseError("Unbalanced '('")
+    return Group(stack[0], parens=False)
+
+
+def _render(nodes):
+    return ''.join(node.sql() for node in nodes)
+
+
+def _fragment(sql):
+    """Parsed nodes for a generated SQL snippet"""
+    return parse(sql).tokens
+
+
+def _next_significant(nodes, index):
+    while index < len(nodes) and _is_space(nodes[index]):
+        index += 1
+    return index
+
+
+def _previous_significant(nodes, index):
+    index -= 1
+    while index >= 0 and _is_space(nodes[index]):
+        index -= 1
+    return nodes[index] if index >= 0 else None
+
+
+def clause_spans(nodes):
+    """[(clause, start, end)] for the top-level clauses of a SELECT token list, e.g. ('WHERE', 5, 17)"""
+    spans = []
+    for i, node in enumerate(nodes):
+        if not isinstance(node, Token) or node.kind != 'ident' or node.upper not in _CLAUSE_WORDS:
+            continue
+        name = node.upper
+        if name in ('GROUP', 'ORDER'):
+            following = _next_significant(nodes, i + 1)
+            if following >= len(nodes) or not _is_word(nodes[following], 'BY'):
+                continue
+            name += ' BY'
+        if spans:
+            spans[-1] = (spans[-1][0], spans[-1][1], i)
+        spans.append((name, i, len(nodes)))
+    return spans
+
+
+# Constant date expressions
+
+class _Value:
+    """Right-hand side of a comparison: kind is 'date_literal', 'date', 'datetime', 'int', 'year_of' or 'month_of'"""
+
+    def __init__(self, kind, nodes, payload=None):
+        self.kind = kind
+        self.nodes = nodes
+        self.payload = payload  # date for 'date_literal', int for 'int', argument SQL for 'year_of'/'month_of'
+
+    @property
+    def text(self):
+        return _render(self.nodes).strip()
+
+
+def _is_constant(group):
+    """True if every identifier inside a group is a known date function or keyword (no column references)"""
+    for node in group.tokens:
+        if isinstance(node, Group):
+            if not _is_constant(node):
+                return False
+        elif node.kind in ('ident', 'quoted') and node.upper not in _CONSTANT_WORDS:
+            return False
+    return True
+
+
+def _split_arguments(group):
+    arguments, current = [], []
+    for node in group.tokens:
+        if _is_op(node, ','):
+            arguments.append(current)
+            current = []
+        else:
+            current.append(node)
+    arguments.append(current)
+    return arguments
+
+
+def _parse_value(nodes, index):
+    """(_Value, end_index) for the constant expression starting at nodes[index], or (None, index)"""
+    node = nodes[index] if index < len(nodes) else None
+    value, end = None, index + 1
+    if isinstance(node, Token) and node.kind == 'string' and node.text[0] == "'":
+        content = node.text[1:-1]
+        if re.fullmatch(r'\d{4}-\d{2}-\d{2}', content):
+            try:
+                value = _Value('date_literal', [node], date.fromisoformat(content))
+            except ValueError:
+                return None, index
+    elif isinstance(node, Token) and node.kind == 'number' and node.text.isdigit():
+        value = _Value('int', [node], int(node.text))
+    elif isinstance(node, Token) and node.kind == 'ident':
+        name = node.upper
+        call = _next_significant(nodes, index + 1)
+        group = nodes[call] if call < len(nodes) and isinstance(nodes[call], Group) else None
+        if group is None:
+            if name in ('CURRENT_DATE', 'UTC_DATE'):
+                value = _Value('date', [node])
+            elif name in ('CURRENT_TIMESTAMP', 'LOCALTIME', 'LOCALTIMESTAMP', 'UTC_TIMESTAMP'):
+                value = _Value('datetime', [node])
+        elif _is_constant(group):
+            end = call + 1
+            call_nodes = nodes[index:end]
+            first = None
+            if group.significant():
+                argument = _split_arguments(group)[0]
+                first, argument_end = _parse_value(argument, _next_significant(argument, 0))
+                if first is not None and _next_significant(argument, argument_end) < len(argument):
+                    first = None  # The first argument is a larger expression
+            if name in _CURRENT_DATE and not group.significant():
+                value = _Value('date', call_nodes)
+            elif name in _CURRENT_DATETIME:
+                value = _Value('datetime', call_nodes)
+            elif name in _DATE_FUNCTIONS:
+                value = _Value('date', call_nodes)
+            elif name in _DATE_ARITHMETIC and first is not None and first.kind in ('date', 'date_literal'):
+                units = {n.upper for n in group.tokens if isinstance(n, Token) and n.kind == 'ident'} - {'INTERVAL'}
+                if units <= _CONSTANT_WORDS and not (units & {'HOUR', 'MINUTE', 'SECOND', 'MICROSECOND'}):
+                    value = _Value('date', call_nodes)
+            elif name in ('YEAR', 'MONTH') and first is not None and first.kind in ('date', 'date_literal', 'datetime'):
+                value = _Value('year_of' if name == 'YEAR' else 'month_of', call_nodes, first.text)
+    if value is None:
+        return None, index
+    # Date arithmetic: <date> +/- INTERVAL n DAY|WEEK|MONTH|QUARTER|YEAR
+    while value.kind in ('date', 'date_literal'):
+        op = _next_significant(nodes, end)
+        interval = _next_significant(nodes, op + 1)
+        amount = _next_significant(nodes, interval + 1)
+        unit = _next_significant(nodes, amount + 1)
+        if not (unit < len(nodes) and _is_op(nodes[op], '+', '-') and _is_word(nodes[interval], 'INTERVAL')
+                and isinstance(nodes[amount], Token) and nodes[amount].kind in ('number', 'string')
+                and _is_word(nodes[unit], *_DAY_UNITS)):
+            break
+        end = unit + 1
+        value = _Value('date', nodes[index:end])
+    return value, end
+
+
+def _column_ref(group, date_columns):
+    """Column reference text if a group holds just `col` or `qualifier.col` for a date column"""
+    parts = group.significant()
+    if len(parts) == 1 and isinstance(parts[0], Token) and parts[0].kind in ('ident', 'quoted'):
+        column = parts[0]
+    elif (len(parts) == 3 and all(isinstance(p, Token) for p in parts) and parts[0].kind in ('ident', 'quoted')
+          and _is_op(parts[1], '.') and parts[2].kind in ('ident', 'quoted')):
+        column = parts[2]
+    else:
+        return None
+    if date_columns is not None and column.name.lower() not in date_columns:
+        return None
+    return _render(group.tokens).strip()
+
+
+# Predicate rewrites
+
+class _Context:
+    def __init__(self, date_columns):
+        self.date_columns = {c.lower() for c in date_columns} if date_columns is not None else None
+        self.rewrites = []
+
+    def record(self, rule, original, rewritten):
+        self.rewrites.append({'rule': rule, 'original': re.sub(r'\s+', ' ', original).strip(),
+                              'rewritten': rewritten})
+
+
+def _match_wrapped(nodes, index, ctx):
+    """Match `FUNC(date_col) op value` / `FUNC(date_col) BETWEEN a AND b` starting at nodes[index].
+
+    Returns (function, column, op, values, end_index) or None.
+    """
+    node = nodes[index]
+    if not _is_word(node, 'DATE', 'YEAR', 'MONTH'):
+        return None
+    previous = _previous_significant(nodes, index)
+    if previous is not None and not (isinstance(previous, Token) and previous.upper in _CONDITION_START):
+        return None  # Part of a larger expression (e.g. `x + YEAR(col)`)
+    call = _next_significant(nodes, index + 1)
+    if call >= len(nodes) or not isinstance(nodes[call], Group):
+        return None
+    column = _column_ref(nodes[call], ctx.date_columns)
+    if column is None:
+        return None
+    op_index = _next_significant(nodes, call + 1)
+    if op_index >= len(nodes):
+        return None
+    op_node = nodes[op_index]
+    if _is_op(op_node, '=', '>=', '<=', '>', '<'):
+        op = op_node.text
+        value, end = _parse_value(nodes, _next_significant(nodes, op_index + 1))
+        values = [value]
+    elif _is_word(op_node, 'BETWEEN'):
+        op = 'BETWEEN'
+        low, low_end = _parse_value(nodes, _next_significant(nodes, op_index + 1))
+        and_index = _next_significant(nodes, low_end)
+        if low is None or and_index >= len(nodes) or not _is_word(nodes[and_index], 'AND'):
+            return None
+        high, end = _parse_value(nodes, _next_significant(nodes, and_index + 1))
+        values = [low, high]
+    else:
+        return None
+    if any(v is None for v in values):
+        return None
+    following = _next_significant(nodes, end)
+    if following < len(nodes) and not (isinstance(nodes[following], Token) and nodes[following].upper in _CONDITION_END) \
+            and not _is_op(nodes[following], ';'):
+        return None  # The comparison continues (e.g. `= '2024-01-01' + 1`)
+    return node.upper, column, op, values, end
+
+
+def _next_day(value):
+    if value.kind == 'date_literal':
+        return f"'{(value.payload + timedelta(days=1)).isoformat()}'"
+    return f"{value.text} + INTERVAL 1 DAY"
+
+
+def _year_start(value, offset=0):
+    if value.kind == 'int':
+        return f"'{value.payload + offset:04d}-01-01'" if 1000 <= value.payload + offset <= 9999 else None
+    if value.kind == 'year_of':
+        return f"MAKEDATE({value.text}{' + ' + str(offset) if offset else ''}, 1)"
+    return None
+
+
+def _range(column, op, low, high):
+    """Range SQL for a comparison: =/BETWEEN give low <= column < high, >= and > give column >= low/high,
+    < and <= give column < low/high (callers pass high as the start of the next day or year)"""
+    if op == '=' or op == 'BETWEEN':
+        return f"({column} >= {low} AND {column} < {high})"
+    if op in ('>=', '>'):
+        return f"{column} >= {low if op == '>=' else high}"
+    return f"{column} < {low if op == '<' else high}"
+
+
+def _rewrite_wrapped(match):
+    """(rule, replacement SQL) for a matched predicate, or None if it has no sargable form"""
+    function, column, op, values, _ = match
+    if function == 'DATE':
+        if any(v.kind not in ('date', 'date_literal') for v in values):
+            return None
+        return 'sargable_date', _range(column, op, values[0].text, _next_day(values[-1]))
+    if function == 'YEAR':
+        if any(v.kind not in ('int', 'year_of') for v in values):
+            return None
+        low, high = _year_start(values[0]), _year_start(values[-1], 1)
+        if low is None or high is None:
+            return None
+        return 'sargable_year', _range(column, op, low, high)
+    return None
+
+
+def _split_conjunction(nodes):
+    """Split a node list on top-level AND into terms; None if the list also has a top-level OR/XOR"""
+    terms, current, in_between = [], [], False
+    for node in nodes:
+        if isinstance(node, Token) and node.upper in ('OR', 'XOR', '||'):
+            return None
+        if _is_word(node, 'BETWEEN'):
+            in_between = True
+        if isinstance(node, Token) and node.upper in ('AND', '&&'):
+            if in_between:
+                in_between = False
+            else:
+                terms.append(current)
+                current = []
+                continue
+        current.append(node)
+    terms.append(current)
+    return terms
+
+
+def _merge_year_month(nodes, ctx):
+    """Replace `YEAR(col) = y AND MONTH(col) = m` in a conjunction with a one-month range"""
+    terms = _split_conjunction(nodes)
+    if terms is None or len(terms) < 2:
+        return nodes
+    matches = {}
+    for i, term in enumerate(terms):
+        start = _next_significant(term, 0)
+        if start >= len(term):
+            continue
+        match = _match_wrapped(term, start, ctx)
+        if match and match[2] == '=' and match[0] in ('YEAR', 'MONTH') and _next_significant(term, match[4]) >= len(term):
+            matches.setdefault(match[1], {})[match[0]] = (i, match)
+    replaced, dropped = {}, set()
+    for column, found in matches.items():
+        if 'YEAR' not in found or 'MONTH' not in found:
+            continue
+        (year_term, year), (month_term, month) = found['YEAR'], found['MONTH']
+        year_value, month_value = year[3][0], month[3][0]
+        if year_value.kind == 'int' and month_value.kind == 'int' and 1 <= month_value.payload <= 12 \
+                and 1000 <= year_value.payload <= 9998:
+            start = date(year_value.payload, month_value.payload, 1)
+            end = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+            low, high = f"'{start.isoformat()}'", f"'{end.isoformat()}'"
+        elif year_value.kind == 'year_of' and month_value.kind == 'month_of' and year_value.payload == month_value.payload:
+            day = year_value.payload
+            low, high = f"DATE({day}) - INTERVAL DAYOFMONTH({day}) - 1 DAY", f"LAST_DAY({day}) + INTERVAL 1 DAY"
+        else:
+            continue
+        rewritten = _range(column, '=', low, high)
+        ctx.record('sargable_year_month',
+                   f"{_render(terms[year_term]).strip()} AND {_render(terms[month_term]).strip()}", rewritten)
+        replaced[year_term] = rewritten
+        dropped.add(month_term)
+    if not replaced:
+        return nodes
+    start = _next_significant(nodes, 0)
+    end = len(nodes)
+    while end > start and _is_space(nodes[end - 1]):
+        end -= 1
+    out = list(nodes[:start])  # Keep the whitespace around the condition
+    for i, term in enumerate(terms):
+        if i in dropped:
+            continue
+        if len(out) > start:
+            out.extend(_fragment(' AND '))
+        out.extend(_fragment(replaced[i]) if i in replaced else _strip(term))
+    return out + list(nodes[end:])
+
+
+def _strip(nodes):
+    start = _next_significant(nodes, 0)
+    end = len(nodes)
+    while end > start and _is_space(nodes[end - 1]):
+        end -= 1
+    return nodes[start:end]
+
+
+def _rewrite_condition(nodes, ctx):
+    """Sargable rewrites within a WHERE/ON condition, recursing into parenthesized sub-conditions"""
+    nodes = _merge_year_month(nodes, ctx)
+    out = []
+    i = 0
+    while i < len(nodes):
+        node = nodes[i]
+        match = _match_wrapped(nodes, i, ctx)
+        rewrite = _rewrite_wrapped(match) if match else None
+        if rewrite:
+            rule, replacement = rewrite
+            ctx.record(rule, _render(nodes[i:match[4]]), replacement)
+            out.extend(_fragment(replacement))
+            i = match[4]
+            continue
+        if isinstance(node, Group):
+            if node.is_subquery:
+                previous = _previous_significant(nodes, i)
+                tokens = _rewrite_statement(node.tokens, ctx)
+                if _is_word(previous, 'IN'):
+                    tokens = _drop_in_distinct(tokens, ctx)
+                node = Group(tokens)
+            else:
+                node = Group(_rewrite_condition(node.tokens, ctx))
+        out.append(node)
+        i += 1
+    return out
+
+
+def _drop_in_distinct(tokens, ctx):
+    """`x IN (SELECT DISTINCT ...)`: DISTINCT can't change an IN result, but can force a temporary table"""
+    select = _next_significant(tokens, 0)
+    distinct = _next_significant(tokens, select + 1)
+    if select < len(tokens) and _is_word(tokens[select], 'SELECT') and distinct < len(tokens) \
+            and _is_word(tokens[distinct], 'DISTINCT'):
+        ctx.record('redundant_distinct', f"IN ({_render(tokens)})", 'DISTINCT removed')
+        return tokens[:distinct] + tokens[_next_significant(tokens, distinct + 1):]
+    return tokens
+
+
+# Statement-level rewrites
+
+def _select_list_has(nodes, predicate):
+    """True if any node of the SELECT list (outside subqueries) satisfies predicate"""
+    spans = clause_spans(nodes)
+    select = next(((s, e) for name, s, e in spans if name == 'SELECT'), None)
+    if select is None:
+        return False
+
+    def walk(items):
+        for node in items:
+            if isinstance(node, Group):
+                if not node.is_subquery and walk(node.tokens):
+                    return True
+            elif predicate(node):
+                return True
+        return False
+
+    return walk(nodes[select[0] + 1:select[1]])
+
+
+def _inline_derived_tables(nodes, from_span, ctx):
+    """Replace `(SELECT * FROM t) alias` / `(SELECT a, b FROM t) alias` in FROM with `t alias`"""
+    outer_star = _select_list_has(nodes, lambda n: _is_op(n, '*'))
+    out = list(nodes)
+    for i in range(from_span[0], from_span[1]):
+        node = out[i]
+        if not isinstance(node, Group) or not node.is_subquery:
+            continue
+        alias_index = _next_significant(out, i + 1)
+        if alias_index < len(out) and _is_word(out[alias_index], 'AS'):
+            alias_index = _next_significant(out, alias_index + 1)
+        if alias_index >= len(out) or not isinstance(out[alias_index], Token) \
+                or out[alias_index].kind not in ('ident', 'quoted') or out[alias_index].upper in _CLAUSE_WORDS | _JOIN_WORDS | {'ON'}:
+            continue
+        parts = node.significant()
+        if len(parts) < 4 or not _is_word(parts[0], 'SELECT'):
+            continue
+        from_at = next((j for j, p in enumerate(parts) if _is_word(p, 'FROM')), None)
+        if from_at is None or from_at != len(parts) - 2 or not isinstance(parts[-1], Token) \
+                or parts[-1].kind not in ('ident', 'quoted'):
+            continue
+        selected = parts[1:from_at]
+        star = len(selected) == 1 and _is_op(selected[0], '*')
+        # Plain `a, b, c` column list: the outer query can only use those columns, unless it selects *
+        plain = len(selected) % 2 == 1 and all(
+            (isinstance(p, Token) and p.kind in ('ident', 'quoted') and p.upper not in ('DISTINCT', 'ALL'))
+            if k % 2 == 0 else _is_op(p, ',') for k, p in enumerate(selected))
+        if not (star or (plain and not outer_star)):
+            continue
+        ctx.record('inline_derived_table', node.sql(), parts[-1].text)
+        out[i] = parts[-1]
+    return out
+
+
+def _unwrap_select_star(nodes, ctx):
+    """`SELECT * FROM (SELECT ...) alias` with nothing else -> the inner SELECT"""
+    while True:
+        parts = [n for n in nodes if not _is_space(n) and not _is_op(n, ';')]
+        if len(parts) not in (5, 6) or not (_is_word(parts[0], 'SELECT') and _is_op(parts[1], '*')
+                                            and _is_word(parts[2], 'FROM') and isinstance(parts[3], Group)
+                                            and parts[3].is_subquery):
+            return nodes
+        if len(parts) == 6 and not _is_word(parts[4], 'AS'):
+            return nodes
+        alias = parts[-1]
+        if not isinstance(alias, Token) or alias.kind not in ('ident', 'quoted') or alias.upper in _CLAUSE_WORDS:
+            return nodes
+        ctx.record('unwrap_subquery', _render(nodes).strip(), 'outer SELECT * removed')
+        nodes = parts[3].tokens + [n for n in nodes if _is_op(n, ';')]
+
+
+def _rewrite_statement(nodes, ctx):
+    """Rewrite one SELECT (and, recursively, its subqueries)"""
+    spans = clause_spans(nodes)
+    from_span = next(((s, e) for name, s, e in spans if name == 'FROM'), None)
+    if from_span is not None:
+        nodes = _inline_derived_tables(nodes, from_span, ctx)
+    conditions = [(s + 1, e) for name, s, e in spans if name == 'WHERE']
+    if from_span is not None:
+        # ON conditions run from ON to the next join keyword or the end of FROM
+        start = None
+        for i in range(from_span[0], from_span[1]):
+            if _is_word(nodes[i], 'ON'):
+                start = i + 1
+            elif start is not None and isinstance(nodes[i], Token) and nodes[i].upper in _JOIN_WORDS:
+                conditions.append((start, i))
+                start = None
+        if start is not None:
+            conditions.append((start, from_span[1]))
+    out = []
+    i = 0
+    for start, end in sorted(conditions):
+        # A final WHERE runs to the end of the statement; keep its terminator out of the condition
+        while end > start and (_is_space(nodes[end - 1]) or _is_op(nodes[end - 1], ';')):
+            end -= 1
+        out.extend(_rewrite_nested(nodes[i:start], ctx))
+        region = _rewrite_condition(nodes[start:end], ctx)
+        out.extend(region)
+        i = end
+    out.extend(_rewrite_nested(nodes[i:], ctx))
+    return out
+
+
+def _rewrite_nested(nodes, ctx):
+    """Rewrite subqueries found anywhere inside nodes that aren't a condition"""
+    out = []
+    for node in nodes:
+        if isinstance(node, Group):
+            node = Group(_rewrite_statement(node.tokens, ctx) if node.is_subquery else _rewrite_nested(node.tokens, ctx))
+        out.append(node)
+    return out
+
+
+def _add_default_limit(nodes, limit, ctx):
+    """Append LIMIT to a plain row-returning SELECT (no aggregate, GROUP BY, LIMIT or UNION)"""
+    parts = [n for n in nodes if not _is_space(n)]
+    if not parts or not _is_word(parts[0], 'SELECT'):
+        return nodes
+    names = {name for name, _, _ in clause_spans(nodes)}
+    if names & {'LIMIT', 'GROUP BY', 'UNION', 'INTERSECT', 'EXCEPT', 'FOR', 'INTO', 'LOCK', 'HAVING'}:
+        return nodes
+    aggregated = _select_list_has(nodes, lambda n: n.kind == 'ident' and n.upper in _AGGREGATES)
+    windowed = _select_list_has(nodes, lambda n: _is_word(n, 'OVER'))
+    if aggregated and not windowed:
+        return nodes
+    end = len(nodes)
+    while end > 0 and (_is_space(nodes[end - 1]) or _is_op(nodes[end - 1], ';')):
+        end -= 1
+    ctx.rewrites.append({'rule': 'default_limit', 'limit': limit})
+    return nodes[:end] + _fragment(f" LIMIT {int(limit)}") + nodes[end:]
+
+
+def rewrite_sql(sql, date_columns=DEFAULT_DATE_COLUMNS, default_limit=None, tree=None):
+    """Rewrite a SELECT so the same answer can use index range scans.
+
+    - DATE(col) =/</<=/>/>=/BETWEEN date and YEAR(col) = year become half-open ranges on col
+      (only for date_columns; None means any column), and YEAR(col) = y AND MONTH(col) = m in
+      the same conjunction becomes a one-month range
+    - SELECT * FROM (SELECT ...) alias is unwrapped, trivial derived tables over a single table
+      are inlined, and DISTINCT inside IN (SELECT ...) is dropped
+    - with default_limit, a non-aggregated statement without LIMIT gets LIMIT default_limit
+
+    tree may be a parse() result for sql to avoid parsing it again. Returns (sql, rewrites), where
+    rewrites lists the applied rules; unparseable SQL is returned unchanged.
+    """
+    ctx = _Context(date_columns)
+    try:
+        root = tree if tree is not None else parse(sql)
+        nodes = _unwrap_select_star(root.tokens, ctx)
+        nodes = _rewrite_statement(nodes, ctx)
+        if default_limit:
+            nodes = _add_default_limit(nodes, default_limit, ctx)
+    except (SQLParseError, RecursionError) as e:
+        logger.debug(f"SQL rewrite skipped: {e}")
+        return sql, []
+    if not ctx.rewrites:
+        return sql, []
+    return _render(nodes).strip(), ctx.rewrites
@@ -0,0 +1,515 @@
+import re
+import time
+import hashlib
+import logging
+from functools import lru_cache
+from sqlrewrite import parse, clause_spans, Token, Group, SQLParseError
+
+logger = logging.getLogger(__name__)
+
+_TABLE_LINE_RE = re.compile(r'^\s*Table: `?(\w+)`?')
+_COLUMN_LINE_RE = re.compile(r'^\s+- `?(\w+)`?:')
+
+_JOIN_WORDS = {'JOIN', 'INNER', 'LEFT', 'RIGHT', 'FULL', 'CROSS', 'NATURAL', 'STRAIGHT_JOIN', 'OUTER', 'LATERAL'}
+_SET_OPERATORS = {'UNION', 'INTERSECT', 'EXCEPT'}
+_SELECT_MODIFIERS = {'DISTINCT', 'ALL', 'DISTINCTROW', 'HIGH_PRIORITY', 'STRAIGHT_JOIN', 'SQL_SMALL_RESULT',
+                     'SQL_BIG_RESULT', 'SQL_BUFFER_RESULT', 'SQL_NO_CACHE', 'SQL_CACHE', 'SQL_CALC_FOUND_ROWS'}
+# Words that end an expression, so an identifier right after them is an implicit alias
+_VALUE_WORDS = {'END', 'NULL', 'TRUE', 'FALSE', 'CURRENT_DATE', 'CURRENT_TIME', 'CURRENT_TIMESTAMP', 'CURRENT_USER',
+                'LOCALTIME', 'LOCALTIMESTAMP', 'UTC_DATE', 'UTC_TIME', 'UTC_TIMESTAMP'}
+# Identifiers in an expression that are never column references (function names are recognised by
+# the parenthesis that follows them, so only keywords, units, type names and niladic functions are here)
+_KEYWORDS = _VALUE_WORDS | _SELECT_MODIFIERS | _JOIN_WORDS | _SET_OPERATORS | {
+    'SELECT', 'FROM', 'WHERE', 'GROUP', 'BY', 'HAVING', 'ORDER', 'LIMIT', 'OFFSET', 'WINDOW', 'WITH', 'ROLLUP',
+    'RECURSIVE', 'AS', 'ON', 'USING', 'AND', 'OR', 'XOR', 'NOT', 'IN', 'IS', 'LIKE', 'ESCAPE', 'REGEXP', 'RLIKE',
+    'SOUNDS', 'BETWEEN', 'EXISTS', 'ANY', 'SOME', 'CASE', 'WHEN', 'THEN', 'ELSE', 'DIV', 'MOD', 'ASC', 'DESC',
+    'INTERVAL', 'BINARY', 'COLLATE', 'SEPARATOR', 'UNKNOWN', 'OVER', 'PARTITION', 'ROWS', 'RANGE', 'UNBOUNDED',
+    'PRECEDING', 'FOLLOWING', 'CURRENT', 'ROW', 'LEADING', 'TRAILING', 'BOTH', 'FOR', 'DUAL',
+    'MICROSECOND', 'SECOND', 'MINUTE', 'HOUR', 'DAY', 'WEEK', 'MONTH', 'QUARTER', 'YEAR', 'SECOND_MICROSECOND',
+    'MINUTE_MICROSECOND', 'MINUTE_SECOND', 'HOUR_MICROSECOND', 'HOUR_SECOND', 'HOUR_MINUTE', 'DAY_MICROSECOND',
+    'DAY_SECOND', 'DAY_MINUTE', 'DAY_HOUR', 'YEAR_MONTH',
+    'SIGNED', 'UNSIGNED', 'INTEGER', 'INT', 'DECIMAL', 'NUMERIC', 'FLOAT', 'DOUBLE', 'REAL', 'CHAR', 'NCHAR',
+    'VARCHAR', 'DATE', 'DATETIME', 'TIME', 'TIMESTAMP', 'JSON', 'PRECISION',
+}
+
+
+class SQLValidationError(ValueError):
+    """Generated SQL that must not be executed; reason is a short label for metrics"""
+
+    def __init__(self, message, reason):
+        super().__init__(message)
+        self.reason = reason
+
+
+class ValidatedSQL:
+    """What validate_sql found: the parse tree (pass it to rewrite_sql(tree=...)), the schema tables
+    and (table, column) pairs referenced, and any tables or columns the schema doesn't have"""
+    __slots__ = ('sql', 'tree', 'tables', 'columns', 'unknown_tables', 'unknown_columns')
+
+    def __init__(self, sql, tree):
+        self.sql = sql
+        self.tree = tree
+        self.tables = set()
+        self.columns = set()
+        self.unknown_tables = set()
+        self.unknown_columns = set()
+
+    @property
+    def fingerprint(self):
+        return fingerprint(self.tree)
+
+
+@lru_cache(maxsize=32)
+def schema_tables(schema):
+    """{table: frozenset(columns)}, lower-cased, from the schema text built by db_get_schema"""
+    tables = {}
+    columns = None
+    for line in schema.splitlines():
+        match = _TABLE_LINE_RE.match(line)
+        if match:
+            columns = tables.setdefault(match.group(1).lower(), set())
+            continue
+        match = _COLUMN_LINE_RE.match(line)
+        if match and columns is not None:
+            columns.add(match.group(1).lower())
+    return {table: frozenset(cols) for table, cols in tables.items()}
+
+
+def _is_space(node):
+    return isinstance(node, Token) and node.kind in ('ws', 'comment')
+
+
+def _significant(nodes):
+    return [node for node in nodes if not _is_space(node)]
+
+
+def _is_word(node, *words):
+    return isinstance(node, Token) and node.is_word(*words)
+
+
+def _is_op(node, *ops):
+    return isinstance(node, Token) and node.kind in ('op', 'punct') and node.text in ops
+
+
+def _is_name(node):
+    """An identifier that could name a table, column or alias"""
+    return isinstance(node, Token) and (node.kind == 'quoted' or (node.kind == 'ident' and node.upper not in _KEYWORDS
+                                                                 and not node.text.startswith('@')))
+
+
+def _split(nodes, is_separator):
+    parts = [[]]
+    for node in nodes:
+        if is_separator(node):
+            parts.append([])
+        else:
+            parts[-1].append(node)
+    return parts
+
+
+class _Scope:
+    """Tables visible to one SELECT: alias -> columns (None when unknown, e.g. an unresolved table)"""
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.sources = {}
+        self.names = set()  # SELECT list aliases and window names
+
+    def source(self, alias):
+        scope = self
+        while scope is not None:
+            if alias in scope.sources:
+                return scope.sources[alias]
+            scope = scope.parent
+        return False
+
+    def resolve(self, column):
+        """The alias of the table providing column, '' for a SELECT alias or open source, None if unknown"""
+        scope = self
+        while scope is not None:
+            for alias, (table, columns) in scope.sources.items():
+                if columns is not None and column in columns:
+                    return table or alias
+            if column in scope.names or any(columns is None for _, columns in scope.sources.values()):
+                return ''
+            scope = scope.parent
+        return None
+
+    def all_columns(self):
+        names = set()
+        for _, columns in self.sources.values():
+            if columns is None:
+                return None
+            names |= columns
+        return names
+
+
+class _Validator:
+    def __init__(self, result, tables):
+        self.result = result
+        self.tables = tables
+
+    def statement(self, nodes):
+        parts = _significant(nodes)
+        while parts and _is_op(parts[-1], ';'):
+            parts.pop()
+        if any(_is_op(node, ';') for node in parts):
+            raise SQLValidationError("Only a single statement is allowed", 'multiple_statements')
+        if not parts:
+            raise SQLValidationError("Empty SQL statement", 'not_select')
+        self.query(parts, None, {}, top_level=True)
+
+    def query(self, nodes, parent, ctes, top_level=False):
+        """Check a query expression (WITH, SELECT, set operations); returns its output column names or None"""
+        parts = _significant(nodes)
+        if parts and _is_word(parts[0], 'WITH'):
+            ctes = dict(ctes)
+            k = 2 if len(parts) > 1 and _is_word(parts[1], 'RECURSIVE') else 1
+            while k < len(parts):
+                if not _is_name(parts[k]):
+                    raise SQLValidationError("Malformed WITH clause", 'parse_error')
+                name = parts[k].name.lower()
+                k += 1
+                declared = None
+                if k < len(parts) and isinstance(parts[k], Group) and not parts[k].is_subquery:
+                    declared = {node.name.lower() for node in parts[k].significant() if _is_name(node)}
+                    k += 1
+                if k + 1 >= len(parts) or not _is_word(parts[k], 'AS') or not isinstance(parts[k + 1], Group):
+                    raise SQLValidationError("Malformed WITH clause", 'parse_error')
+                ctes[name] = declared  # visible inside its own body for WITH RECURSIVE
+                outputs = self.query(parts[k + 1].tokens, parent, ctes)
+                ctes[name] = declared if declared is not None else outputs
+                k += 2
+                if k >= len(parts) or not _is_op(parts[k], ','):
+                    break
+                k += 1
+            parts = parts[k:]
+        outputs = False
+        for branch in _split(parts, lambda node: _is_word(node, *_SET_OPERATORS)):
+            while branch and _is_word(branch[0], 'ALL', 'DISTINCT'):
+                branch = branch[1:]
+            if branch and isinstance(branch[0], Group) and branch[0].is_subquery:
+                columns = self.query(branch[0].tokens, parent, ctes, top_level)
+            elif branch and _is_word(branch[0], 'SELECT'):
+                columns = self.select(branch, parent, ctes, top_level)
+            else:
+                raise SQLValidationError("Only SELECT statements are allowed", 'not_select')
+            if outputs is False:
+                outputs = columns
+        return outputs
+
+    def select(self, nodes, parent, ctes, require_from):
+        spans = clause_spans(nodes)
+        names = {name for name, _, _ in spans}
+        if 'INTO' in names:
+            raise SQLValidationError("SELECT ... INTO is not allowed", 'select_into')
+        for name, start, end in spans:
+            following = _significant(nodes[start + 1:end])[:1]
+            if name == 'LOCK' or (name == 'FOR' and following and _is_word(following[0], 'UPDATE', 'SHARE')):
+                raise SQLValidationError("Locking reads are not allowed", 'locking_read')
+        if require_from and 'FROM' not in names:
+            raise SQLValidationError("SQL query must contain a FROM clause", 'missing_from')
+
+        scope = _Scope(parent)
+        expressions = []
+        for name, start, end in spans:
+            if name == 'FROM':
+                expressions += self.from_clause(nodes[start + 1:end], scope, ctes)
+            elif name == 'WINDOW':
+                body = _significant(nodes[start + 1:end])
+                scope.names |= {node.name.lower() for k, node in enumerate(body[:-1])
+                                if _is_name(node) and _is_word(body[k + 1], 'AS')}
+                expressions.append([node for node in body if isinstance(node, Group)])
+            elif name in ('WHERE', 'GROUP BY', 'HAVING', 'ORDER BY'):
+                expressions.append(nodes[start + 1:end])
+
+        outputs = set()
+        select = next(((start, end) for name, start, end in spans if name == 'SELECT'), None)
+        for item in _split(_significant(nodes[select[0] + 1:select[1]]), lambda node: _is_op(node, ',')):
+            while item and _is_word(item[0], *_SELECT_MODIFIERS):
+                item = item[1:]
+            alias = None
+            if len(item) >= 3 and _is_word(item[-2], 'AS'):
+                alias, item = item[-1], item[:-2]
+            elif len(item) >= 2 and _is_name(item[-1]) and _ends_expression(item[-2]):
+                alias, item = item[-1], item[:-1]
+            if alias is not None:
+                name = alias.name.strip("'\"") if alias.kind == 'string' else alias.name
+                scope.names.add(name.lower())
+                outputs.add(name.lower())
+            elif item and _is_op(item[-1], '*'):
+                source = scope.source(item[-3].name.lower()) if len(item) >= 3 and _is_op(item[-2], '.') else None
+                columns = source[1] if source else scope.all_columns()
+                if outputs is not None:
+                    outputs = None if columns is None else outputs | columns
+            elif item and outputs is not None:
+                last = item[-1]
+                outputs.add(last.name.lower() if _is_name(last) else ''.join(n.sql() for n in item).lower())
+            expressions.append(item)
+        for nodes in expressions:
+            self.expression(nodes, scope, ctes)
+        return outputs
+
+    def from_clause(self, nodes, scope, ctes):
+        """Register the FROM clause's tables in scope; returns the ON / USING conditions to check"""
+        parts = _significant(nodes)
+        conditions = []
+        k = 0
+        while k < len(parts):
+            node = parts[k]
+            if _is_op(node, ',') or _is_word(node, *_JOIN_WORDS):
+                k += 1
+            elif _is_word(node, 'ON'):
+                end = k + 1
+                while end < len(parts) and not (_is_op(parts[end], ',') or _is_word(parts[end], *_JOIN_WORDS)):
+                    end += 1
+                conditions.append(parts[k + 1:end])
+                k = end
+            elif _is_word(node, 'USING') and k + 1 < len(parts) and isinstance(parts[k + 1], Group):
+                conditions.append(parts[k + 1].tokens)
+                k += 2
+            elif isinstance(node, Group) and node.is_subquery:
+                outputs = self.query(node.tokens, scope, ctes)
+                alias, k = _read_alias(parts, k + 1)
+                if k < len(parts) and isinstance(parts[k], Group) and not parts[k].is_subquery:
+                    outputs = {n.name.lower() for n in parts[k].significant() if _is_name(n)}
+                    k += 1
+                scope.sources[alias or ''] = (None, frozenset(outputs) if outputs is not None else None)
+            elif isinstance(node, Group):
+                conditions += self.from_clause(node.tokens, scope, ctes)
+                k += 1
+            elif _is_name(node) or _is_word(node, 'DUAL'):
+                name = node.name
+                k += 1
+                while k + 1 < len(parts) and _is_op(parts[k], '.') and _is_name(parts[k + 1]):
+                    name = parts[k + 1].name  # db.table -> table
+                    k += 2
+                if k + 1 < len(parts) and _is_word(parts[k], 'PARTITION') and isinstance(parts[k + 1], Group):
+                    k += 2
+                alias, k = _read_alias(parts, k)
+                while k < len(parts) and _is_word(parts[k], 'USE', 'FORCE', 'IGNORE'):
+                    # Index hint: USE|FORCE|IGNORE INDEX|KEY [FOR ...] (index, ...)
+                    while k < len(parts) and not isinstance(parts[k], Group):
+                        k += 1
+                    k += 1
+                scope.sources[(alias or name).lower()] = (name, self.table(name, ctes))
+            else:
+                k += 1
+        return conditions
+
+    def table(self, name, ctes):
+        key = name.lower()
+        if key in ctes:
+            return frozenset(ctes[key]) if ctes[key] is not None else None
+        if key == 'dual':
+            return frozenset()
+        if key not in self.tables:
+            self.result.unknown_tables.add(name)
+            return None
+        self.result.tables.add(name)
+        return self.tables[key]
+
+    def expression(self, nodes, scope, ctes):
+        parts = _significant(nodes)
+        for k, node in enumerate(parts):
+            if isinstance(node, Group):
+                if node.is_subquery:
+                    self.query(node.tokens, scope, ctes)
+                else:
+                    self.expression(node.tokens, scope, ctes)
+                continue
+            previous = parts[k - 1] if k else None
+            following = parts[k + 1] if k + 1 < len(parts) else None
+            if not _is_name(node) or _is_op(previous, '.'):
+                continue
+            if node.kind == 'ident' and isinstance(following, Group):
+                continue  # function call
+            if _is_word(previous, 'AS', 'OVER', 'COLLATE', 'USING'):
+                continue  # alias, window name, collation or charset
+            if node.kind == 'ident' and isinstance(following, Token) and following.kind == 'string':
+                continue  # typed literal or charset introducer: DATE '2024-01-01', _utf8mb4'x'
+            if _is_op(following, '.') and k + 2 < len(parts):
+                qualified = [node.name]
+                j = k
+                while j + 2 < len(parts) and _is_op(parts[j + 1], '.') and (_is_name(parts[j + 2])
+                                                                          or _is_op(parts[j + 2], '*')):
+                    qualified.append(parts[j + 2].name)
+                    j += 2
+                self.qualified_column(qualified, scope)
+            else:
+                self.column(node.name, scope)
+
+    def column(self, name, scope):
+        owner = scope.resolve(name.lower())
+        if owner is None:
+            self.result.unknown_columns.add(name)
+        elif owner:
+            self.result.columns.add((owner, name))
+
+    def qualified_column(self, parts, scope):
+        qualifier, name = parts[-2], parts[-1]
+        source = scope.source(qualifier.lower())
+        if source is False:
+            self.result.unknown_columns.add(f"{qualifier}.{name}")
+            return
+        table, columns = source
+        if name == '*' or columns is None:
+            return
+        if name.lower() not in columns:
+            self.result.unknown_columns.add(f"{qualifier}.{name}")
+        elif table:
+            self.result.columns.add((table, name))
+
+
+def _ends_expression(node):
+    if isinstance(node, Group):
+        return True
+    if node.kind == 'ident':
+        return node.upper not in _KEYWORDS or node.upper in _VALUE_WORDS
+    return node.kind in ('quoted', 'number', 'string')
+
+
+def _read_alias(parts, k):
+    """Optional `[AS] alias` at parts[k]; returns (alias or None, index after it)"""
+    if k + 1 < len(parts) and _is_word(parts[k], 'AS'):
+        return parts[k + 1].name.lower(), k + 2
+    if k < len(parts) and _is_name(parts[k]) and not _is_word(parts[k], 'USE', 'FORCE', 'IGNORE', 'PARTITION'):
+        return parts[k].name.lower(), k + 1
+    return None, k
+
+
+def validate_sql(sql, tables, tree=None):
+    """Parse a generated statement once and resolve it against the schema.
+
+    tables is {table: columns} as returned by schema_tables(). Anything other than a single
+    read-only SELECT (or WITH ... SELECT) raises SQLValidationError; tables and columns the schema
+    doesn't have are reported on the result rather than raised, so the caller decides.
+    """
+    try:
+        tree = tree if tree is not None else parse(sql)
+    except SQLParseError as e:
+        raise SQLValidationError(f"Generated SQL could not be parsed: {e}", 'parse_error')
+    result = ValidatedSQL(sql, tree)
+    try:
+        _Validator(result, tables).statement(tree.tokens)
+    except RecursionError:
+        raise SQLValidationError("Generated SQL is nested too deeply", 'parse_error')
+    return result
+
+
+def normalize_sql(tree, literals=True):
+    """Canonical text of a parsed statement for keys and grouping: comments and trailing ';' dropped,
+    whitespace collapsed and unquoted identifiers upper-cased; literals=False replaces strings and
+    numbers with ?"""
+    def render(nodes):
+        out = []
+        previous = None
+        for node in nodes:
+            if _is_space(node) or _is_op(node, ';'):
+                continue
+            if isinstance(node, Group):
+                text = f"({render(node.tokens)})"
+                tight = isinstance(previous, Token) and previous.kind == 'ident'  # function call
+            else:
+                text = '?' if not literals and node.kind in ('string', 'number') else node.upper
+                tight = _is_op(node, '.', ',')
+            if out and not tight and not _is_op(previous, '.'):
+                out.append(' ')
+            out.append(text)
+            previous = node
+        return ''.join(out)
+    return render(tree.tokens)
+
+
+def fingerprint(tree):
+    """Short hash of the statement with literals masked, equal for the same query shape"""
+    return hashlib.sha1(normalize_sql(tree, literals=False).encode('utf-8')).hexdigest()[:16]
+
+
+# Benchmark against the regex pass this module replaced
+
+_LEGACY_KEYWORDS = {
+    'SELECT', 'FROM', 'WHERE', 'AND', 'OR', 'NOT', 'IN', 'BETWEEN', 'LIKE', 'IS', 'NULL', 'GROUP', 'BY', 'ORDER',
+    'HAVING', 'LIMIT', 'OFFSET', 'JOIN', 'INNER', 'OUTER', 'LEFT', 'RIGHT', 'FULL', 'UNION', 'ALL', 'EXISTS',
+    'CASE', 'WHEN', 'THEN', 'ELSE', 'END', 'AS', 'ON', 'DISTINCT', 'ASC', 'DESC', 'AVG', 'SUM', 'COUNT', 'MIN',
+    'MAX', 'DATE', 'YEAR', 'MONTH', 'DAY', 'NOW', 'CURRENT_DATE', 'INTERVAL', 'CURRENT_TIMESTAMP', 'DATE_ADD',
+    'DATE_SUB', 'IF', 'NULLIF', 'COALESCE', 'EXTRACT', 'CAST', 'CONVERT', 'WITH', 'RECURSIVE', 'RTM', 'WEEK',
+    'CURDATE', 'CHAR_LENGTH', 'LENGTH', 'CONCAT', 'SUBSTRING', 'UPPER', 'LOWER', 'TRIM', 'LTRIM', 'RTRIM',
+    'REPLACE', 'LOCATE', 'POSITION', 'REPEAT', 'MOD', 'ROUND', 'FLOOR', 'CEIL', 'ABS', 'POWER', 'RAND',
+    'ROW_NUMBER', 'RANK', 'DENSE_RANK', 'NTILE', 'LAG', 'LEAD', 'FIRST_VALUE', 'LAST_VALUE', 'PARTITION', 'OVER',
+    'WINDOW', 'DAM', 'Total_Volume'
+}
+
+
+def _legacy_regex_check(sql, schema):
+    """The regex column scan process_natural_query ran before validate_sql, for timing comparison"""
+    schema_columns = set(re.findall(r"- (\w+):", schema))
+    column_refs = set()
+    from_pos = sql.upper().find('FROM')
+    if from_pos == -1:
+        raise ValueError("SQL query must contain a FROM clause")
+    remaining_query = sql[from_pos:]
+    table_refs = set()
+    table_match = re.search(r'FROM\s+([\w,`"\s]+)(?:\s+WHERE|\s+GROUP|\s+ORDER|\s+HAVING|\s+LIMIT|$)',
+                            remaining_query, re.IGNORECASE)
+    if table_match:
+        for table_ref in re.findall(r'([\w`"]+)(?:\s+AS\s+([\w`"]+))?', table_match.group(1)):
+            table_refs.update(r.strip('`"') for r in table_ref if r)
+    for part in re.split(r'WHERE|GROUP BY|ORDER BY|HAVING|LIMIT', remaining_query, flags=re.IGNORECASE):
+        if not part.strip():
+            continue
+        for word in re.findall(r'\b([a-zA-Z_][a-zA-Z0-9_]*)\b', part):
+            if word.upper() not in _LEGACY_KEYWORDS and not word.isdigit() and word not in table_refs:
+                column_refs.add(word)
+    return column_refs - schema_columns
+
+
+BENCHMARK_SCHEMA = "\n".join(
+    f"\nTable: {table}\n" + "\n".join(f"  - {column}: {kind}" for column, kind in (
+        ('Record_Date', 'date'), ('Record_Hour', 'int'), ('Time_Block', 'varchar(20)'),
+        ('Purchase_Bid_MW', 'decimal(12,2)'), ('Sell_Bid_MW', 'decimal(12,2)'), ('MCV_MW', 'decimal(12,2)'),
+        ('Final_Scheduled_Volume_MW', 'decimal(12,2)'), ('MCP_Rs_MWh', 'decimal(12,2)')))
+    for table in ('energy_bids_dam', 'energy_bids_gdam', 'energy_bids_rtm', 'energy_bids_tam', 'energy_bids_gtam'))
+
+BENCHMARK_QUERIES = [
+    "SELECT Record_Date, ROUND(AVG(MCP_Rs_MWh), 2) AS avg_mcp FROM energy_bids_dam "
+    "WHERE Record_Date BETWEEN '2024-01-01' AND '2024-01-31' GROUP BY Record_Date ORDER BY Record_Date;",
+    "SELECT Record_Hour, SUM(Purchase_Bid_MW) AS Purchase_Bid_MW, SUM(Sell_Bid_MW) AS Sell_Bid_MW "
+    "FROM energy_bids_rtm WHERE DATE(Record_Date) = '2024-03-15' GROUP BY Record_Hour ORDER BY Record_Hour;",
+    "SELECT d.Record_Date, ROUND(SUM(d.MCV_MW)/4000, 2) AS dam_MU, ROUND(SUM(g.MCV_MW)/4000, 2) AS gdam_MU "
+    "FROM energy_bids_dam d JOIN energy_bids_gdam g ON d.Record_Date = g.Record_Date "
+    "AND d.Time_Block = g.Time_Block WHERE YEAR(d.Record_Date) = 2024 AND MONTH(d.Record_Date) = 5 "
+    "GROUP BY d.Record_Date ORDER BY d.Record_Date;",
+    "WITH daily AS (SELECT Record_Date, MAX(MCP_Rs_MWh) AS peak FROM energy_bids_dam GROUP BY Record_Date) "
+    "SELECT Record_Date, peak, RANK() OVER (ORDER BY peak DESC) AS peak_rank FROM daily "
+    "WHERE Record_Date >= CURDATE() - INTERVAL 30 DAY ORDER BY peak_rank LIMIT 10;",
+    "SELECT Record_Date, Time_Block, MCP_Rs_MWh FROM energy_bids_dam WHERE MCP_Rs_MWh > "
+    "(SELECT AVG(MCP_Rs_MWh) FROM energy_bids_dam WHERE Record_Date >= '2024-01-01') ORDER BY MCP_Rs_MWh DESC;",
+]
+
+
+def benchmark(queries=BENCHMARK_QUERIES, schema=BENCHMARK_SCHEMA, repeat=2000):
+    """Mean microseconds per query for the legacy regex pass, validate_sql, and validate_sql's share
+    of parse() (which rewrite_sql no longer repeats when given the tree)"""
+    tables = schema_tables(schema)
+    results = []
+    for sql in queries:
+        entry = {'sql': sql}
+        for label, fn in (('regex_us', lambda: _legacy_regex_check(sql, schema)),
+                          ('validate_us', lambda: validate_sql(sql, tables)),
+                          ('parse_us', lambda: parse(sql))):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                fn()
+            entry[label] = round((time.perf_counter() - start) / repeat * 1e6, 1)
+        checked = validate_sql(sql, tables)
+        entry['unknown_columns'] = sorted(checked.unknown_columns)
+        entry['legacy_unknown_columns'] = sorted(_legacy_regex_check(sql, schema))
+        results.append(entry)
+    return results
+
+
+if __name__ == '__main__':
+    import json
+
+    print(json.dumps(benchmark(), indent=2))
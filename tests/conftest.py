@@ -0,0 +1,22 @@
+import os
+import sys
+
+# The application modules live flat in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture(scope='session')
+def webapp(tmp_path_factory):
+    """The webinterface7 module, imported from a scratch directory so its sqlite SQL cache lands there.
+
+    No MySQL server or Ollama is needed: the import logs the refused connections and carries on.
+    """
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('webapp'))
+    try:
+        import webinterface7
+    finally:
+        os.chdir(cwd)
+    return webinterface7
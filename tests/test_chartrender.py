@@ -0,0 +1,76 @@
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import numpy as np
+import pytest
+
+from chartrender import chart_data, lttb_indices
+from columnar import to_column_arrays
+
+RNG = np.random.default_rng(7)
+
+
+@pytest.mark.parametrize('n, threshold', [(1000, 100), (1000, 3), (101, 100), (5000, 999)])
+def test_lttb_keeps_endpoints_and_threshold_points(n, threshold):
+    x = np.arange(n, dtype=np.float64)
+    y = RNG.normal(size=n).cumsum()
+    indices = lttb_indices(x, y, threshold)
+    assert len(indices) == threshold
+    assert indices[0] == 0 and indices[-1] == n - 1
+    assert (np.diff(indices) > 0).all()
+
+
+def test_lttb_keeps_a_lone_spike():
+    y = np.zeros(1000)
+    y[437] = 50.0
+    assert 437 in lttb_indices(np.arange(1000, dtype=np.float64), y, 50)
+
+
+@pytest.mark.parametrize('n, threshold', [(10, 10), (10, 50), (10, 0), (10, None), (10, 2), (0, 5)])
+def test_lttb_small_inputs_pass_through(n, threshold):
+    indices = lttb_indices(np.arange(n, dtype=np.float64), np.ones(n), threshold)
+    assert indices.tolist() == list(range(n))
+
+
+COLUMNS = ['Record_Date', 'MCP_Rs_MWh', 'MCV_MW']
+CONFIG = {'type': 'line', 'x_col': 0, 'y_cols': [1, 2], 'x_label': 'Record_Date',
+          'y_labels': ['MCP_Rs_MWh', 'MCV_MW']}
+
+
+def market_rows(count):
+    start = datetime(2024, 3, 1)
+    return [(start + timedelta(minutes=15 * i), Decimal(f'{4000 + i % 96}.25'), None if i == 5 else float(i))
+            for i in range(count)]
+
+
+def test_chart_data_shape():
+    rows = market_rows(2000)
+    data = chart_data(COLUMNS, to_column_arrays(rows, 3), CONFIG, max_points=200)
+    assert set(data) == {'x', 'series', 'points', 'source_points'}
+    assert data['points'] == 200 and data['source_points'] == 2000
+    assert len(data['x']) == 200
+    assert [s['label'] for s in data['series']] == CONFIG['y_labels']
+    for series in data['series']:
+        assert set(series) == {'label', 'values'}
+        assert len(series['values']) == 200
+        assert all(isinstance(v, float) and np.isfinite(v) for v in series['values'])
+    # Endpoints survive, and x values are ISO strings the frontend can print as-is
+    assert data['x'][0] == '2024-03-01T00:00:00'
+    assert data['x'][-1] == rows[-1][0].isoformat()
+    assert data['series'][0]['values'][0] == 4000.25
+    assert json.loads(json.dumps(data)) == data
+
+
+def test_chart_data_small_result_is_not_reduced():
+    rows = market_rows(20)
+    data = chart_data(COLUMNS, to_column_arrays(rows, 3), CONFIG, max_points=200)
+    assert data['points'] == data['source_points'] == 20
+    assert data['x'] == [row[0].isoformat() for row in rows]
+    assert data['series'][0]['values'] == [float(row[1]) for row in rows]
+    assert data['series'][1]['values'][5] == 0.0  # NULLs plot as zero, never as null
+
+
+def test_chart_data_without_plottable_series():
+    rows = [(datetime(2024, 3, 1), 'n/a', None)] * 3
+    assert chart_data(COLUMNS, to_column_arrays(rows, 3), CONFIG) is None
@@ -0,0 +1,52 @@
+import csv
+import io
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from mysql.connector.constants import FieldType
+
+from chartrender import prepare_series
+from columnar import column_kinds, column_to_json, iter_rows, to_column_arrays
+from resultcache import load_columns_npz, save_columns_npz
+
+ROWS = [(1, Decimal('4523.1700'), 0.5), (2, None, None), (3, Decimal('0.0001'), 1.25)]
+TYPE_CODES = [FieldType.LONG, FieldType.NEWDECIMAL, FieldType.DOUBLE]
+
+
+@pytest.mark.parametrize('type_codes', [TYPE_CODES, None], ids=['type_codes', 'inferred'])
+def test_decimal_columns_stay_exact(type_codes):
+    ids, prices, ratios = to_column_arrays(ROWS, 3, type_codes)
+    assert ids.dtype == np.int64 and ratios.dtype == np.float64
+    assert prices.dtype == object
+    assert prices.tolist() == [Decimal('4523.1700'), None, Decimal('0.0001')]
+
+
+def test_column_kinds():
+    description = [('id', FieldType.LONG), ('price', FieldType.NEWDECIMAL), ('ratio', FieldType.DOUBLE)]
+    assert column_kinds(description) == ['int', 'decimal', 'float']
+
+
+def test_csv_export_keeps_decimal_text():
+    arrays = to_column_arrays(ROWS, 3, TYPE_CODES)
+    out = io.StringIO()
+    csv.writer(out).writerows(iter_rows(arrays, ['int', 'decimal', 'float']))
+    assert out.getvalue().splitlines() == ['1,4523.1700,0.5', '2,,', '3,0.0001,1.25']
+
+
+def test_json_and_spill_keep_decimal_text(tmp_path):
+    arrays = to_column_arrays(ROWS, 3, TYPE_CODES)
+    assert column_to_json(arrays[1], 'decimal') == ['4523.1700', None, '0.0001']
+    path = str(tmp_path / 'result.npz')
+    save_columns_npz(path, ['id', 'price', 'ratio'], arrays)
+    _, loaded = load_columns_npz(path)
+    assert column_to_json(loaded[1], 'decimal') == ['4523.1700', None, '0.0001']
+
+
+def test_chart_series_converts_decimals_to_float():
+    arrays = to_column_arrays(ROWS, 3, TYPE_CODES)
+    graph_config = {'type': 'line', 'x_col': 0, 'y_cols': [1], 'x_label': 'id', 'y_labels': ['price']}
+    prepared = prepare_series(['id', 'price', 'ratio'], arrays, graph_config)
+    (_, y), = prepared['series']
+    assert y.dtype == np.float64
+    assert y.tolist() == [4523.17, 0.0, 0.0001]
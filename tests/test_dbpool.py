@@ -0,0 +1,38 @@
+from dbpool import ConnectionPool
+
+
+class _Connection:
+    def __init__(self, unread_result=False):
+        self.unread_result = unread_result
+        self.rolled_back = False
+        self.closed = False
+
+    def rollback(self):
+        self.rolled_back = True
+
+    def close(self):
+        self.closed = True
+
+
+def _pool(conn):
+    pool = ConnectionPool({}, pool_size=1)
+    pool._create_connection = lambda: conn
+    return pool
+
+
+def test_release_pools_a_clean_connection():
+    conn = _Connection()
+    pool = _pool(conn)
+    pool.release(pool.acquire())
+    assert conn.rolled_back and not conn.closed
+    assert pool.get_stats()['idle'] == 1
+
+
+def test_release_closes_connection_with_unread_rows_without_rollback():
+    conn = _Connection(unread_result=True)
+    pool = _pool(conn)
+    pool.release(pool.acquire())
+    assert not conn.rolled_back  # rollback() would read the rest of the result first
+    assert conn.closed
+    stats = pool.get_stats()
+    assert stats['idle'] == 0 and stats['discarded'] == 1 and stats['connections_open'] == 0
@@ -0,0 +1,103 @@
+import pytest
+from guardrails import (add_execution_time_hint, is_select_statement, FetchBudget, QueryCanceller, TRUNCATED_MAX_BYTES,
+                        TRUNCATED_MAX_ROWS)
+
+HINT = '/*+ MAX_EXECUTION_TIME(30000) */'
+
+
+@pytest.mark.parametrize('sql, expected', [
+    ("SELECT a FROM t;", f"SELECT {HINT} a FROM t;"),
+    ("  select a FROM t", f"  select {HINT} a FROM t"),
+    ("SELECT a FROM t WHERE b IN (SELECT c FROM u);", f"SELECT {HINT} a FROM t WHERE b IN (SELECT c FROM u);"),
+    ("WITH c AS (SELECT 1) SELECT * FROM c;", f"WITH c AS (SELECT 1) SELECT {HINT} * FROM c;"),
+    ("(SELECT a FROM t) UNION (SELECT a FROM u)", f"(SELECT {HINT} a FROM t) UNION (SELECT a FROM u)"),
+    ("/* report */ ((SELECT a FROM t)) ORDER BY a", f"/* report */ ((SELECT {HINT} a FROM t)) ORDER BY a"),
+    ("WITH a AS (SELECT 1) DELETE FROM t", "WITH a AS (SELECT 1) DELETE FROM t"),
+    ("SELECT /*+ MAX_EXECUTION_TIME(5) */ a FROM t", "SELECT /*+ MAX_EXECUTION_TIME(5) */ a FROM t"),
+    ("SHOW TABLES", "SHOW TABLES"),
+    ("SELECT 'unterminated", "SELECT 'unterminated"),
+])
+def test_execution_time_hint(sql, expected):
+    assert add_execution_time_hint(sql, 30000) == expected
+
+
+@pytest.mark.parametrize('sql, expected', [
+    ("SELECT 1", True),
+    ("  -- comment\n select a FROM t", True),
+    ("WITH c AS (SELECT 1) SELECT * FROM c", True),
+    ("WITH RECURSIVE n (i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT i FROM n", True),
+    ("(SELECT a FROM t) UNION (SELECT a FROM u)", True),
+    ("WITH a AS (SELECT 1) DELETE FROM t", False),
+    ("WITH a AS (SELECT 1) UPDATE t SET x = 1", False),
+    ("DELETE FROM t WHERE a IN (SELECT a FROM u)", False),
+    ("(DELETE FROM t)", False),
+    ("SHOW TABLES", False),
+    ("", False),
+    ("SELECT (", False),
+])
+def test_is_select_statement(sql, expected):
+    assert is_select_statement(sql) is expected
+
+
+def test_execution_time_hint_disabled():
+    assert add_execution_time_hint("SELECT 1", None) == "SELECT 1"
+    assert add_execution_time_hint("SELECT 1", 0) == "SELECT 1"
+
+
+def test_row_cap():
+    budget = FetchBudget(max_rows=7)
+    assert len(budget.take([(1,)] * 5)) == 5
+    assert budget.truncated is None
+    assert len(budget.take([(1,)] * 5)) == 2
+    assert budget.truncated == TRUNCATED_MAX_ROWS and budget.event == 'truncated_rows'
+    assert budget.take([(1,)] * 5) == []
+    assert budget.to_dict()['rows'] == 7 and budget.to_dict()['truncated'] is True
+
+
+def test_exact_row_cap_is_not_truncated():
+    budget = FetchBudget(max_rows=5)
+    assert len(budget.take([(1,)] * 5)) == 5
+    assert budget.truncated is None
+    assert budget.take([]) == []
+    assert budget.truncated is None
+
+
+def test_byte_cap():
+    budget = FetchBudget(max_bytes=1000)
+    kept = budget.take([(1, 'abc')] * 50)
+    assert 0 < len(kept) < 50
+    assert budget.truncated == TRUNCATED_MAX_BYTES and budget.event == 'truncated_bytes'
+    assert budget.bytes <= 1000
+
+
+def test_no_caps():
+    budget = FetchBudget()
+    assert len(budget.take([(1,)] * 10000)) == 10000
+    assert budget.truncated is None and budget.event is None
+
+
+class _Connection:
+    connection_id = 42
+
+
+def test_cancel_before_start_and_while_running():
+    killed = []
+    canceller = QueryCanceller(connect=None)
+    canceller.kill = lambda connection_id: killed.append(connection_id) or True
+
+    assert canceller.cancel('early') is False  # Nothing running yet, but remembered
+    assert canceller.is_cancelled('early')
+    with canceller.running('job', _Connection()):
+        assert canceller.cancel('job') is True
+    assert killed == [42]
+    assert canceller.cancel('job') is False  # Statement finished; no KILL
+    assert not canceller.is_cancelled(None)
+
+
+def test_release_forgets_a_cancelled_token():
+    canceller = QueryCanceller(connect=None)
+    canceller.cancel('request:1')
+    canceller.release('request:1')
+    assert not canceller.is_cancelled('request:1')  # A reused token starts out live
+    assert canceller.get_stats()['cancelled_tokens'] == 0
+    canceller.release(None)
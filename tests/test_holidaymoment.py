@@ -0,0 +1,127 @@
+import threading
+from datetime import date
+
+import numpy as np
+import pytest
+
+from holidaymoment import (EPOCH_ORDINAL, HolidayCalendar, _compact_holidays, _format_holidays,
+                           build_holiday_context, estimate_tokens, get_holiday_calendar,
+                           parse_date_filters, resolve_relative_range)
+
+
+def test_lazy_year_load_publishes_a_new_index():
+    calendar = HolidayCalendar('IN', 'DL', [2024])
+    before = calendar._index
+    assert calendar.holiday_name(date(2031, 1, 26)) == 'Republic Day'
+    after = calendar._index
+    assert after is not before
+    assert 2031 in after.years and 2031 not in before.years
+    # The old generation is left untouched for readers still holding it
+    assert all(date.fromordinal(o).year == 2024 for o in before.ordinals)
+
+
+def test_index_arrays_stay_parallel():
+    calendar = HolidayCalendar('IN', 'DL', [2024, 2025])
+    index = calendar._index
+    assert len(index.ordinals) == len(index.names) == len(index.day_numbers) == len(index.name_array)
+    assert list(index.day_numbers + EPOCH_ORDINAL) == list(index.ordinals)
+    assert not index.day_numbers.flags.writeable
+
+
+def test_concurrent_readers_see_consistent_snapshots():
+    calendar = HolidayCalendar('IN', 'DL', [2024])
+    republic_days = np.array([date(year, 1, 26).toordinal() - EPOCH_ORDINAL for year in range(2024, 2036)])
+    errors = []
+
+    def read():
+        try:
+            for _ in range(50):
+                _, is_holiday, names = calendar.classify_days(republic_days, np.ones(len(republic_days), dtype=bool))
+                assert is_holiday.all() and set(names) == {'Republic Day'}
+        except Exception as exc:  # surfaced in the main thread below
+            errors.append(exc)
+
+    def load():
+        for year in range(2025, 2036):
+            calendar.load_years([year])
+
+    threads = [threading.Thread(target=read) for _ in range(4)] + [threading.Thread(target=load)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+
+def context_days(context):
+    return [date.fromisoformat(line.split(':')[0]) for line in context.splitlines() if not line.startswith('(')]
+
+
+@pytest.mark.parametrize('query, today, expected', [
+    ("last month", date(2024, 1, 10), (date(2023, 12, 1), date(2023, 12, 31))),
+    ("past 3 weeks", date(2024, 1, 10), (date(2023, 12, 20), date(2024, 1, 10))),
+    ("last 2 days", date(2024, 1, 1), (date(2023, 12, 30), date(2024, 1, 1))),
+    ("last year", date(2024, 1, 10), (date(2023, 1, 1), date(2023, 12, 31))),
+    ("this week", date(2024, 12, 31), (date(2024, 12, 30), date(2025, 1, 5))),
+    ("this month", date(2024, 12, 31), (date(2024, 12, 1), date(2024, 12, 31))),
+    ("yesterday", date(2024, 1, 1), (date(2023, 12, 31), date(2023, 12, 31))),
+    ("last month", date(2024, 3, 31), (date(2024, 2, 1), date(2024, 2, 29))),
+    ("in 2024", date(2024, 1, 10), None),
+])
+def test_resolve_relative_range(query, today, expected):
+    assert resolve_relative_range(query, today) == expected
+
+
+def test_context_for_a_range_crossing_new_year():
+    context = build_holiday_context("holidays in the past 3 weeks", today=date(2024, 1, 10))
+    days = context_days(context)
+    assert date(2023, 12, 25) in days
+    assert all(date(2023, 12, 20) <= day <= date(2024, 1, 10) for day in days)
+
+
+@pytest.mark.parametrize('query', [
+    "holidays that maybe affected prices in 2024",
+    "holidays when the market was closed in 2024",
+    "holidays that decreased demand in 2024",
+])
+def test_month_names_match_whole_words_only(query):
+    assert parse_date_filters(query)['months'] == []
+    months = {day.month for day in context_days(build_holiday_context(query))}
+    assert len(months) > 1
+
+
+@pytest.mark.parametrize('query, month', [
+    ("holidays in may 2024", 5),
+    ("holidays in Mar, 2024", 3),
+])
+def test_month_names_still_filter(query, month):
+    days = context_days(build_holiday_context(query))
+    assert days and {day.month for day in days} == {month}
+
+
+def test_context_within_budget_is_unchanged():
+    query = "holidays in 2024"
+    full = _format_holidays(get_holiday_calendar().holidays_for([2024]))
+    assert build_holiday_context(query, token_budget=estimate_tokens(full)) == full
+
+
+def test_context_over_budget_is_regrouped_by_name():
+    query = "diwali and holi in 2023 2024 2025"
+    items = get_holiday_calendar().holidays_for([2023, 2024, 2025])
+    items = [(day, name) for day, name in items if 'Diwali' in name or name == 'Holi']
+    compact = _compact_holidays(items)
+    assert estimate_tokens(compact) < estimate_tokens(_format_holidays(items))
+    assert build_holiday_context(query, token_budget=estimate_tokens(compact)) == compact
+
+
+def test_context_over_budget_keeps_holidays_nearest_today():
+    today, budget = date(2024, 6, 15), 30
+    items = get_holiday_calendar().holidays_for([2024])
+    context = build_holiday_context("holidays in 2024", today=today, token_budget=budget)
+    listed, note = context.rsplit('\n', 1)
+    kept = context_days(listed)
+    assert estimate_tokens(listed + '\n') <= budget
+    assert note == f"(... {len(items) - len(kept)} more holidays further from today omitted)"
+    assert kept == sorted(kept)
+    nearest = sorted(items, key=lambda item: abs((item[0] - today).days))[:len(kept)]
+    assert kept == sorted(day for day, _ in nearest)
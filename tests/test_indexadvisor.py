@@ -0,0 +1,18 @@
+import pytest
+from indexadvisor import sargable_suggestions, extract_access_pattern
+
+
+@pytest.mark.parametrize('sql, original', [
+    ("SELECT MCV_MW FROM energy_bids_dam WHERE DATE(Record_Date) = '2024-03-15';", "DATE(Record_Date) = '2024-03-15'"),
+    ("SELECT MCV_MW FROM energy_bids_dam WHERE DATE(Record_Date) = '2024-03-15'", "DATE(Record_Date) = '2024-03-15'"),
+    ("SELECT MCV_MW FROM energy_bids_dam WHERE YEAR(Record_Date) = 2024 ORDER BY MCV_MW;", "YEAR(Record_Date) = 2024"),
+])
+def test_sargable_suggestions(sql, original):
+    assert [s['original'] for s in sargable_suggestions(sql)] == [original]
+
+
+def test_access_pattern():
+    sql = ("SELECT Record_Hour, SUM(MCV_MW) FROM energy_bids_dam "
+           "WHERE DATE(Record_Date) = '2024-03-15' AND Segment = 'DAM' GROUP BY Record_Hour;")
+    assert extract_access_pattern(sql) == {'energy_bids_dam': {
+        'equality': ['Segment'], 'range': [], 'wrapped': ['Record_Date'], 'group_by': ['Record_Hour'], 'order_by': []}}
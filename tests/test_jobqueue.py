@@ -0,0 +1,117 @@
+import json
+import threading
+
+import pytest
+
+from jobqueue import Job, JobQueue
+
+
+@pytest.fixture
+def queue():
+    queue = JobQueue(max_workers=1)
+    yield queue
+    queue.shutdown()
+
+
+def wait(queue, job, timeout=5.0):
+    seq = -1
+    while job.finished_at is None:
+        events = queue.wait_for_events(job, seq, timeout=timeout)
+        assert events, f"job {job.job_id} did not finish"
+        seq = events[-1]['seq']
+    return [event['stage'] for event in job.events]
+
+
+def pipeline(query, progress):
+    progress('sql_generated', sql='SELECT 1')
+    return {'query': query}
+
+
+def test_event_sequence(queue):
+    job = queue.submit(pipeline, 'q', description='q')
+    assert wait(queue, job) == ['queued', 'started', 'sql_generated', 'done']
+    assert [event['seq'] for event in job.events] == [0, 1, 2, 3]
+    assert job.to_dict()['result'] == {'query': 'q'}
+
+
+def test_error_result_fails_the_job(queue):
+    job = queue.submit(lambda progress: {'error': 'boom'})
+    assert wait(queue, job)[-1] == 'failed'
+    assert job.error == 'boom'
+
+
+def test_cancel_queued_job_never_runs(queue):
+    release, ran = threading.Event(), []
+    blocker = queue.submit(lambda progress: release.wait(5) and {})
+    job = queue.submit(lambda progress: ran.append(True) or {})
+    assert queue.cancel(job.job_id).status == 'cancelled'
+    release.set()
+    wait(queue, blocker)
+    assert [event['stage'] for event in job.events] == ['queued', 'cancelled']
+    assert not ran
+
+
+def test_job_cancelled_before_it_starts_does_not_run(queue):
+    # cancel() flagged the job but its future was already handed to a worker
+    ran = []
+    job = Job('j1', None)
+    job.cancel_requested = True
+    queue._run(job, lambda progress: ran.append(True), (), {})
+    assert job.status == 'cancelled' and job.events[-1]['stage'] == 'cancelled'
+    assert not ran
+
+
+def test_cancel_running_job_is_flagged(queue):
+    started, stop = threading.Event(), threading.Event()
+
+    def slow(progress):
+        started.set()
+        stop.wait(5)
+        return {'error': 'Query cancelled', 'cancelled': True}
+
+    job = queue.submit(slow)
+    started.wait(5)
+    assert queue.cancel(job.job_id).cancel_requested
+    assert job.status == 'running'
+    stop.set()
+    assert wait(queue, job)[-1] == 'cancelled'
+
+
+def test_cancel_unknown_job(queue):
+    assert queue.cancel('nope') is None
+
+
+def parse_sse(body):
+    events = []
+    for block in body.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+        if fields:
+            events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def test_sse_stream_of_a_finished_job(webapp):
+    job = webapp.job_queue.submit(pipeline, 'q', description='q')
+    wait(webapp.job_queue, job)
+    response = webapp.app.test_client().get(f'/jobs/{job.job_id}/events')
+    assert response.mimetype == 'text/event-stream'
+    events = parse_sse(response.get_data(as_text=True))
+    assert [name for name, _ in events] == ['queued', 'started', 'sql_generated', 'done']
+    assert events[2][1]['sql'] == 'SELECT 1'
+    assert events[-1][1]['status'] == 'done' and events[-1][1]['result'] == {'query': 'q'}
+
+
+def test_sse_stream_of_a_cancelled_job(webapp, monkeypatch):
+    monkeypatch.setitem(webapp.JOB_CONFIG, 'sse_heartbeat_seconds', 0.05)
+    release = threading.Event()
+    blockers = [webapp.job_queue.submit(lambda progress: release.wait(5) and {})
+                for _ in range(webapp.JOB_CONFIG['max_workers'])]
+    job = webapp.job_queue.submit(pipeline, 'q')
+    client = webapp.app.test_client()
+    assert client.post(f'/jobs/{job.job_id}/cancel').json['status'] == 'cancelled'
+    release.set()
+    events = parse_sse(client.get(f'/jobs/{job.job_id}/events').get_data(as_text=True))
+    assert [name for name, _ in events] == ['queued', 'cancelled']
+    assert events[-1][1]['status'] == 'cancelled'
+    for blocker in blockers:
+        wait(webapp.job_queue, blocker)
@@ -0,0 +1,114 @@
+import json
+
+import pytest
+
+from llmtelemetry import estimate_stream_timings, read_recent_llm_metrics, summarize_llm_metrics
+from tracing import BufferedJsonlWriter
+
+
+def _write(path, start, stop):
+    with open(path, 'a', encoding='utf-8') as f:
+        for i in range(start, stop):
+            f.write(json.dumps({'i': i, 'pad': 'x' * 50}) + '\n')
+
+
+def test_reads_only_the_tail(tmp_path):
+    path = str(tmp_path / 'llm_metrics.jsonl')
+    _write(path, 0, 5000)
+    assert [e['i'] for e in read_recent_llm_metrics(path, 3)] == [4997, 4998, 4999]
+    assert len(read_recent_llm_metrics(path, 4000)) == 4000
+    assert len(read_recent_llm_metrics(path, 10000)) == 5000
+
+
+def test_continues_into_rotated_file(tmp_path):
+    path = str(tmp_path / 'llm_metrics.jsonl')
+    _write(path + '.1', 0, 10)
+    _write(path, 10, 12)
+    assert [e['i'] for e in read_recent_llm_metrics(path, 5)] == [7, 8, 9, 10, 11]
+
+
+def test_missing_file(tmp_path):
+    assert read_recent_llm_metrics(str(tmp_path / 'missing.jsonl')) == []
+
+
+def test_writer_rotates_at_max_bytes(tmp_path):
+    path = str(tmp_path / 'log.jsonl')
+    writer = BufferedJsonlWriter(path, flush_interval=0.01, max_bytes=200)
+    for i in range(5):
+        writer._flush([{'i': i, 'pad': 'x' * 150}])  # ~170 bytes each: rotates before writes 2 and 4
+    writer.close()
+    assert [e['i'] for e in read_recent_llm_metrics(path, 10)] == [2, 3, 4]  # backup_count=1 keeps one old file
+    with open(path, encoding='utf-8') as f:
+        assert [json.loads(line)['i'] for line in f] == [4]
+
+
+@pytest.mark.parametrize('resident, loaded, load_seconds, prompt_rate', [
+    (True, False, None, 250.0),  # time to first token is prompt evaluation
+    (False, True, 2.0, None),    # the model was loaded for the request
+    (None, None, None, None),    # Ollama couldn't be asked: unknown, not "no load"
+])
+def test_estimate_stream_timings(resident, loaded, load_seconds, prompt_rate):
+    stats = estimate_stream_timings(500, 40, 2.0, 0.8, resident)
+    assert stats['model_loaded'] is loaded
+    assert stats['load_seconds'] == load_seconds
+    assert stats['prompt_tokens_per_sec'] == prompt_rate
+    assert stats['eval_tokens_per_sec'] == 50.0
+    assert stats['timings_estimated']
+
+
+def test_summary_counts_only_known_loads():
+    entries = [{'model_loaded': True, 'load_seconds': 3.0}, {'model_loaded': None}, {'model_loaded': False}]
+    assert summarize_llm_metrics(entries)['model_load_events'] == 1
+
+
+class FakeStream:
+    def __init__(self, events):
+        self.lines = [json.dumps(e).encode() for e in events]
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self):
+        yield from self.lines
+
+
+class FakePs:
+    def __init__(self, models):
+        self.models = models
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {'models': [{'name': name} for name in self.models]}
+
+
+@pytest.mark.parametrize('loaded_models, model_loaded', [
+    (['sqlcoder:latest'], False),
+    ([], True),
+    (None, None),
+])
+def test_stream_stopped_early_reports_model_load(webapp, monkeypatch, loaded_models, model_loaded):
+    events = [{'response': token, 'done': False} for token in ['SELECT', ' 1', ' FROM', ' t', ';', ' --']]
+    stream = FakeStream(events + [{'done': True, 'load_duration': 5e9}])
+
+    def fake_get(url, timeout):
+        if loaded_models is None:
+            raise webapp.requests.ConnectionError('refused')
+        return FakePs(loaded_models)
+
+    monkeypatch.setattr(webapp.requests, 'post', lambda *args, **kwargs: stream)
+    monkeypatch.setattr(webapp.requests, 'get', fake_get)
+    text, stats = webapp.llm_stream_sql({'model': 'sqlcoder', 'prompt': '...'}, prompt_tokens=300)
+    assert text == 'SELECT 1 FROM t;'
+    assert stats['stopped_early'] and stream.closed
+    assert stats['model_loaded'] is model_loaded
+    assert stats['eval_count'] == 5
+    assert (stats['prompt_eval_count'] == 300) is (model_loaded is False)
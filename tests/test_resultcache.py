@@ -0,0 +1,83 @@
+import os
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+import numpy as np
+
+from columnar import to_column_arrays
+from resultcache import ResultCache, load_results_npz, save_results_npz
+
+COLUMNS = ['Record_Date', 'Updated_At', 'MCP_Rs_MWh', 'Record_Hour', 'Ratio', 'Session']
+ROWS = [
+    (date(2024, 3, 1), datetime(2024, 3, 1, 0, 15), Decimal('4523.1700'), 1, 0.5, 'DAM'),
+    (date(2024, 3, 2), None, None, 2, None, None),
+    (date(2024, 3, 3), datetime(2024, 3, 3, 23, 45, 0, 500), Decimal('-0.0100'), 3, 1.25, 'RTM'),
+]
+
+
+def spilling_cache(tmp_path, **kwargs):
+    return ResultCache(spill_threshold_bytes=0, spill_dir=str(tmp_path), **kwargs)
+
+
+def test_spilled_rows_keep_their_types(tmp_path):
+    cache = spilling_cache(tmp_path)
+    cache.put('q1', COLUMNS, ROWS)
+    entry = cache.get('q1')
+    assert entry['spill_path']
+    assert entry['rows'] == ROWS
+    assert [type(v) for v in entry['rows'][0]] == [type(v) for v in ROWS[0]]
+
+
+def test_spilled_rows_match_in_memory_rows(tmp_path):
+    spilled, in_memory = spilling_cache(tmp_path), ResultCache()
+    for cache in (spilled, in_memory):
+        cache.put('q1', COLUMNS, ROWS)
+    assert spilled.get('q1')['rows'] == in_memory.get('q1')['rows']
+
+
+def test_spilled_column_arrays_keep_decimals(tmp_path):
+    cache = spilling_cache(tmp_path)
+    arrays = to_column_arrays(ROWS, len(COLUMNS))
+    cache.put('q1', COLUMNS, None, column_arrays=arrays)
+    loaded = cache.get('q1')['column_arrays']
+    assert loaded[2].tolist() == [Decimal('4523.1700'), None, Decimal('-0.0100')]
+    assert loaded[0].dtype == np.dtype('datetime64[D]')
+    assert loaded[5].tolist() == ['DAM', None, 'RTM']
+
+
+def test_files_without_kinds_load_as_text(tmp_path):
+    path = str(tmp_path / 'old.npz')
+    save_results_npz(path, COLUMNS, ROWS)
+    with np.load(path) as npz:
+        legacy = {name: npz[name] for name in npz.files if not name.startswith('kind_')}
+    np.savez_compressed(path, **legacy)
+    _, rows, _ = load_results_npz(path)
+    assert rows[0][2] == '4523.1700' and rows[1][2] is None
+
+
+def test_eviction_and_expiry_delete_spill_files(tmp_path):
+    cache = spilling_cache(tmp_path, max_entries=1, ttl_seconds=60)
+    cache.put('q1', COLUMNS, ROWS)
+    cache.put('q2', COLUMNS, ROWS)
+    assert os.listdir(tmp_path) == ['q2.npz']
+    cache._entries['q2']['created_at'] -= 120
+    assert cache.get('q2') is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_close_deletes_spill_files(tmp_path):
+    cache = spilling_cache(tmp_path)
+    cache.put('q1', COLUMNS, ROWS)
+    cache.close()
+    assert os.listdir(tmp_path) == [] and cache.get('q1') is None
+
+
+def test_orphaned_spill_files_older_than_ttl_are_removed(tmp_path):
+    old, recent = tmp_path / 'old.npz', tmp_path / 'recent.npz'
+    for path in (old, recent):
+        path.write_bytes(b'')
+    past = time.time() - 7200
+    os.utime(old, (past, past))
+    spilling_cache(tmp_path, ttl_seconds=3600)
+    assert os.listdir(tmp_path) == ['recent.npz']
@@ -0,0 +1,180 @@
+import time
+
+import pytest
+
+from rollups import RollupManager, SourceRollup
+
+T = 'energy_bids_dam'
+MEASURE_TYPES = {'MCV_MW': ('decimal', 12, 2), 'MCP_Rs_MWh': ('decimal', 12, 2)}
+
+
+def make_manager(ready=('daily', 'hourly', 'monthly'), refreshed_at=None, **kwargs):
+    manager = RollupManager(None, [T], **kwargs)
+    info = SourceRollup(T, ['MCV_MW'], ['MCP_Rs_MWh'], True, 'date', MEASURE_TYPES)
+    info.tables = {grain: f"{T}_{grain}" for grain in ('daily', 'hourly', 'monthly')}
+    info.ready = set(ready)
+    info.refreshed_at = time.time() if refreshed_at is None else refreshed_at
+    manager._sources[T] = info
+    return manager
+
+
+ROUTED_CASES = [
+    # (input, expected output, grain)
+    (f"SELECT Record_Date, SUM(MCV_MW) AS MCV FROM {T} GROUP BY Record_Date;",
+     f"SELECT Record_Date, SUM(MCV_MW_Sum) AS MCV FROM {T}_daily GROUP BY Record_Date;",
+     'daily'),
+    (f"SELECT Record_Hour, MAX(MCP_Rs_MWh) AS Peak, COUNT(*) AS Blocks FROM {T} GROUP BY Record_Hour",
+     f"SELECT Record_Hour, MAX(MCP_Rs_MWh_Max) AS Peak, SUM(Block_Count) AS Blocks FROM {T}_hourly GROUP BY Record_Hour;",
+     'hourly'),
+    (f"SELECT YEAR(Record_Date) AS Y, MONTH(Record_Date) AS M, MIN(MCP_Rs_MWh) AS Low FROM {T} "
+     f"GROUP BY YEAR(Record_Date), MONTH(Record_Date)",
+     f"SELECT YEAR(Record_Date) AS Y, MONTH(Record_Date) AS M, MIN(MCP_Rs_MWh_Min) AS Low FROM {T}_monthly "
+     f"GROUP BY YEAR(Record_Date), MONTH(Record_Date);",
+     'monthly'),
+    (f"SELECT SUM(MCV_MW) AS MCV FROM {T} WHERE (Record_Date >= '2024-01-01' AND Record_Date < '2025-01-01');",
+     f"SELECT SUM(MCV_MW_Sum) AS MCV FROM {T}_monthly WHERE (Record_Date >= '2024-01-01' AND Record_Date < '2025-01-01');",
+     'monthly'),
+    (f"SELECT SUM(MCV_MW) AS MCV FROM {T} WHERE Record_Date >= '2024-03-15'",
+     f"SELECT SUM(MCV_MW_Sum) AS MCV FROM {T}_daily WHERE Record_Date >= '2024-03-15';",
+     'daily'),
+    # AVG is answered as SUM(*_Sum) / SUM(*_Count), never as an average of averages
+    (f"SELECT Record_Date, AVG(MCP_Rs_MWh) AS Avg_MCP FROM {T} GROUP BY Record_Date",
+     f"SELECT Record_Date, (SUM(MCP_Rs_MWh_Sum) / NULLIF(SUM(MCP_Rs_MWh_Count), 0)) AS Avg_MCP FROM {T}_daily "
+     f"GROUP BY Record_Date;",
+     'daily'),
+    # Qualified by the table name: the aggregate drops the qualifier, the rest follows the table
+    (f"SELECT {T}.Record_Date, SUM({T}.MCV_MW) AS MCV FROM {T} GROUP BY {T}.Record_Date",
+     f"SELECT {T}_daily.Record_Date, SUM(MCV_MW_Sum) AS MCV FROM {T}_daily GROUP BY {T}_daily.Record_Date;",
+     'daily'),
+    (f"SELECT `{T}`.Record_Date, COUNT(`{T}`.MCV_MW) AS N FROM `{T}` GROUP BY `{T}`.Record_Date",
+     f"SELECT {T}_daily.Record_Date, SUM(MCV_MW_Count) AS N FROM `{T}_daily` GROUP BY {T}_daily.Record_Date;",
+     'daily'),
+    # Aliased: the alias now names the rollup table
+    (f"SELECT d.Record_Date, SUM(d.MCV_MW) AS MCV, AVG(d.MCP_Rs_MWh) AS Avg_MCP FROM {T} AS d GROUP BY d.Record_Date",
+     f"SELECT d.Record_Date, SUM(MCV_MW_Sum) AS MCV, (SUM(MCP_Rs_MWh_Sum) / NULLIF(SUM(MCP_Rs_MWh_Count), 0)) "
+     f"AS Avg_MCP FROM {T}_daily AS d GROUP BY d.Record_Date;",
+     'daily'),
+]
+
+# Month-start literals that are not a whole bound still need day-level rows
+NOT_MONTHLY_CASES = [
+    f"SELECT SUM(MCV_MW) AS MCV FROM {T} WHERE Record_Date >= '2024-03-01' - INTERVAL 1 DAY",
+    f"SELECT SUM(MCV_MW) AS MCV FROM {T} WHERE Record_Date < '2024-03-01' + INTERVAL 1 DAY;",
+    f"SELECT SUM(MCV_MW) AS MCV FROM {T} WHERE Record_Date >= '2024-03-02'",
+    f"SELECT SUM(MCV_MW) AS MCV FROM {T} WHERE Record_Date <= '2024-03-01'",
+]
+
+NOT_ROUTED_CASES = [
+    f"SELECT Record_Date, MCV_MW FROM {T} WHERE Record_Date = '2024-03-01'",  # no aggregate
+    f"SELECT Time_Block, SUM(MCV_MW) AS MCV FROM {T} GROUP BY Time_Block",  # finer than any rollup
+    f"SELECT SUM(MCV_MW * MCP_Rs_MWh) AS Value FROM {T}",  # aggregate over an expression
+    f"SELECT Record_Date, SUM(MCV_MW) AS MCV FROM {T} WHERE MCP_Rs_MWh > 5000 GROUP BY Record_Date",
+    f"SELECT COUNT(DISTINCT Record_Date) AS Days FROM {T}",
+    f"SELECT SUM(d.MCV_MW) AS MCV FROM {T} d JOIN energy_bids_rtm r ON d.Record_Date = r.Record_Date",
+    f"SELECT SUM(x.MCV_MW) AS MCV FROM {T} d",  # qualifier that isn't the table
+    "SELECT Record_Date, SUM(MCV_MW) AS MCV FROM energy_bids_rtm GROUP BY Record_Date",  # no rollups
+    f"SELECT Record_Date, SUM(MCV_MW) AS MCV FROM {T} GROUP BY Record_Date; DELETE FROM {T}",
+]
+
+
+@pytest.mark.parametrize('sql, expected, grain', ROUTED_CASES)
+def test_routes(sql, expected, grain):
+    manager = make_manager()
+    routed, route = manager.route(sql)
+    assert routed == expected
+    assert route == {'source': T, 'table': f"{T}_{grain}", 'grain': grain}
+
+
+@pytest.mark.parametrize('sql', NOT_MONTHLY_CASES)
+def test_non_aligned_bounds_use_daily(sql):
+    _, route = make_manager().route(sql)
+    assert route['grain'] == 'daily'
+
+
+@pytest.mark.parametrize('sql', NOT_MONTHLY_CASES)
+def test_non_aligned_bounds_need_daily(sql):
+    manager = make_manager(ready=('monthly',))
+    assert manager.route(sql) == (sql, None)
+
+
+@pytest.mark.parametrize('sql', NOT_ROUTED_CASES)
+def test_not_routed(sql):
+    manager = make_manager()
+    assert manager.route(sql) == (sql, None)
+    assert (manager.routed, manager.not_routed) == (0, 1)
+
+
+def test_monthly_falls_back_to_daily_when_not_ready():
+    sql = f"SELECT YEAR(Record_Date) AS Y, SUM(MCV_MW) AS MCV FROM {T} GROUP BY YEAR(Record_Date)"
+    _, route = make_manager(ready=('daily',)).route(sql)
+    assert route['grain'] == 'daily'
+
+
+@pytest.mark.parametrize('manager', [
+    make_manager(refreshed_at=time.time() - 3600, max_staleness=900),  # stale
+    make_manager(ready=()),                                              # never built
+    make_manager(route_queries=False),
+], ids=['stale', 'not_ready', 'disabled'])
+def test_fallback_leaves_sql_unchanged(manager):
+    sql = f"SELECT Record_Date, SUM(MCV_MW) AS MCV FROM {T} GROUP BY Record_Date"
+    assert manager.route(sql) == (sql, None)
+
+
+def test_planning_error_falls_back(monkeypatch):
+    manager = make_manager()
+    monkeypatch.setattr(manager, '_plan', lambda sql: 1 / 0)
+    sql = f"SELECT SUM(MCV_MW) AS MCV FROM {T}"
+    assert manager.route(sql) == (sql, None)
+    assert manager.not_routed == 1
+
+
+class FakeCursor:
+    def __init__(self, results=()):
+        self.results = list(results)
+        self.executed = []
+
+    def execute(self, sql, params=()):
+        self.executed.append(sql)
+
+    def fetchall(self):
+        return self.results.pop(0) if self.results else []
+
+    def close(self):
+        pass
+
+
+def test_measure_columns_keep_source_precision():
+    info = make_manager()._sources[T]
+    info.measure_types['MCP_Rs_MWh'] = ('double', 22, None)
+    cursor = FakeCursor()
+    RollupManager(None, [T])._create_table(cursor, info, 'daily', rebuild=False)
+    ddl = cursor.executed[0]
+    assert ("`MCV_MW_Sum` DECIMAL(22,2), `MCV_MW_Count` BIGINT, `MCV_MW_Min` DECIMAL(12,2), "
+            "`MCV_MW_Max` DECIMAL(12,2), `MCV_MU` DECIMAL(22,6)") in ddl
+    assert "`MCP_Rs_MWh_Sum` DOUBLE" in ddl and "`MCP_Rs_MWh_Avg` DOUBLE" in ddl
+    assert ddl.endswith("PRIMARY KEY (`Record_Date`))")
+
+
+def test_outdated_rollup_table_is_detected():
+    manager = RollupManager(None, [T])
+    info = make_manager()._sources[T]
+    # As INFORMATION_SCHEMA reports them, with integer display widths
+    current = [(name, 'int(11)' if sql_type == 'INT' else sql_type.lower())
+               for name, sql_type in info.column_definitions('daily')]
+    old = [(name, 'double' if sql_type.startswith('decimal') else sql_type) for name, sql_type in current]
+    assert not manager._table_outdated(FakeCursor([current]), info, 'daily')
+    assert manager._table_outdated(FakeCursor([old]), info, 'daily')
+    assert not manager._table_outdated(FakeCursor([[]]), info, 'daily')  # not created yet
+
+
+def test_refresh_failure_is_recorded_and_routing_continues():
+    manager = make_manager()
+
+    def broken_connection():
+        raise OSError('connection refused')
+
+    manager.connection_factory = broken_connection
+    manager.refresh()
+    assert manager._sources[T].error == 'connection refused'
+    _, route = manager.route(f"SELECT Record_Date, SUM(MCV_MW) AS MCV FROM {T} GROUP BY Record_Date")
+    assert route['grain'] == 'daily'
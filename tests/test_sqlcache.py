@@ -0,0 +1,111 @@
+from datetime import date
+
+import pytest
+
+import sqlcache
+from sqlcache import SQLCache, date_context_for, make_cache_key, normalize_query
+
+SCHEMA = "Table: energy_bids_dam\n  - Record_Date: date\n  - MCV_MW: decimal(12,2)"
+MODEL = 'sqlcoder'
+HOLIDAYS = "2024-03-25: Holi"
+TODAY = date(2024, 6, 15)
+
+
+def key(query, schema=SCHEMA, model=MODEL, holidays=HOLIDAYS, today=TODAY):
+    return make_cache_key(query, schema, model, holidays, today=today)
+
+
+@pytest.mark.parametrize('variant', [
+    "show total MCV for March 2024",
+    "Show total MCV for March 2024",
+    "SHOW TOTAL MCV FOR MARCH 2024",
+    "  show   total\tMCV\nfor March 2024  ",
+    "show total MCV for March 2024?",
+    "Show total MCV, for March 2024.",
+])
+def test_trivial_variants_share_a_key(variant):
+    assert key(variant) == key("show total MCV for March 2024")
+
+
+@pytest.mark.parametrize('query, normalized', [
+    ("What was the MCP on 15.03.2024?", "what was the mcp on 15.03.2024"),
+    ("Price at 10:30 on 2024/03/15", "price at 10:30 on 2024/03/15"),
+    ("real-time   market: volume", "real-time market volume"),
+])
+def test_normalize_keeps_dates_and_times(query, normalized):
+    assert normalize_query(query) == normalized
+
+
+@pytest.mark.parametrize('changed', [
+    dict(query="show total MCV for April 2024"),
+    dict(schema=SCHEMA + "\n  - MCP_Rs_MWh: decimal(12,2)"),
+    dict(model='llama3'),
+    dict(holidays="2024-03-25: Holi\n2024-04-11: Eid"),
+    dict(holidays=""),
+    dict(today=date(2025, 6, 15)),  # The year always participates
+])
+def test_anything_that_shapes_the_sql_changes_the_key(changed):
+    base = dict(query="show total MCV for March 2024")
+    assert key(**{**base, **changed}) != key(**base)
+
+
+@pytest.mark.parametrize('query, context', [
+    ("total MCV yesterday", '2024-06-15'),
+    ("MCV for the last 7 days", '2024-06-15'),
+    ("MCV this week", '2024-06-15'),
+    ("MCV in March", '2024'),
+    ("MCV on 2023-01-05", '2024'),
+    ("MCV for lastly", '2024'),  # whole words only
+])
+def test_date_context(query, context):
+    assert date_context_for(query, TODAY) == context
+
+
+def test_relative_queries_change_key_every_day():
+    query = "total MCV yesterday"
+    assert key(query) != key(query, today=date(2024, 6, 16))
+    assert key("MCV in March") == key("MCV in March", today=date(2024, 6, 16))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SQLCache(str(tmp_path / 'cache.sqlite3'), ttl_seconds=60, max_entries=2)
+
+
+def test_hit_for_a_rephrased_query(cache):
+    cache.put(key("Total MCV for March 2024"), "Total MCV for March 2024", "SELECT 1;", MODEL)
+    assert cache.get(key("total  mcv for march 2024?")) == "SELECT 1;"
+    assert cache.get(key("total mcv for march 2024", model='llama3')) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_ttl_expiry(cache, monkeypatch):
+    cache.put('k', 'q', 'SELECT 1;', MODEL)
+    now = sqlcache.time.time()
+    monkeypatch.setattr(sqlcache.time, 'time', lambda: now + 61)
+    assert cache.get('k') is None
+    assert cache.expired == 1 and cache.get_stats()['entries'] == 0
+
+
+def test_lru_eviction(cache, monkeypatch):
+    clock = iter(range(1000, 2000))
+    monkeypatch.setattr(sqlcache.time, 'time', lambda: next(clock))
+    cache.put('a', 'q', 'SELECT 1;', MODEL)
+    cache.put('b', 'q', 'SELECT 2;', MODEL)
+    assert cache.get('a') == 'SELECT 1;'  # b is now least recently used
+    cache.put('c', 'q', 'SELECT 3;', MODEL)
+    assert cache.get('b') is None
+    assert cache.get('a') == 'SELECT 1;' and cache.get('c') == 'SELECT 3;'
+    assert cache.evictions == 1
+
+
+def test_clear_invalidates_everything(cache):
+    cache.put('a', 'q', 'SELECT 1;', MODEL)
+    cache.clear()
+    assert cache.get('a') is None
+
+
+def test_entries_persist_across_instances(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    SQLCache(path).put('a', 'q', 'SELECT 1;', MODEL)
+    assert SQLCache(path).get('a') == 'SELECT 1;'
@@ -0,0 +1,99 @@
+import pytest
+from sqlrewrite import rewrite_sql, parse, SQLParseError
+
+T = 'energy_bids_dam'
+
+REWRITE_CASES = [
+    # (input, expected output, rules applied)
+    (f"SELECT MCV_MW FROM {T} WHERE DATE(Record_Date) = '2024-03-15'",
+     f"SELECT MCV_MW FROM {T} WHERE (Record_Date >= '2024-03-15' AND Record_Date < '2024-03-16')",
+     ['sargable_date']),
+    (f"SELECT MCV_MW FROM {T} WHERE DATE(Record_Date) = '2024-03-15';",
+     f"SELECT MCV_MW FROM {T} WHERE (Record_Date >= '2024-03-15' AND Record_Date < '2024-03-16');",
+     ['sargable_date']),
+    (f"SELECT MCV_MW FROM {T} WHERE YEAR(Record_Date) = 2024;",
+     f"SELECT MCV_MW FROM {T} WHERE (Record_Date >= '2024-01-01' AND Record_Date < '2025-01-01');",
+     ['sargable_year']),
+    (f"SELECT MCV_MW FROM {T} WHERE DATE(Record_Date) = CURDATE();",
+     f"SELECT MCV_MW FROM {T} WHERE (Record_Date >= CURDATE() AND Record_Date < CURDATE() + INTERVAL 1 DAY);",
+     ['sargable_date']),
+    (f"SELECT MCV_MW FROM {T} WHERE YEAR(Record_Date) = 2024 AND MONTH(Record_Date) = 3;",
+     f"SELECT MCV_MW FROM {T} WHERE (Record_Date >= '2024-03-01' AND Record_Date < '2024-04-01');",
+     ['sargable_year_month']),
+    (f"SELECT MCV_MW FROM {T} WHERE YEAR(Record_Date) = 2024 AND MONTH(Record_Date) = 12 ;\n",
+     f"SELECT MCV_MW FROM {T} WHERE (Record_Date >= '2024-12-01' AND Record_Date < '2025-01-01') ;",
+     ['sargable_year_month']),
+    (f"SELECT MCV_MW FROM {T} WHERE DATE(Record_Date) BETWEEN '2024-01-01' AND '2024-01-31' ORDER BY Record_Date;",
+     f"SELECT MCV_MW FROM {T} WHERE (Record_Date >= '2024-01-01' AND Record_Date < '2024-02-01') ORDER BY Record_Date;",
+     ['sargable_date']),
+    (f"SELECT MCV_MW FROM {T} WHERE DATE(Record_Date) >= '2024-01-01' AND Segment = 'DAM';",
+     f"SELECT MCV_MW FROM {T} WHERE Record_Date >= '2024-01-01' AND Segment = 'DAM';",
+     ['sargable_date']),
+    (f"SELECT MCV_MW FROM {T} WHERE DATE(Record_Date) <= '2024-01-31';",
+     f"SELECT MCV_MW FROM {T} WHERE Record_Date < '2024-02-01';",
+     ['sargable_date']),
+    (f"SELECT * FROM (SELECT MCV_MW FROM {T} WHERE YEAR(Record_Date) = 2023) t;",
+     f"SELECT MCV_MW FROM {T} WHERE (Record_Date >= '2023-01-01' AND Record_Date < '2024-01-01');",
+     ['unwrap_subquery', 'sargable_year']),
+    (f"SELECT MCV_MW FROM {T} WHERE Record_Date IN (SELECT DISTINCT Record_Date FROM energy_bids_rtm);",
+     f"SELECT MCV_MW FROM {T} WHERE Record_Date IN (SELECT Record_Date FROM energy_bids_rtm);",
+     ['redundant_distinct']),
+    (f"SELECT t.MCV_MW FROM (SELECT * FROM {T}) t WHERE t.MCV_MW > 0;",
+     f"SELECT t.MCV_MW FROM {T} t WHERE t.MCV_MW > 0;",
+     ['inline_derived_table']),
+]
+
+UNCHANGED_CASES = [
+    f"SELECT MCV_MW FROM {T} WHERE Record_Date >= '2024-01-01';",
+    f"SELECT MCV_MW FROM {T} WHERE DATE(Record_Date) = '2024-01-01' + 1;",  # comparison continues
+    f"SELECT MCV_MW FROM {T} WHERE YEAR(Record_Date) + 1 = 2025;",  # part of a larger expression
+    f"SELECT MCV_MW FROM {T} WHERE DATE(Other_Date) = '2024-01-01';",  # not a configured date column
+    f"SELECT MCV_MW FROM {T} WHERE MONTH(Record_Date) = 3;",  # no single range
+    f"SELECT 'DATE(Record_Date) = ''2024-01-01''' AS s FROM {T};",
+]
+
+
+@pytest.mark.parametrize('sql, expected, rules', REWRITE_CASES)
+def test_rewrites(sql, expected, rules):
+    rewritten, rewrites = rewrite_sql(sql)
+    assert rewritten == expected
+    assert [r['rule'] for r in rewrites] == rules
+
+
+@pytest.mark.parametrize('sql', UNCHANGED_CASES)
+def test_left_unchanged(sql):
+    assert rewrite_sql(sql) == (sql, [])
+
+
+@pytest.mark.parametrize('sql, expected', [
+    (f"SELECT MCV_MW FROM {T};", f"SELECT MCV_MW FROM {T} LIMIT 100;"),
+    (f"SELECT MCV_MW FROM {T}", f"SELECT MCV_MW FROM {T} LIMIT 100"),
+    (f"SELECT MCV_MW FROM {T} LIMIT 5;", f"SELECT MCV_MW FROM {T} LIMIT 5;"),
+    (f"SELECT SUM(MCV_MW) FROM {T};", f"SELECT SUM(MCV_MW) FROM {T};"),
+    (f"SELECT Record_Date, SUM(MCV_MW) FROM {T} GROUP BY Record_Date;",
+     f"SELECT Record_Date, SUM(MCV_MW) FROM {T} GROUP BY Record_Date;"),
+    (f"SELECT MCV_MW, SUM(MCV_MW) OVER () FROM {T};", f"SELECT MCV_MW, SUM(MCV_MW) OVER () FROM {T} LIMIT 100;"),
+])
+def test_default_limit(sql, expected):
+    assert rewrite_sql(sql, default_limit=100)[0] == expected
+
+
+def test_reuses_parse_tree():
+    sql = f"SELECT MCV_MW FROM {T} WHERE YEAR(Record_Date) = 2024;"
+    assert rewrite_sql(sql, tree=parse(sql)) == rewrite_sql(sql)
+
+
+@pytest.mark.parametrize('sql', [
+    "SELECT a FROM t WHERE (b = 1",
+    "SELECT a FROM t WHERE b = 1)",
+    "SELECT a FROM t WHERE b = 'unterminated",
+])
+def test_unparseable_sql_is_returned_unchanged(sql):
+    assert rewrite_sql(sql) == (sql, [])
+
+
+def test_parse_round_trips():
+    sql = "SELECT `a`, SUM(b) /* c */ FROM t WHERE x IN (SELECT y FROM u) -- tail\n;"
+    assert parse(sql).sql() == sql
+    with pytest.raises(SQLParseError):
+        parse("SELECT (")
@@ -0,0 +1,114 @@
+import pytest
+
+from sqlrewrite import parse
+from sqlvalidate import (BENCHMARK_QUERIES, BENCHMARK_SCHEMA, SQLValidationError, fingerprint, normalize_sql,
+                         schema_tables, validate_sql)
+
+SCHEMA = """
+Table: energy_bids_dam
+  - Record_Date: date
+  - Time_Block: varchar(20)
+  - MCP_Rs_MWh: decimal(12,2)
+
+Table: `energy_bids_rtm`
+  - `Record_Date`: date
+  - `MCV_MW`: decimal(12,2)
+"""
+TABLES = schema_tables(SCHEMA)
+
+ACCEPTED = [
+    ("SELECT Record_Date, MCP_Rs_MWh FROM energy_bids_dam WHERE Record_Date = '2024-01-01';",
+     {'energy_bids_dam'}),
+    ("WITH daily AS (SELECT Record_Date, MAX(MCP_Rs_MWh) AS peak FROM energy_bids_dam GROUP BY Record_Date) "
+     "SELECT Record_Date, peak FROM daily ORDER BY peak DESC",
+     {'energy_bids_dam'}),
+    ("WITH RECURSIVE n (i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 24) SELECT i FROM n",
+     set()),
+    ("SELECT t.Record_Date, t.total FROM (SELECT Record_Date, SUM(MCV_MW) AS total FROM energy_bids_rtm "
+     "GROUP BY Record_Date) AS t WHERE t.total > 100",
+     {'energy_bids_rtm'}),
+    ("SELECT d.Record_Date, d.MCP_Rs_MWh, r.MCV_MW FROM energy_bids_dam d JOIN energy_bids_rtm r USING (Record_Date)",
+     {'energy_bids_dam', 'energy_bids_rtm'}),
+    ("SELECT Record_Date, RANK() OVER w AS r FROM energy_bids_dam WINDOW w AS (ORDER BY MCP_Rs_MWh DESC)",
+     {'energy_bids_dam'}),
+    ("SELECT Record_Date FROM energy_bids_dam UNION SELECT Record_Date FROM energy_bids_rtm",
+     {'energy_bids_dam', 'energy_bids_rtm'}),
+    ("SELECT MCP_Rs_MWh FROM energy_bids_dam FORCE INDEX (idx_date) WHERE Record_Date > '2024-01-01'",
+     {'energy_bids_dam'}),
+    ("SELECT Record_Date FROM energy_bids_dam WHERE MCP_Rs_MWh > (SELECT AVG(MCP_Rs_MWh) FROM energy_bids_dam)",
+     {'energy_bids_dam'}),
+]
+
+REJECTED = [
+    ("DELETE FROM energy_bids_dam", 'not_select'),
+    ("UPDATE energy_bids_dam SET MCP_Rs_MWh = 0", 'not_select'),
+    ("WITH a AS (SELECT 1) DELETE FROM energy_bids_dam", 'not_select'),
+    ("SELECT Record_Date FROM energy_bids_dam; DROP TABLE energy_bids_dam", 'multiple_statements'),
+    ("SELECT 1; SELECT 2", 'multiple_statements'),
+    ("SELECT Record_Date FROM energy_bids_dam INTO OUTFILE '/tmp/x.csv'", 'select_into'),
+    ("SELECT Record_Date INTO @d FROM energy_bids_dam", 'select_into'),
+    ("SELECT Record_Date FROM energy_bids_dam FOR UPDATE", 'locking_read'),
+    ("SELECT Record_Date FROM energy_bids_dam LOCK IN SHARE MODE", 'locking_read'),
+    ("SELECT 1;", 'missing_from'),
+    ("SELECT (Record_Date FROM energy_bids_dam", 'parse_error'),
+    ("", 'not_select'),
+]
+
+UNKNOWN = [
+    ("SELECT Foo FROM energy_bids_dam", set(), {'Foo'}),
+    ("SELECT x.Record_Date FROM energy_bids_dam d", set(), {'x.Record_Date'}),
+    ("SELECT MCV_MW FROM energy_bids_dam", set(), {'MCV_MW'}),
+    ("SELECT Record_Date FROM nosuch", {'nosuch'}, set()),
+]
+
+
+def test_schema_tables():
+    assert TABLES == {
+        'energy_bids_dam': frozenset({'record_date', 'time_block', 'mcp_rs_mwh'}),
+        'energy_bids_rtm': frozenset({'record_date', 'mcv_mw'}),
+    }
+
+
+@pytest.mark.parametrize('sql, tables', ACCEPTED)
+def test_accepted(sql, tables):
+    result = validate_sql(sql, TABLES)
+    assert result.tables == tables
+    assert not result.unknown_tables
+    assert not result.unknown_columns
+
+
+@pytest.mark.parametrize('sql, reason', REJECTED)
+def test_rejected(sql, reason):
+    with pytest.raises(SQLValidationError) as excinfo:
+        validate_sql(sql, TABLES)
+    assert excinfo.value.reason == reason
+
+
+@pytest.mark.parametrize('sql, unknown_tables, unknown_columns', UNKNOWN)
+def test_unknown_references_are_reported(sql, unknown_tables, unknown_columns):
+    result = validate_sql(sql, TABLES)
+    assert result.unknown_tables == unknown_tables
+    assert result.unknown_columns == unknown_columns
+
+
+@pytest.mark.parametrize('sql', BENCHMARK_QUERIES)
+def test_benchmark_queries_validate(sql):
+    result = validate_sql(sql, schema_tables(BENCHMARK_SCHEMA))
+    assert not result.unknown_tables and not result.unknown_columns
+
+
+def test_tree_is_reused():
+    sql = "SELECT Record_Date FROM energy_bids_dam"
+    tree = parse(sql)
+    assert validate_sql(sql, TABLES, tree=tree).tree is tree
+
+
+def test_normalize_and_fingerprint():
+    a = parse("select  record_date, COUNT(*) from energy_bids_dam -- daily\nwhere MCP_Rs_MWh > 5000;")
+    b = parse("SELECT Record_Date, count( * ) FROM energy_bids_dam WHERE mcp_rs_mwh > 7500")
+    c = parse("SELECT Record_Date FROM energy_bids_dam WHERE MCP_Rs_MWh > 5000")
+    assert normalize_sql(a) == "SELECT RECORD_DATE, COUNT(*) FROM ENERGY_BIDS_DAM WHERE MCP_RS_MWH > 5000"
+    assert normalize_sql(a, literals=False) == normalize_sql(b, literals=False)
+    assert fingerprint(a) == fingerprint(b) != fingerprint(c)
+    assert validate_sql("SELECT Record_Date FROM energy_bids_dam WHERE MCP_Rs_MWh > 5000", TABLES).fingerprint \
+        == fingerprint(c)
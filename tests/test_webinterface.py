@@ -0,0 +1,144 @@
+import csv
+import gzip
+import io
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+from columnar import to_column_arrays
+
+
+@pytest.fixture
+def client(webapp):
+    return webapp.app.test_client()
+
+
+def test_query_cancel_is_scoped_to_the_calling_client(webapp, client, monkeypatch):
+    seen = {}
+
+    def fake_pipeline(natural_query, cancel_token=None, **kwargs):
+        # Another client cancels "r1" while this request runs
+        client.post('/query/cancel', json={'request_id': 'r1'}, environ_base={'REMOTE_ADDR': '10.0.0.2'})
+        seen['cancelled'] = webapp.query_canceller.is_cancelled(cancel_token)
+        return {'natural_query': natural_query}
+
+    monkeypatch.setattr(webapp, 'process_natural_query', fake_pipeline)
+    response = client.post('/query', json={'query': 'q', 'request_id': 'r1'}, environ_base={'REMOTE_ADDR': '10.0.0.1'})
+    assert response.status_code == 200
+    assert seen['cancelled'] is False
+    webapp.query_canceller.release('request:10.0.0.2:r1')
+
+
+def test_cancelled_request_id_can_be_reused(webapp, client, monkeypatch):
+    seen = []
+
+    def fake_pipeline(natural_query, cancel_token=None, **kwargs):
+        seen.append(webapp.query_canceller.is_cancelled(cancel_token))
+        return {}
+
+    monkeypatch.setattr(webapp, 'process_natural_query', fake_pipeline)
+    environ = {'REMOTE_ADDR': '10.0.0.3'}
+    assert client.post('/query/cancel', json={'request_id': 'r2'}, environ_base=environ).json['cancelled']
+    client.post('/query', json={'query': 'q', 'request_id': 'r2'}, environ_base=environ)
+    client.post('/query', json={'query': 'q', 'request_id': 'r2'}, environ_base=environ)
+    assert seen == [True, False]  # The cancel applies to the next call only
+
+
+def test_db_execute_query_releases_its_token(webapp):
+    webapp.query_canceller.cancel('job-x')
+    assert webapp.db_execute_query('SELECT 1 FROM t', cancel_token='job-x')['cancelled']
+    assert not webapp.query_canceller.is_cancelled('job-x')
+
+
+FENCE = '```'
+
+STATEMENT_END_CASES = [
+    # (streamed text, text up to the end of the statement, or None if not complete yet)
+    ("SELECT a FROM t;", "SELECT a FROM t;"),
+    ("SELECT a FROM t; -- done", "SELECT a FROM t;"),
+    ("  select a\nFROM t\nWHERE b = 1;\n\nThis query", "  select a\nFROM t\nWHERE b = 1;"),
+    ("WITH c AS (SELECT 1) SELECT * FROM c;", "WITH c AS (SELECT 1) SELECT * FROM c;"),
+    (f"{FENCE}sql\nSELECT a FROM t\n{FENCE}\nExplanation", f"{FENCE}sql\nSELECT a FROM t\n"),
+    (f"{FENCE}sql\nSELECT a FROM t;\n{FENCE}", f"{FENCE}sql\nSELECT a FROM t;"),
+    (f"Here is a SELECT query:\n{FENCE}sql\nSELECT a FROM t\n{FENCE}", f"Here is a SELECT query:\n{FENCE}sql\nSELECT a FROM t\n"),
+    (f"Run this SELECT; it is fast.\n{FENCE}sql\nSELECT a FROM t;", f"Run this SELECT; it is fast.\n{FENCE}sql\nSELECT a FROM t;"),
+    ("SELECT 'a;b' AS s FROM t;", "SELECT 'a;b' AS s FROM t;"),
+    ("SELECT \"x;\" AS s, `odd;name` FROM t;", "SELECT \"x;\" AS s, `odd;name` FROM t;"),
+    ("SELECT 'it''s; fine' FROM t;", "SELECT 'it''s; fine' FROM t;"),
+    ("SELECT 'it\\'s; fine' FROM t;", "SELECT 'it\\'s; fine' FROM t;"),
+    (f"SELECT '{FENCE}' FROM t;", f"SELECT '{FENCE}' FROM t;"),
+    ("SELECT a -- don't; stop\nFROM t;", "SELECT a -- don't; stop\nFROM t;"),
+    ("SELECT a /* ; */ FROM t;", "SELECT a /* ; */ FROM t;"),
+    # Not complete yet
+    ("SELECT a FROM t WHERE b = 'x;", None),
+    ("Here is a SELECT query:\n", None),
+    (f"Here is a SELECT query: {FENCE}sq", None),
+    (f"Here is a SELECT query:\n{FENCE}sql\nSELECT a", None),
+    ("The query selects rows", None),
+]
+
+
+@pytest.mark.parametrize('text, expected', STATEMENT_END_CASES)
+def test_sql_statement_end(webapp, text, expected):
+    end = webapp.sql_statement_end(text)
+    assert (text[:end] if end != -1 else None) == expected
+
+
+@pytest.mark.parametrize('text, expected', [
+    (f"Here is a SELECT query:\n{FENCE}sql\nSELECT a FROM t\n", "SELECT a FROM t\n;"),
+    (f"{FENCE}sql\nSELECT a\nFROM t;", "SELECT a\nFROM t;"),
+    ("SELECT a FROM t; SELECT b FROM u;", "SELECT a FROM t;"),
+])
+def test_clean_sql_skips_prose(webapp, text, expected):
+    assert webapp.clean_sql(text) == expected
+
+
+EXPORT_COLUMNS = ['Record_Date', 'Updated_At', 'MCP_Rs_MWh', 'Record_Hour', 'Session']
+EXPORT_ROWS = [
+    (date(2024, 3, 1), datetime(2024, 3, 1, 0, 15), Decimal('4523.1700'), 1, 'DAM, "north"'),
+    (date(2024, 3, 2), None, None, 2, None),
+    (date(2024, 3, 3), datetime(2024, 3, 3, 23, 45, 0, 500), Decimal('-0.0100'), None, 'RTM\nlate'),
+]
+
+
+def expected_csv(columns, rows):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(columns)
+    writer.writerows(rows)
+    return output.getvalue().encode('utf-8')
+
+
+@pytest.fixture
+def cached_export(webapp, monkeypatch):
+    monkeypatch.setitem(webapp.EXPORT_CONFIG, 'chunk_rows', 2)  # Several chunks for three rows
+    yield webapp.query_results_cache
+    webapp.query_results_cache.close()
+
+
+@pytest.mark.parametrize('columnar', [False, True])
+@pytest.mark.parametrize('compressed', [False, True])
+def test_export_csv_matches_csv_writer(webapp, client, cached_export, columnar, compressed):
+    if columnar:
+        arrays = to_column_arrays(EXPORT_ROWS, len(EXPORT_COLUMNS))
+        kinds = ['date', 'datetime', 'decimal', 'int', 'object']
+        cached_export.put('export1', EXPORT_COLUMNS, None, column_arrays=arrays, column_kinds=kinds)
+    else:
+        cached_export.put('export1', EXPORT_COLUMNS, list(EXPORT_ROWS))
+
+    response = client.get('/export-csv/export1' + ('?gzip=1' if compressed else ''))
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    body = response.get_data()
+    if compressed:
+        assert response.headers['Content-Encoding'] == 'gzip'
+        body = gzip.decompress(body)
+    else:
+        assert 'Content-Encoding' not in response.headers
+    assert body == expected_csv(EXPORT_COLUMNS, EXPORT_ROWS)
+
+
+def test_export_csv_unknown_id(client):
+    response = client.get('/export-csv/missing')
+    assert response.status_code == 404
@@ -0,0 +1,119 @@
+import json
+import os
+import queue
+import threading
+import time
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class Trace:
+    """Per-request list of timed stages measured with a monotonic clock.
+
+    Usage:
+        trace = Trace()
+        with trace.span('db_execute_query') as span:
+            results = db_execute_query(sql)
+            span['rows'] = results.get('row_count', 0)
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.stages = []
+
+    @contextmanager
+    def span(self, stage, **attributes):
+        record = dict(attributes, stage=stage)
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record['error'] = type(e).__name__
+            raise
+        finally:
+            record['duration_ms'] = round((time.perf_counter() - start) * 1000, 3)
+            self.stages.append(record)
+
+    @property
+    def total_ms(self):
+        return round((time.perf_counter() - self._start) * 1000, 3)
+
+    def to_dict(self):
+        return {'total_ms': self.total_ms, 'stages': list(self.stages)}
+
+
+class BufferedJsonlWriter:
+    """Appends JSON lines from a background thread, batching writes to keep file I/O off the request path.
+
+    With max_bytes, a file that has reached that size is rotated before the next write: path
+    becomes path.1, path.1 becomes path.2 and so on, keeping backup_count old files.
+    """
+
+    def __init__(self, path, flush_interval=1.0, batch_size=100, max_queue=10000, max_bytes=None, backup_count=1):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop_event = threading.Event()
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name='jsonl-writer', daemon=True)
+        self._thread.start()
+
+    def write(self, entry):
+        """Queue an entry; never blocks the caller (entries are dropped if the queue is full)"""
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _rotate(self):
+        if not self.max_bytes or not os.path.exists(self.path) or os.path.getsize(self.path) < self.max_bytes:
+            return
+        if self.backup_count < 1:
+            os.remove(self.path)
+            return
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        try:
+            self._rotate()
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(entry, default=str) + '\n' for entry in batch))
+        except Exception as e:
+            logger.error(f"Error writing {self.path}: {e}")
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            self._flush([first] + self._drain())
+        # Write whatever is left on shutdown
+        batch = self._drain()
+        while batch:
+            self._flush(batch)
+            batch = self._drain()
+
+    def close(self, timeout=5.0):
+        self._stop_event.set()
+        self._thread.join(timeout)
@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, make_response, send_file
+from flask import Flask, Response, request, jsonify, make_response, send_file
 import mysql.connector
 import requests
 import re
@@ -10,22 +10,42 @@ import tempfile
 import os
 import json
 import base64
+import uuid
+import zlib
+import itertools
+import random
+import threading
 from datetime import datetime
 import matplotlib
 matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from matplotlib.figure import Figure
 import pandas as pd
 import numpy as np
 import holidays
 from datetime import datetime, timedelta, date
 import calendar
 import re
-from holidaymoment import infer_holiday_context
+from holidaymoment import build_holiday_context, estimate_tokens
+from dbpool import ConnectionPool, PoolTimeoutError
+from sqlcache import SQLCache, make_cache_key
+from resultcache import ResultCache
+from jobqueue import JobQueue
+from llmtelemetry import extract_ollama_timings, estimate_stream_timings
+from tracing import Trace, BufferedJsonlWriter
+from chartrender import ChartRenderer, chart_data
+from graphcache import GraphCache, graph_fingerprint
+from rollups import RollupManager
+from sqlrewrite import rewrite_sql
+from sqlvalidate import validate_sql, schema_tables, SQLValidationError
+from indexadvisor import IndexAdvisor, explain as explain_plan, existing_indexes
+from guardrails import (add_execution_time_hint, is_select_statement, FetchBudget, QueryCanceller, QUERY_TIMEOUT_ERRNO,
+                        QUERY_INTERRUPTED_ERRNO)
+from columnar import (to_column_arrays, is_numeric_array, column_kinds, fetch_column_arrays, iter_rows,
+                      column_to_json)
+from metrics import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE as METRICS_CONTENT_TYPE
 from flask_cors import CORS
 import psutil
 import time
+import atexit
 from datetime import datetime
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -52,7 +72,10 @@ LLM_CONFIG = {
     'endpoint': 'http://127.0.0.1:11434',  # Default Ollama port
     'model_name': 'mathstral-7b',  # Replace with your Ollama model name (e.g., 'llama2', 'codellama', 'mistral')
     'temperature': 0.1,
-    'max_tokens': 5000  # Note: Ollama calls this 'num_predict'
+    'max_tokens': 5000,  # Note: Ollama calls this 'num_predict'
+    'stream': True,  # Stream tokens and stop generation as soon as a complete SELECT statement arrives
+    'keep_alive': '30m',  # How long Ollama keeps the model loaded after a request
+    'warmup_on_startup': True  # Load the model and cache the static prompt prefix when the app starts
 }
 
 # Table keywords for dynamic schema selection
@@ -88,23 +111,224 @@ COLUMN_DESCRIPTIONS = {
     "Instrument_Name": "Model name of the instrument"
 }
 
+POOL_CONFIG = {
+    'pool_size': 5,             # Max concurrent MySQL connections held by the app
+    'checkout_timeout': 10,     # Seconds to wait for a free connection before failing
+    'health_check_after': 30    # Ping idle connections unused for this many seconds
+}
+
+SQL_CACHE_CONFIG = {
+    'enabled': True,
+    'path': 'sql_cache.sqlite3',     # SQLite file holding natural query -> SQL mappings
+    'ttl_seconds': 7 * 24 * 3600,    # Regenerate SQL older than a week
+    'max_entries': 5000              # Least recently used entries are evicted beyond this
+}
+
+RESULT_CACHE_CONFIG = {
+    'max_entries': 100,                               # Result sets kept for CSV export
+    'max_bytes': 256 * 1024 * 1024,                   # Memory budget for in-memory result sets
+    'ttl_seconds': 3600,                              # CSV ids expire after an hour
+    'spill_threshold_bytes': 8 * 1024 * 1024,         # Larger result sets are written to disk
+    'spill_dir': os.path.join(tempfile.gettempdir(), 'query_results_cache'),  # None disables spilling
+    'max_spill_bytes': 2 * 1024 * 1024 * 1024,        # Disk budget for spilled result sets
+    'max_cached_rows': 200000,                        # Bigger results keep only their SQL and are re-run on export
+    'max_sql_only': 1000                              # SQL kept for results that are no longer held
+}
+
+RESULT_CONFIG = {
+    'default_format': 'rows',   # 'columnar' fetches results in batches into typed NumPy columns instead of tuples
+    'fetch_batch_rows': 5000    # fetchmany batch size for columnar results
+}
+
+EXPORT_CONFIG = {
+    'chunk_rows': 5000  # Rows per streamed CSV chunk / cursor fetchmany batch
+}
+
+JOB_CONFIG = {
+    'max_workers': 4,            # Concurrent pipeline runs for async /query jobs
+    'retention_seconds': 3600,   # Finished jobs can be polled for this long
+    'max_jobs': 1000,
+    'sse_heartbeat_seconds': 15  # Keep-alive comment interval on the events stream
+}
+
+GRAPH_CONFIG = {
+    'max_workers': 2,        # Concurrent chart renders
+    'use_processes': False,  # Render in worker processes instead of threads (sidesteps the GIL for big charts)
+    'timeout': 60,           # Seconds to wait for a render before giving up on the graph
+    'width_inches': 12,
+    'height_inches': 8,
+    'dpi': 150,              # PNG output resolution
+    'max_points': 2000       # Series longer than this are min/max downsampled before plotting; None disables
+}
+
+GRAPH_CACHE_CONFIG = {
+    'max_entries': 500,               # Rendered PNGs kept, keyed by a hash of the plotted data and config
+    'max_bytes': 64 * 1024 * 1024,
+    'max_age_seconds': 24 * 3600      # Cache-Control max-age for /graphs/<graph_id> (content-addressed)
+}
+
+CHART_DATA_CONFIG = {
+    'default_points': 1000,  # LTTB target for /query graph_mode='data' when chart_points isn't given
+    'max_points': 10000      # Upper bound on a client-requested chart_points
+}
+
+SQL_VALIDATION_CONFIG = {
+    'reject_unknown_tables': True,   # Tables missing from the full schema
+    'reject_unknown_columns': True   # Columns no table, derived table or SELECT alias in scope provides
+}
+
+SQL_REWRITE_CONFIG = {
+    'enabled': True,
+    'date_columns': ('Record_Date',),  # DATE()/YEAR()/MONTH() predicates on these become index-friendly ranges
+    'default_limit': 10000             # Appended to non-aggregated SELECTs without a LIMIT; None disables
+}
+
+ROLLUP_CONFIG = {
+    'enabled': True,
+    'grains': ('daily', 'hourly', 'monthly'),  # Summary tables <table>_daily/_hourly/_monthly per energy_bids_* table
+    'refresh_interval': 300,     # Seconds between incremental refreshes (new Record_Dates only)
+    'max_staleness': 900,        # Stop routing to a rollup whose last successful refresh is older than this
+    'route_queries': True,       # Rewrite eligible raw-table aggregates to the matching rollup
+    'expose_in_schema': True     # List ready rollup tables in the schema sent to the LLM
+}
+
+INDEX_ADVISOR_CONFIG = {
+    'enabled': True,
+    'explain_sample_rate': 0.05, # Fraction of statements EXPLAINed first (one extra round trip each); access
+                                 # patterns of every statement are recorded either way
+    'min_occurrences': 3,        # Access patterns seen this often with a poor plan become index recommendations
+    'max_patterns': 500,
+    'log_min_rows': 10000,       # Log full scans / filesorts / temporary tables examining at least this many rows
+    'column_order': ('Record_Date', 'Record_Hour', 'Time_Block')  # Preferred leading columns for composite indexes
+}
+
+EXECUTION_CONFIG = {
+    'max_execution_seconds': 30,          # MAX_EXECUTION_TIME hint on /query SELECTs; None disables
+    'export_max_execution_seconds': 300,  # Same for statements re-run by streamed CSV exports
+    'max_rows': 500000,                   # Stop fetching a /query result after this many rows; None disables
+    'max_bytes': 200 * 1024 * 1024,       # ...or once its estimated in-memory size passes this
+    'cancel_on_disconnect': True          # KILL QUERY when an events stream or CSV download is dropped
+}
+
+TELEMETRY_CONFIG = {
+    'llm_metrics_path': 'llm_metrics.jsonl',  # Per-request Ollama timings, read by ollamamonitor
+    'llm_metrics_max_bytes': 20 * 1024 * 1024,  # Rotated to llm_metrics.jsonl.1 at this size
+    'query_log_path': 'query_performance.log',  # Per-request stage timings (JSONL); None disables
+    'query_log_flush_seconds': 1.0,
+    'probe_model_resident': True  # Ask Ollama's /api/ps before a streamed request, so one stopped early still records model loads
+}
+
 # Global state
-db_connection = None
+db_pool = None
+sql_cache = SQLCache(
+    SQL_CACHE_CONFIG['path'],
+    ttl_seconds=SQL_CACHE_CONFIG['ttl_seconds'],
+    max_entries=SQL_CACHE_CONFIG['max_entries']
+) if SQL_CACHE_CONFIG['enabled'] else None
 schema_cache = {}
-query_results_cache = {}  # Cache for storing results for CSV export
+query_results_cache = ResultCache(**RESULT_CACHE_CONFIG)  # Cache for storing results for CSV export
+query_log_writer = BufferedJsonlWriter(
+    TELEMETRY_CONFIG['query_log_path'],
+    flush_interval=TELEMETRY_CONFIG['query_log_flush_seconds']
+) if TELEMETRY_CONFIG['query_log_path'] else None
+llm_metrics_writer = BufferedJsonlWriter(
+    TELEMETRY_CONFIG['llm_metrics_path'],
+    flush_interval=TELEMETRY_CONFIG['query_log_flush_seconds'],
+    max_bytes=TELEMETRY_CONFIG['llm_metrics_max_bytes']
+)
+job_queue = JobQueue(
+    max_workers=JOB_CONFIG['max_workers'],
+    retention_seconds=JOB_CONFIG['retention_seconds'],
+    max_jobs=JOB_CONFIG['max_jobs']
+)
+chart_renderer = ChartRenderer(**GRAPH_CONFIG)
+graph_cache = GraphCache(max_entries=GRAPH_CACHE_CONFIG['max_entries'], max_bytes=GRAPH_CACHE_CONFIG['max_bytes'])
+index_advisor = IndexAdvisor(
+    min_occurrences=INDEX_ADVISOR_CONFIG['min_occurrences'],
+    max_patterns=INDEX_ADVISOR_CONFIG['max_patterns'],
+    column_order=INDEX_ADVISOR_CONFIG['column_order']
+) if INDEX_ADVISOR_CONFIG['enabled'] else None
+query_canceller = QueryCanceller(lambda: mysql.connector.connect(**DB_CONFIG))  # Outside the pool: KILLs must not wait for a checkout
+rollup_manager = RollupManager(
+    lambda: db_connection(),
+    list(TABLE_KEYWORDS),
+    grains=ROLLUP_CONFIG['grains'],
+    refresh_interval=ROLLUP_CONFIG['refresh_interval'],
+    max_staleness=ROLLUP_CONFIG['max_staleness'],
+    route_queries=ROLLUP_CONFIG['route_queries'],
+    on_refresh=lambda: schema_cache.clear()  # New rollup tables change the schema shown to the LLM
+) if ROLLUP_CONFIG['enabled'] else None
+
+# Prometheus metrics served on /metrics
+LLM_LATENCY = Histogram('nlsql_llm_latency_seconds', 'Wall time of LLM SQL generation requests')
+LLM_FAILURES = Counter('nlsql_llm_failures_total', 'LLM SQL generation requests that failed')
+SQL_LATENCY = Histogram('nlsql_sql_latency_seconds', 'MySQL query execution time (execute and fetch)', ['status'])
+GRAPH_RENDER_SECONDS = Histogram('nlsql_graph_render_seconds', 'Time spent rendering result graphs')
+CSV_EXPORT_BYTES = Histogram(
+    'nlsql_csv_export_bytes', 'Size of streamed CSV exports in bytes',
+    buckets=(1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2, 1024 ** 3)
+)
+QUERIES = Counter('nlsql_queries_total', 'Natural language queries processed', ['status'])
+SQL_CACHE_LOOKUPS = Counter('nlsql_sql_cache_lookups_total', 'Natural query -> SQL cache lookups', ['result'])
+SELECT_REJECTIONS = Counter('nlsql_select_validation_rejections_total', 'Generated SQL rejected by validation', ['reason'])
+RESULT_CACHE_LOOKUPS = Counter(
+    'nlsql_result_cache_lookups_total', 'CSV export result cache lookups',
+    ['result'], fn=lambda: {'hit': query_results_cache.hits, 'miss': query_results_cache.misses}
+)
+
+GRAPH_CACHE_LOOKUPS = Counter(
+    'nlsql_graph_cache_lookups_total', 'Rendered graph cache lookups',
+    ['result'], fn=lambda: {'hit': graph_cache.hits, 'miss': graph_cache.misses}
+)
+PLAN_FINDINGS = Counter('nlsql_plan_findings_total', 'EXPLAIN plans with full scans, filesorts or temporary tables',
+                        ['finding'])
+ROLLUP_ROUTES = Counter('nlsql_rollup_routes_total', 'Generated SQL rewritten to a rollup table', ['grain'])
+GUARDRAIL_EVENTS = Counter('nlsql_guardrail_events_total', 'Statements timed out, cancelled or truncated by guardrails',
+                           ['event'])
+GRAPH_CACHE_BYTES = Gauge('nlsql_graph_cache_bytes', 'Bytes of rendered PNGs held by the graph cache',
+                          fn=lambda: graph_cache.get_stats()['bytes'])
+
+def _result_cache_bytes():
+    stats = query_results_cache.get_stats()
+    return {'memory': stats['memory_bytes'], 'spill': stats['spill_bytes']}
+
+def _pool_connections():
+    stats = db_pool.get_stats()
+    return {'in_use': stats['in_use'], 'idle': stats['idle'], 'max': stats['pool_size']}
+
+RESULT_CACHE_BYTES = Gauge('nlsql_result_cache_bytes', 'Bytes held by the CSV export result cache',
+                           ['storage'], fn=_result_cache_bytes)
+RESULT_CACHE_ENTRIES = Gauge('nlsql_result_cache_entries', 'Result sets held by the CSV export result cache',
+                             fn=lambda: query_results_cache.get_stats()['entries'])
+POOL_CONNECTIONS = Gauge('nlsql_db_pool_connections', 'MySQL connection pool occupancy',
+                         ['state'], fn=_pool_connections)
+POOL_WAITS = Counter('nlsql_db_pool_waits_total', 'Connection checkouts that had to wait for a free connection',
+                     fn=lambda: db_pool.get_stats()['waits'])
+POOL_TIMEOUTS = Counter('nlsql_db_pool_timeouts_total', 'Connection checkouts that timed out',
+                        fn=lambda: db_pool.get_stats()['timeouts'])
 
 
 # Database functions
 def db_connect():
-    global db_connection
+    global db_pool
     try:
-        db_connection = mysql.connector.connect(**DB_CONFIG)
-        logger.info("Database connection established")
+        if db_pool is None:
+            db_pool = ConnectionPool(DB_CONFIG, **POOL_CONFIG)
+        # Open one connection up front so configuration errors surface at startup
+        with db_pool.connection():
+            pass
+        logger.info(f"Database connection pool established (size {POOL_CONFIG['pool_size']})")
         return True
-    except mysql.connector.Error as e:
+    except (mysql.connector.Error, PoolTimeoutError) as e:
         logger.error(f"Database connection failed: {e}")
         return False
 
+def db_connection():
+    """Borrow a pooled connection for the duration of a with-block"""
+    if db_pool is None:
+        db_connect()
+    return db_pool.connection()
+
 def infer_relevant_tables(query):
     matched_tables = []
     query_lower = query.lower()
@@ -118,83 +342,175 @@ def infer_relevant_tables(query):
 
 
 def db_get_schema(target_tables=None):
-    global schema_cache, db_connection
-
-    if not db_connection or not db_connection.is_connected():
-        if not db_connect():
-            raise RuntimeError("Failed to connect to database")
+    global schema_cache
 
     cache_key = tuple(sorted(target_tables)) if target_tables else "__all__"
     if cache_key in schema_cache:
         return schema_cache[cache_key]
 
-    cursor = db_connection.cursor()
     schema_info = []
 
     try:
-        cursor.execute("SHOW TABLES")
-        all_tables = [row[0] for row in cursor.fetchall()]
-        tables_to_fetch = target_tables or all_tables
-
-        for table_name in tables_to_fetch:
-            if table_name not in all_tables:
-                continue
-            schema_info.append(f"\nTable: {table_name}")
-            cursor.execute(f"DESCRIBE {table_name}")
-            columns = cursor.fetchall()
-            for column in columns:
-                col_name, col_type, null, key, default, extra = column
-                description = COLUMN_DESCRIPTIONS.get(col_name, "")
-                key_info = f" ({key})" if key else ""
-                desc_str = f" - {description}" if description else ""
-                schema_info.append(f"  - {col_name}: {col_type}{key_info}{desc_str}")
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SHOW TABLES")
+                all_tables = [row[0] for row in cursor.fetchall()]
+                tables_to_fetch = list(target_tables or all_tables)
+                if rollup_manager is not None:
+                    rollup_tables = rollup_manager.rollup_tables(target_tables)
+                    if ROLLUP_CONFIG['expose_in_schema']:
+                        tables_to_fetch += [t for t in rollup_tables if t not in tables_to_fetch]
+                    else:
+                        tables_to_fetch = [t for t in tables_to_fetch if t not in rollup_tables]
 
-    finally:
-        cursor.close()
+                for table_name in tables_to_fetch:
+                    if table_name not in all_tables:
+                        continue
+                    note = rollup_manager.table_note(table_name) if rollup_manager is not None else None
+                    schema_info.append(f"\nTable: {table_name}" + (f" ({note})" if note else ""))
+                    cursor.execute(f"DESCRIBE {table_name}")
+                    columns = cursor.fetchall()
+                    for column in columns:
+                        col_name, col_type, null, key, default, extra = column
+                        description = (rollup_manager.describe_column(table_name, col_name) if note else None) \
+                            or COLUMN_DESCRIPTIONS.get(col_name, "")
+                        key_info = f" ({key})" if key else ""
+                        desc_str = f" - {description}" if description else ""
+                        schema_info.append(f"  - {col_name}: {col_type}{key_info}{desc_str}")
+            finally:
+                cursor.close()
+    except (mysql.connector.InterfaceError, PoolTimeoutError) as e:
+        raise RuntimeError(f"Failed to connect to database: {e}")
 
     schema_str = "\n".join(schema_info)
     schema_cache[cache_key] = schema_str
     return schema_str
 
-def db_execute_query(sql):
-    global db_connection
-    if not db_connection or not db_connection.is_connected():
-        if not db_connect():
-            return {"success": False, "error": "Database connection failed"}
+def db_explain(conn, sql):
+    """EXPLAIN FORMAT=JSON a SELECT on an open connection and log full scans, filesorts and temporary tables"""
+    cursor = conn.cursor(buffered=True)
+    try:
+        plan = explain_plan(cursor, sql)
+    except mysql.connector.Error as e:
+        index_advisor.record_explain_failure()
+        logger.debug(f"EXPLAIN failed: {e}")
+        return None
+    finally:
+        cursor.close()
+    findings = [name for name, found in (('full_scan', plan['full_scans']), ('filesort', plan['using_filesort']),
+                                         ('temporary_table', plan['using_temporary_table'])) if found]
+    for finding in findings:
+        PLAN_FINDINGS.inc(finding=finding)
+    if findings and plan['rows_examined'] >= INDEX_ADVISOR_CONFIG['log_min_rows']:
+        logger.warning(f"Query plan uses {', '.join(findings)} (~{plan['rows_examined']} rows examined, "
+                       f"full scans: {', '.join(plan['full_scans']) or 'none'}): {sql[:200]}")
+    return plan
+
+def db_execute_query(sql, columnar=False, explain=False, cancel_token=None):
+    """Run a statement; with columnar=True a result set is fetched in batches into typed
+    column arrays ('column_arrays', 'column_kinds') and no 'rows' list is built.
 
-    cursor = db_connection.cursor()
+    Every result-returning statement's access pattern is recorded in the index advisor; with
+    explain=True a SELECT is first EXPLAINed and the plan summary is recorded and returned as 'plan'.
+
+    SELECTs run under EXECUTION_CONFIG: a MAX_EXECUTION_TIME hint ('timed_out' on expiry) and
+    row/byte caps on the fetch ('truncated', with details in 'guardrails'). cancel_token
+    registers the statement with query_canceller so another request can KILL it ('cancelled');
+    the token is released when the statement is over."""
+    start_time = time.perf_counter()
+    plan = None
+    is_select = is_select_statement(sql)
+    max_seconds = EXECUTION_CONFIG['max_execution_seconds']
+    budget = FetchBudget(EXECUTION_CONFIG['max_rows'], EXECUTION_CONFIG['max_bytes'])
     try:
-        cursor.execute(sql)
-        if cursor.description:
-            columns = [desc[0] for desc in cursor.description]
-            rows = cursor.fetchall()
-            return {"success": True, "columns": columns, "rows": rows, "row_count": len(rows)}
-        else:
-            db_connection.commit()
-            return {"success": True, "affected_rows": cursor.rowcount, "message": "Query executed successfully"}
+        if query_canceller.is_cancelled(cancel_token):
+            return {"success": False, "cancelled": True, "error": "Query cancelled"}
+        with db_connection() as conn:
+            if explain and index_advisor is not None and is_select:
+                plan = db_explain(conn, sql)
+                start_time = time.perf_counter()
+            # Unbuffered so the caps stop the transfer instead of trimming a fully buffered result
+            cursor = conn.cursor(buffered=False)
+            try:
+                with query_canceller.running(cancel_token, conn):
+                    cursor.execute(add_execution_time_hint(sql, max_seconds * 1000) if is_select and max_seconds else sql)
+                    if cursor.description and columnar:
+                        columns = [desc[0] for desc in cursor.description]
+                        column_arrays, row_count = fetch_column_arrays(cursor, RESULT_CONFIG['fetch_batch_rows'], budget)
+                        result = {"success": True, "columns": columns, "row_count": row_count,
+                                  "column_arrays": column_arrays, "column_kinds": column_kinds(cursor.description)}
+                    elif cursor.description:
+                        columns = [desc[0] for desc in cursor.description]
+                        rows = []
+                        while not budget.truncated:
+                            batch = budget.take(cursor.fetchmany(RESULT_CONFIG['fetch_batch_rows']))
+                            if not batch:
+                                break
+                            rows.extend(batch)
+                        # Typed per-column arrays, built once and shared by graph detection, rendering and chart data
+                        column_arrays = to_column_arrays(rows, len(columns), [desc[1] for desc in cursor.description])
+                        result = {"success": True, "columns": columns, "rows": rows, "row_count": len(rows),
+                                  "column_arrays": column_arrays}
+                    else:
+                        conn.commit()
+                        result = {"success": True, "affected_rows": cursor.rowcount, "message": "Query executed successfully"}
+                    if budget.truncated:
+                        # Stop the server-side statement; the pool closes (never drains) a connection with
+                        # unread rows, so a failed or late KILL still doesn't read the rest of the result
+                        query_canceller.kill(conn.connection_id)
+            finally:
+                try:
+                    cursor.close()
+                except mysql.connector.Error:
+                    pass
+    except PoolTimeoutError as e:
+        logger.error(f"Database connection unavailable: {e}")
+        return {"success": False, "error": "Database connection failed"}
     except mysql.connector.Error as e:
+        SQL_LATENCY.observe(time.perf_counter() - start_time, status='error')
+        if e.errno == QUERY_TIMEOUT_ERRNO:
+            logger.warning(f"Query exceeded {max_seconds}s execution limit: {sql}")
+            GUARDRAIL_EVENTS.inc(event='timeout')
+            return {"success": False, "timed_out": True,
+                    "error": f"Query exceeded the {max_seconds}s execution time limit"}
+        if e.errno == QUERY_INTERRUPTED_ERRNO and query_canceller.is_cancelled(cancel_token):
+            logger.info(f"Query cancelled ({cancel_token})")
+            GUARDRAIL_EVENTS.inc(event='cancelled')
+            return {"success": False, "cancelled": True, "error": "Query cancelled"}
         logger.error(f"Query execution failed: {e}")
         return {"success": False, "error": str(e)}
     finally:
-        cursor.close()
+        query_canceller.release(cancel_token)
+    duration = time.perf_counter() - start_time
+    SQL_LATENCY.observe(duration, status='success')
+    if result.get('columns'):
+        result['guardrails'] = dict(budget.to_dict(), max_execution_seconds=max_seconds)
+        if budget.truncated:
+            logger.warning(f"Result truncated at {budget.rows} rows ({budget.truncated}): {sql}")
+            GUARDRAIL_EVENTS.inc(event=budget.event)
+            result['truncated'] = True
+    if index_advisor is not None and result.get('columns'):
+        index_advisor.record(sql, plan, duration)
+        if plan is not None:
+            result['plan'] = {k: plan[k] for k in ('full_scans', 'using_filesort', 'using_temporary_table',
+                                                   'rows_examined', 'query_cost')}
+    return result
 
 def db_close():
-    global db_connection
-    if db_connection and db_connection.is_connected():
-        db_connection.close()
-        logger.info("Database connection closed")
+    global db_pool
+    if db_pool is not None:
+        db_pool.close_all()
+        db_pool = None
 
 
 
 
 
 
-def llm_generate_sql(natural_query, schema):
-    holiday_dates_string = infer_holiday_context(natural_query)
-    prompt = f"""You are an expert MySQL query generator for an electricity market database. Convert natural language queries to valid MySQL SQL.
-
-Database Schemas:
-{schema}
+# Static instructions sent first in every prompt. Keeping per-query data (schema subset,
+# holiday list, question) after this block lets Ollama reuse the KV cache for the prefix.
+SQL_PROMPT_PREFIX = """You are an expert MySQL query generator for an electricity market database. Convert natural language queries to valid MySQL SQL.
 
 IMPORTANT TIME STRUCTURE CONTEXT:
 - Each day contains 96 time blocks (15-minute intervals: 00:00, 00:15, 00:30, 00:45, etc.)
@@ -215,9 +531,6 @@ UNIT CONVERSION RULES:
   * Keep original MW/MWh units
   * No conversion needed, other than maintaining 2 decimal places. 
 
-HOLIDAY DATES FOR REFERENCE:
-{holiday_dates_string}
-
 QUERY ANALYSIS FOR UNIT CONVERSION:
 - Multi-day indicators: "week", "month", "year", "last month", "past month", "weekly", "monthly", "yearly", "multiple days", "several days", "trend", "over time"
 - Single day indicators: "today", "yesterday", "daily", "hourly", "this hour", specific date like "2024-01-15"
@@ -244,6 +557,7 @@ Rules:
 19. Always alias converted values (e.g., `... AS Purchase_Bid_MU`).
 20. If a holiday, apply date logic using provided holiday list.
 21. When comparing tables (e.g., RTM vs DAM), always alias tables and qualify shared columns like Record_Date, Record_Hour, etc.
+22. Tables ending in _daily, _hourly or _monthly are pre-aggregated rollups of the raw table. Their *_Sum columns already hold the SUM over time blocks (add them with SUM(), never divide a rollup *_MU column by 4000 again) and averages must be SUM(*_Sum)/SUM(*_Count). Only use a rollup when the question needs no finer grain than the rollup's.
 
 EXAMPLES OF UNIT CONVERSION:
 Multi-day query: "Show weekly volume trends"
@@ -251,38 +565,236 @@ Multi-day query: "Show weekly volume trends"
 
 Single day query: "Show hourly volumes for today"
 → SELECT Record_Hour, SUM(Purchase_Bid_MW) AS Purchase_Bid_MW FROM energy_bids_dam WHERE DATE(Record_Date) = CURDATE() GROUP BY Record_Hour;
+"""
+
+def build_sql_prompt(natural_query, schema, holiday_dates_string):
+    """Stable SQL_PROMPT_PREFIX followed by the per-query suffix"""
+    return f"""{SQL_PROMPT_PREFIX}
+Database Schemas:
+{schema}
+
+HOLIDAY DATES FOR REFERENCE:
+{holiday_dates_string}
 
 Natural Language Query: {natural_query}
 
 SQL Query:"""
 
-    # Ollama API payload structure
+def llm_warmup():
+    """Load the model and evaluate SQL_PROMPT_PREFIX once so the first real query hits a warm cache"""
     payload = {
         "model": LLM_CONFIG['model_name'],
-        "prompt": prompt,  # Ollama uses 'prompt' instead of 'messages'
+        "prompt": SQL_PROMPT_PREFIX,
         "stream": False,
+        "keep_alive": LLM_CONFIG['keep_alive'],
         "options": {
             "temperature": LLM_CONFIG['temperature'],
-            "num_predict": LLM_CONFIG['max_tokens'],  # Ollama uses 'num_predict' instead of 'max_tokens'
+            "num_predict": 1
         }
     }
-
     try:
-        # Ollama endpoint is different - uses /api/generate instead of /v1/chat/completions
         response = requests.post(f"{LLM_CONFIG['endpoint']}/api/generate", json=payload, timeout=300)
         response.raise_for_status()
         result = response.json()
-        
-        # Ollama response structure is different - response is in 'response' field
-        sql_query = result["response"].strip()
-        return clean_sql(sql_query)
+        logger.info(f"LLM warm-up done: load {result.get('load_duration', 0) / 1e9:.2f}s, "
+                    f"prefix {result.get('prompt_eval_count', 0)} tokens in "
+                    f"{result.get('prompt_eval_duration', 0) / 1e9:.2f}s")
+    except requests.RequestException as e:
+        logger.warning(f"LLM warm-up failed: {e}")
+
+def llm_generate_sql(natural_query, schema, holiday_dates_string=None):
+    sql_query, _ = llm_generate_sql_with_stats(natural_query, schema, holiday_dates_string)
+    return sql_query
+
+def llm_generate_sql_with_stats(natural_query, schema, holiday_dates_string=None):
+    """Generate SQL and return (sql, inference metrics) for telemetry"""
+    if holiday_dates_string is None:
+        holiday_dates_string = build_holiday_context(natural_query)
+    prompt = build_sql_prompt(natural_query, schema, holiday_dates_string)
+
+    logger.info(f"Prompt size: ~{estimate_tokens(prompt)} tokens "
+                f"(schema ~{estimate_tokens(schema)}, holiday context ~{estimate_tokens(holiday_dates_string)})")
+
+    # Ollama API payload structure
+    payload = {
+        "model": LLM_CONFIG['model_name'],
+        "prompt": prompt,  # Ollama uses 'prompt' instead of 'messages'
+        "stream": LLM_CONFIG['stream'],
+        "keep_alive": LLM_CONFIG['keep_alive'],  # Keep the model (and its prompt cache) resident between queries
+        "options": {
+            "temperature": LLM_CONFIG['temperature'],
+            "num_predict": LLM_CONFIG['max_tokens'],  # Ollama uses 'num_predict' instead of 'max_tokens'
+        }
+    }
+
+    start_time = time.monotonic()
+    try:
+        if LLM_CONFIG['stream']:
+            sql_query, stats = llm_stream_sql(payload, prompt_tokens=estimate_tokens(prompt))
+        else:
+            # Ollama endpoint is different - uses /api/generate instead of /v1/chat/completions
+            response = requests.post(f"{LLM_CONFIG['endpoint']}/api/generate", json=payload, timeout=300)
+            response.raise_for_status()
+            result = response.json()
+            stats = dict(extract_ollama_timings(result), ttft_seconds=None, stopped_early=False)
+            if 'prompt_eval_count' in result:
+                logger.info(f"Prompt evaluated: {result['prompt_eval_count']} tokens in "
+                            f"{result.get('prompt_eval_duration', 0) / 1e9:.2f}s")
+
+            # Ollama response structure is different - response is in 'response' field
+            sql_query = result["response"].strip()
         
     except requests.RequestException as e:
         logger.error(f"LLM request failed: {e}")
+        LLM_FAILURES.inc()
         raise
 
+    stats.update(
+        timestamp=datetime.now().isoformat(),
+        model=LLM_CONFIG['model_name'],
+        stream=LLM_CONFIG['stream'],
+        prompt_tokens_estimate=estimate_tokens(prompt),
+        wall_seconds=round(time.monotonic() - start_time, 4)
+    )
+    if stats.get('model_loaded'):
+        load = f"{stats['load_seconds']:.2f}s" if stats.get('load_seconds') is not None else 'duration unknown'
+        logger.warning(f"Ollama loaded {LLM_CONFIG['model_name']} for this request ({load})")
+    llm_metrics_writer.write(stats)
+    LLM_LATENCY.observe(stats['wall_seconds'])
+    try:
+        return clean_sql(sql_query), stats
+    except ValueError:
+        SELECT_REJECTIONS.inc(reason='not_select')
+        raise
+
+
+def sql_statement_start(text):
+    """Return the index where the generated SQL begins in (possibly partial) LLM output, or -1 if not yet known.
+
+    That is the line after an opening code fence, or else a line that starts with SELECT or WITH.
+    A SELECT mentioned in prose before the fence or mid-sentence is not the statement.
+    """
+    fence = text.find('```')
+    statement = re.search(r'^[ \t]*(SELECT|WITH)\b', text, flags=re.IGNORECASE | re.MULTILINE)
+    if fence != -1 and (statement is None or fence < statement.start()):
+        newline = text.find('\n', fence)
+        return newline + 1 if newline != -1 else -1  # -1 while the fence's language tag is still streaming
+    return statement.start(1) if statement else -1
+
+
+def sql_statement_end(text):
+    """Return the index just past the first complete SQL statement in text, or -1.
+
+    Scanning starts at sql_statement_start(); the statement is complete at the first semicolon
+    or closing code fence that is not inside a quoted string, identifier or comment.
+    """
+    i = sql_statement_start(text)
+    if i == -1:
+        return -1
+    quote = None
+    while i < len(text):
+        ch = text[i]
+        if quote:
+            if ch == '\\' and quote != '`':
+                i += 1  # Backslash escape inside a string
+            elif ch == quote:
+                quote = None
+        elif ch in ("'", '"'):
+            quote = ch
+        elif ch == ';':
+            return i + 1
+        elif text.startswith('```', i):
+            return i
+        elif ch == '`':
+            quote = ch
+        elif text.startswith('--', i) or ch == '#':
+            newline = text.find('\n', i)
+            if newline == -1:
+                return -1
+            i = newline
+        elif text.startswith('/*', i):
+            close = text.find('*/', i + 2)
+            if close == -1:
+                return -1
+            i = close + 1
+        i += 1
+    return -1
+
+
+def ollama_model_resident(model, timeout=1.0):
+    """True/False if Ollama's /api/ps does/doesn't list model as loaded, None if Ollama can't be asked"""
+    try:
+        response = requests.get(f"{LLM_CONFIG['endpoint']}/api/ps", timeout=timeout)
+        response.raise_for_status()
+        loaded = response.json().get('models', [])
+    except (requests.RequestException, ValueError):
+        return None
+    # Ollama reports untagged models with their implicit :latest tag
+    names = {model, model if ':' in model else f"{model}:latest"}
+    return any(m.get('name') in names or m.get('model') in names for m in loaded)
+
+
+def llm_stream_sql(payload, prompt_tokens=None):
+    """Consume Ollama's NDJSON token stream and cancel generation once the SQL is complete.
+
+    Returns (text, stats). Ollama only reports its own timings in the final event, so when
+    generation is cut short the stats are measured client-side (one stream event ~ one token)
+    and model loads are detected by asking /api/ps beforehand (see estimate_stream_timings).
+    """
+    model_resident = ollama_model_resident(payload['model']) if TELEMETRY_CONFIG['probe_model_resident'] else None
+    chunks = []
+    text = ""
+    stopped_early = False
+    first_token_time = None
+    token_events = 0
+    final_event = None
+    start_time = time.monotonic()
+
+    # (connect timeout, per-chunk read timeout)
+    with requests.post(f"{LLM_CONFIG['endpoint']}/api/generate", json=payload, stream=True, timeout=(10, 300)) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            event = json.loads(line)
+            if event.get("error"):
+                raise requests.RequestException(f"Ollama error: {event['error']}")
+            if first_token_time is None and event.get("response"):
+                first_token_time = time.monotonic()
+                logger.info(f"LLM time to first token: {first_token_time - start_time:.2f}s")
+            if event.get("response"):
+                token_events += 1
+            chunks.append(event.get("response", ""))
+            if event.get("done"):
+                final_event = event
+                break
+            text = "".join(chunks)
+            end = sql_statement_end(text)
+            if end != -1:
+                # Leaving the block closes the connection, which makes Ollama abort generation
+                chunks = [text[:end]]
+                stopped_early = True
+                break
+
+    end_time = time.monotonic()
+    logger.info(f"LLM stream finished in {end_time - start_time:.2f}s "
+                f"({'stopped at end of SQL' if stopped_early else 'model finished'})")
+
+    if final_event is not None:
+        stats = extract_ollama_timings(final_event)
+    else:
+        eval_seconds = round(end_time - first_token_time, 4) if first_token_time else None
+        ttft_seconds = round(first_token_time - start_time, 4) if first_token_time else None
+        stats = estimate_stream_timings(prompt_tokens, token_events, ttft_seconds, eval_seconds, model_resident)
+    stats['ttft_seconds'] = round(first_token_time - start_time, 4) if first_token_time else None
+    stats['stopped_early'] = stopped_early
+    return "".join(chunks).strip(), stats
+
 
 def clean_sql(sql):
+    start = sql_statement_start(sql)
+    if start > 0:
+        sql = sql[start:]  # Drop prose (which may itself mention SELECT) before the statement
     sql = re.sub(r'```sql\s*', '', sql, flags=re.IGNORECASE)
     sql = re.sub(r'```\s*', '', sql)
     sql = re.sub(r'^.*?SELECT', 'SELECT', sql, flags=re.IGNORECASE | re.DOTALL)
@@ -306,165 +818,132 @@ def cache_query_to_file(natural_query):
     with open("cached_queries.txt", "a", encoding="utf-8") as f:
         f.write(natural_query.strip() + "\n")
 
-def generate_csv_from_results(columns, rows):
-    """Generate CSV content from query results"""
+def iter_csv_chunks(columns, rows, chunk_rows=None):
+    """Yield CSV text in chunks of chunk_rows rows; rows may be any iterable of tuples"""
+    chunk_rows = chunk_rows or EXPORT_CONFIG['chunk_rows']
     output = io.StringIO()
     writer = csv.writer(output)
-    
+
     # Write header
     writer.writerow(columns)
-    
-    # Write data rows
+
+    # csv.writer writes None as an empty string and str()s everything else itself
+    batch = []
     for row in rows:
-        # Convert None values to empty strings and handle other data types
-        csv_row = []
-        for cell in row:
-            if cell is None:
-                csv_row.append('')
-            else:
-                csv_row.append(str(cell))
-        writer.writerow(csv_row)
-    
-    return output.getvalue()
+        batch.append(row)
+        if len(batch) >= chunk_rows:
+            writer.writerows(batch)
+            batch = []
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate(0)
+    if batch:
+        writer.writerows(batch)
+    if output.tell():
+        yield output.getvalue()
 
-def detect_graph_type(columns, rows):
-    """Detect appropriate graph type based on data columns"""
-    if not columns or not rows:
-        return None
-    
-    # Convert to lowercase for easier matching
-    col_lower = [col.lower() for col in columns]
-    
-    # Check for time-based columns
-    time_cols = []
-    for i, col in enumerate(col_lower):
-        if any(time_word in col for time_word in ['date', 'hour', 'time', 'block']):
-            time_cols.append(i)
-    
-    # Check for volume columns (area chart)
-    volume_cols = []
-    for i, col in enumerate(col_lower):
-        if any(vol_word in col for vol_word in ['volume', 'mw', 'bid']):
-            volume_cols.append(i)
-    
-    # Check for price columns (line chart)
-    price_cols = []
-    for i, col in enumerate(col_lower):
-        if any(price_word in col for price_word in ['price', 'mcp', 'rs']):
-            price_cols.append(i)
-    
-    # Determine graph type and columns to plot
-    if time_cols and (volume_cols or price_cols):
-        x_col = time_cols[0]  # Use first time column as x-axis
-        
-        if volume_cols:
-            return {
-                'type': 'area',
-                'x_col': x_col,
-                'y_cols': volume_cols,
-                'x_label': columns[x_col],
-                'y_labels': [columns[i] for i in volume_cols]
-            }
-        elif price_cols:
-            return {
-                'type': 'line',
-                'x_col': x_col,
-                'y_cols': price_cols,
-                'x_label': columns[x_col],
-                'y_labels': [columns[i] for i in price_cols]
-            }
-    
-    return None
+def iter_query_csv_chunks(sql, chunk_rows=None):
+    """Re-run a SELECT on an unbuffered cursor and stream its rows as CSV chunks"""
+    chunk_rows = chunk_rows or EXPORT_CONFIG['chunk_rows']
+    max_seconds = EXECUTION_CONFIG['export_max_execution_seconds']
+    with db_connection() as conn:
+        cursor = conn.cursor(buffered=False)
+        try:
+            cursor.execute(add_execution_time_hint(sql, max_seconds * 1000) if max_seconds else sql)
+            columns = [desc[0] for desc in cursor.description]
+
+            def fetch_rows():
+                while True:
+                    batch = cursor.fetchmany(chunk_rows)
+                    if not batch:
+                        return
+                    yield from batch
+
+            try:
+                yield from iter_csv_chunks(columns, fetch_rows(), chunk_rows)
+            except GeneratorExit:
+                if EXECUTION_CONFIG['cancel_on_disconnect']:
+                    # Download dropped: stop the server-side scan instead of letting it run on
+                    GUARDRAIL_EVENTS.inc(event='disconnect')
+                    query_canceller.kill(conn.connection_id)
+                raise
+        finally:
+            try:
+                cursor.close()
+            except mysql.connector.Error:
+                # Client went away mid-stream; the pool closes the connection without reading the unread rows
+                pass
 
+def gzip_chunks(chunks):
+    """Gzip-compress a stream of text chunks"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
 
-def detect_graph_type(columns, rows):
+def count_export_bytes(chunks):
+    """Pass chunks through and record the total bytes sent once the stream ends"""
+    total = 0
+    try:
+        for chunk in chunks:
+            total += len(chunk.encode('utf-8')) if isinstance(chunk, str) else len(chunk)
+            yield chunk
+    finally:
+        CSV_EXPORT_BYTES.observe(total)
+
+def generate_csv_from_results(columns, rows):
+    """Generate CSV content from query results"""
+    return ''.join(iter_csv_chunks(columns, rows))
+
+def detect_graph_type(columns, column_arrays):
     """Detect appropriate graph type based on data columns"""
-    if not columns or not rows:
-        logger.info("No columns or rows for graph detection")
+    if not columns or not column_arrays or not len(column_arrays[0]):
         return None
-    
-    logger.info(f"=== GRAPH TYPE DETECTION ===")
-    logger.info(f"Available columns: {columns}")
-    
-    # Convert to lowercase for easier matching
+
     col_lower = [col.lower() for col in columns]
-    
+
     # Find time-based columns (x-axis candidates)
-    time_cols = []
-    for i, col in enumerate(col_lower):
-        if any(time_word in col for time_word in ['date', 'hour', 'time', 'block']):
-            time_cols.append(i)
-            logger.info(f"Found time column: {columns[i]} at index {i}")
-    
-    # Find numeric columns that could be y-axis
-    numeric_cols = []
-    volume_cols = []
-    price_cols = []
-    
-    # Create a small sample to test numeric conversion
-    df_sample = pd.DataFrame(rows[:5], columns=columns)  # Just first 5 rows for testing
-    
-    for i, col in enumerate(columns):
-        col_lower = col.lower()
-        try:
-            # Try to convert to numeric
-            sample_data = pd.to_numeric(df_sample.iloc[:, i], errors='coerce')
-            valid_count = sample_data.notna().sum()
-            
-            if valid_count > 0:  # Has some numeric data
-                numeric_cols.append(i)
-                logger.info(f"Found numeric column: {col} at index {i}")
-                
-                # Categorize the numeric column
-                if any(vol_word in col_lower for vol_word in ['volume', 'mw', 'bid', 'mcv']):
-                    volume_cols.append(i)
-                    logger.info(f"  -> Categorized as volume column")
-                elif any(price_word in col_lower for price_word in ['price', 'mcp', 'rs']):
-                    price_cols.append(i)
-                    logger.info(f"  -> Categorized as price column")
-                
-        except Exception as e:
-            logger.info(f"Column {col} is not numeric: {e}")
-            continue
-    
-    logger.info(f"Time columns: {[columns[i] for i in time_cols]}")
-    logger.info(f"Volume columns: {[columns[i] for i in volume_cols]}")
-    logger.info(f"Price columns: {[columns[i] for i in price_cols]}")
-    logger.info(f"All numeric columns: {[columns[i] for i in numeric_cols]}")
-    
+    time_cols = [i for i, col in enumerate(col_lower)
+                 if any(time_word in col for time_word in ['date', 'hour', 'time', 'block'])]
+
+    # Find numeric columns that could be y-axis, categorized by name
+    numeric_cols = [i for i, array in enumerate(column_arrays) if is_numeric_array(array)]
+    volume_cols = [i for i in numeric_cols
+                   if any(vol_word in col_lower[i] for vol_word in ['volume', 'mw', 'bid', 'mcv'])]
+    price_cols = [i for i in numeric_cols if i not in volume_cols
+                  and any(price_word in col_lower[i] for price_word in ['price', 'mcp', 'rs'])]
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Graph detection: time={[columns[i] for i in time_cols]} "
+                     f"volume={[columns[i] for i in volume_cols]} price={[columns[i] for i in price_cols]} "
+                     f"numeric={[columns[i] for i in numeric_cols]}")
+
     # Determine graph configuration
-    if not time_cols:
-        logger.info("No time columns found, cannot create time-series graph")
+    if not time_cols or not numeric_cols:
         return None
-    
-    if not numeric_cols:
-        logger.info("No numeric columns found, cannot create graph")
-        return None
-    
+
     # Use the first time column as x-axis
     x_col = time_cols[0]
-    
+
     # Determine y-columns and graph type
     if price_cols:
         # Prefer price data for line charts
         y_cols = price_cols[:2]  # Limit to 2 for readability
         graph_type = 'line'
-        logger.info(f"Creating line chart with price data")
     elif volume_cols:
         # Use volume data for area charts
-        y_cols = volume_cols[:2]  # Limit to 2 for readability  
+        y_cols = volume_cols[:2]  # Limit to 2 for readability
         graph_type = 'area'
-        logger.info(f"Creating area chart with volume data")
     else:
         # Use any numeric columns
         y_cols = [col for col in numeric_cols if col != x_col][:2]  # Exclude x-column, limit to 2
         graph_type = 'line'
-        logger.info(f"Creating line chart with general numeric data")
-    
+
     if not y_cols:
-        logger.info("No suitable Y columns found")
         return None
-    
+
     config = {
         'type': graph_type,
         'x_col': x_col,
@@ -472,299 +951,249 @@ def detect_graph_type(columns, rows):
         'x_label': columns[x_col],
         'y_labels': [columns[i] for i in y_cols]
     }
-    
-    logger.info(f"Graph config: {config}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Graph config: {config}")
     return config
 
+def render_graph(columns, column_arrays, graph_config):
+    """Return (graph_id, PNG bytes, cached) for a graph config, rendering only on a graph cache miss"""
+    graph_id = graph_fingerprint(columns, column_arrays, graph_config, chart_renderer.options)
+    png = graph_cache.get(graph_id)
+    if png is not None:
+        return graph_id, png, True
+    with GRAPH_RENDER_SECONDS.time():
+        png = chart_renderer.render(columns, column_arrays, graph_config)
+    if png is not None:
+        graph_cache.put(graph_id, png)
+    return graph_id, png, False
+
 def generate_graph(columns, rows, graph_config):
-    """Generate graph based on configuration with detailed debugging"""
+    """Render the graph for a result set as a base64 PNG (served from the graph cache when possible)"""
     if not graph_config:
-        logger.info("No graph config provided")
         return None
-    
+    _, png, _ = render_graph(columns, to_column_arrays(rows, len(columns)), graph_config)
+    return base64.b64encode(png).decode('utf-8') if png else None
+
+def graph_response(graph_id, png, max_age):
+    """PNG response with an ETag of the content fingerprint; answers If-None-Match with 304"""
+    response = Response(png, mimetype='image/png')
+    response.set_etag(graph_id)
+    response.headers['Cache-Control'] = f'public, max-age={max_age}'
+    return response.make_conditional(request)
+
+def process_natural_query(natural_query, return_csv_id=False, progress=None, graph_mode='image', chart_points=None,
+                          result_format=None, cancel_token=None):
+    """Run the NL -> SQL -> results -> graph pipeline.
+
+    progress, if given, is called as progress(stage, **details) when each stage completes.
+    Per-stage durations are returned in the 'timings' field and appended to the query log.
+
+    graph_mode 'image' embeds a rendered PNG; 'data' returns the graph config and downsampled
+    series for the client to draw (the PNG is rendered only if /graph/<csv_id> is fetched);
+    'none' skips graphing.
+
+    result_format 'columnar' fetches into typed column arrays and returns results['data'] as
+    one list per column instead of results['rows'] (default: RESULT_CONFIG['default_format']).
+
+    cancel_token identifies the statement to query_canceller (the job id for async jobs, the
+    client's request_id for synchronous calls) so it can be killed while it runs.
+    """
+    progress = progress or (lambda stage, **details: None)
+    columnar = (result_format or RESULT_CONFIG['default_format']) == 'columnar'
+    trace = Trace()
+    sql_query = None
+    results = {}
     try:
-        # Create DataFrame for easier manipulation
-        df = pd.DataFrame(rows, columns=columns)
-        
-        # Extensive debugging
-        logger.info(f"=== GRAPH DEBUG INFO ===")
-        logger.info(f"DataFrame shape: {df.shape}")
-        logger.info(f"Columns: {list(df.columns)}")
-        logger.info(f"Column types: {df.dtypes.to_dict()}")
-        logger.info(f"Graph config: {graph_config}")
-        logger.info(f"First few rows:\n{df.head()}")
-        
-        # Validate we have data
-        if df.empty:
-            logger.warning("DataFrame is empty")
-            return None
-        
-        # Set up matplotlib with explicit backend and clear any existing plots
-        plt.ioff()  # Turn off interactive mode
-        plt.clf()  # Clear any existing plots
-        plt.close('all')  # Close all figures
-        
-        # Create new figure with explicit settings
-        fig, ax = plt.subplots(figsize=(12, 8), dpi=100)
-        fig.patch.set_facecolor('white')
-        
-        x_col_idx = graph_config['x_col']
-        y_col_indices = graph_config['y_cols']
-        
-        # Validate column indices
-        if x_col_idx >= len(df.columns):
-            logger.error(f"X column index {x_col_idx} out of range. Max index: {len(df.columns)-1}")
-            return None
-        
-        # Get X data
-        x_data = df.iloc[:, x_col_idx]
-        logger.info(f"X column: {columns[x_col_idx]}")
-        logger.info(f"X data type: {type(x_data.iloc[0]) if len(x_data) > 0 else 'empty'}")
-        logger.info(f"X data sample: {x_data.head().tolist()}")
-        
-        # Handle different x-axis data types
-        x_values = None
-        x_is_time = False
-        
-        if 'date' in columns[x_col_idx].lower():
-            # Handle date columns
-            try:
-                if isinstance(x_data.iloc[0], str):
-                    # String dates
-                    x_values = pd.to_datetime(x_data, errors='coerce')
-                else:
-                    # Already datetime objects
-                    x_values = x_data
-                x_is_time = True
-                logger.info(f"Parsed dates: {x_values.head().tolist()}")
-            except Exception as e:
-                logger.error(f"Date parsing failed: {e}")
-                x_values = range(len(x_data))  # Use indices as fallback
-        elif 'hour' in columns[x_col_idx].lower() or 'block' in columns[x_col_idx].lower():
-            # Numeric time columns
-            try:
-                x_values = pd.to_numeric(x_data, errors='coerce')
-                logger.info(f"Numeric x values: {x_values.head().tolist()}")
-            except:
-                x_values = range(len(x_data))
-        else:
-            # Use row indices
-            x_values = range(len(x_data))
-        
-        # Process Y columns
-        plotted_any = False
-        colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd']
-        
-        for i, y_col_idx in enumerate(y_col_indices):
-            if y_col_idx >= len(df.columns):
-                logger.warning(f"Y column index {y_col_idx} out of range. Skipping.")
-                continue
-            
-            y_data = df.iloc[:, y_col_idx]
-            y_label = graph_config['y_labels'][i]
-            
-            logger.info(f"Y column {i}: {columns[y_col_idx]} (index {y_col_idx})")
-            logger.info(f"Y data type: {type(y_data.iloc[0]) if len(y_data) > 0 else 'empty'}")
-            logger.info(f"Y data sample: {y_data.head().tolist()}")
-            
-            # Convert to numeric
+        with trace.span('cache_query_to_file'):
+            cache_query_to_file(natural_query)
+        with trace.span('infer_relevant_tables') as span:
+            relevant_tables = infer_relevant_tables(natural_query)
+            span['tables'] = relevant_tables
+        with trace.span('db_get_schema'):
+            schema = db_get_schema(target_tables=relevant_tables)
+        with trace.span('build_holiday_context') as span:
+            holiday_dates_string = build_holiday_context(natural_query)
+            span['tokens'] = estimate_tokens(holiday_dates_string)
+
+        # Reuse SQL generated for the same question against the same schema/model/date context
+        sql_cached = False
+        cache_key = None
+        if sql_cache is not None:
+            with trace.span('sql_cache_lookup') as span:
+                cache_key = make_cache_key(natural_query, schema, LLM_CONFIG['model_name'], holiday_dates_string)
+                sql_query = sql_cache.get(cache_key)
+                sql_cached = sql_query is not None
+                span['hit'] = sql_cached
+            SQL_CACHE_LOOKUPS.inc(result='hit' if sql_cached else 'miss')
+        llm_metrics = None
+        if sql_query is None:
+            progress('llm_started', model=LLM_CONFIG['model_name'])
+            with trace.span('llm_generate_sql'):
+                sql_query, llm_metrics = llm_generate_sql_with_stats(natural_query, schema, holiday_dates_string)
+        progress('sql_ready', sql=sql_query, sql_cached=sql_cached)
+
+        with trace.span('sql_validation') as span:
+            # Parsed once: the tree is reused by the rewriter and for the statement fingerprint
             try:
-                y_numeric = pd.to_numeric(y_data, errors='coerce')
-                
-                # Check for valid data
-                valid_count = y_numeric.notna().sum()
-                logger.info(f"Valid Y values: {valid_count}/{len(y_numeric)}")
-                
-                if valid_count == 0:
-                    logger.warning(f"No valid numeric data in column {y_label}")
-                    continue
-                
-                # Fill NaN with 0 or interpolate
-                y_numeric = y_numeric.fillna(0)
-                
-                logger.info(f"Y numeric range: {y_numeric.min()} to {y_numeric.max()}")
-                
-                # Plot the data
-                color = colors[i % len(colors)]
-                if graph_config['type'] == 'area':
-                    ax.fill_between(x_values, y_numeric, alpha=0.6, label=y_label, color=color)
-                    ax.plot(x_values, y_numeric, linewidth=2, color=color, alpha=0.8)
-                else:  # line
-                    ax.plot(x_values, y_numeric, marker='o', markersize=3, linewidth=2, 
-                           label=y_label, color=color)
-                
-                plotted_any = True
-                logger.info(f"Successfully plotted {y_label}")
-                
-            except Exception as e:
-                logger.error(f"Failed to plot column {y_label}: {e}")
-                continue
-        
-        if not plotted_any:
-            logger.error("No data was successfully plotted")
-            plt.close(fig)
-            return None
-        
-        # Customize the plot
-        ax.set_title(f"Market Data Analysis", fontsize=16, fontweight='bold', pad=20)
-        ax.set_xlabel(graph_config['x_label'], fontsize=12, fontweight='bold')
-        ax.set_ylabel(', '.join(graph_config['y_labels']), fontsize=12, fontweight='bold')
-        
-        # Handle x-axis formatting
-        if x_is_time and hasattr(x_values, 'dtype') and 'datetime' in str(x_values.dtype):
-            # Format dates nicely
-            ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
-            ax.xaxis.set_major_locator(mdates.HourLocator(interval=max(1, len(x_values)//10)))
-            plt.setp(ax.xaxis.get_majorticklabels(), rotation=45, ha='right')
-        elif 'block' in columns[x_col_idx].lower():
-            # For time blocks, show every nth tick
-            step = max(1, len(x_values) // 20)
-            ax.set_xticks(x_values[::step])
-            plt.setp(ax.xaxis.get_majorticklabels(), rotation=45, ha='right')
-        
-        # Add legend and grid
-        ax.legend(fontsize=10, loc='best')
-        ax.grid(True, alpha=0.3, linestyle='-', linewidth=0.5)
-        
-        # Set background color
-        ax.set_facecolor('#f8f9fa')
-        
-        # Ensure reasonable axis limits with some padding
-        ax.margins(x=0.02, y=0.05)
-        
-        # Improve layout
-        plt.tight_layout()
-        
-        # Save to base64 with high quality
-        img_buffer = io.BytesIO()
-        plt.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight', 
-                   facecolor='white', edgecolor='none', 
-                   pad_inches=0.2)
-        img_buffer.seek(0)
-        
-        # Get the image data and encode to base64
-        img_data = img_buffer.getvalue()
-        img_str = base64.b64encode(img_data).decode('utf-8')
-        
-        # Clean up
-        plt.close(fig)
-        img_buffer.close()
-        
-        logger.info(f"Graph generated successfully. Image size: {len(img_str)} characters")
-        logger.info(f"Base64 prefix: {img_str[:50]}...")
-        
-        return img_str
-        
-    except Exception as e:
-        logger.error(f"Graph generation failed: {e}")
-        import traceback
-        logger.error(f"Full traceback: {traceback.format_exc()}")
-        plt.close('all')  # Ensure cleanup on error
-        return None
+                validated = validate_sql(sql_query, schema_tables(schema))
+                if validated.unknown_tables:
+                    # The schema sent to the LLM is a subset; check against every table before rejecting
+                    validated = validate_sql(sql_query, schema_tables(db_get_schema()), tree=validated.tree)
+            except SQLValidationError as e:
+                SELECT_REJECTIONS.inc(reason=e.reason)
+                raise
+            span['tables'] = sorted(validated.tables)
+            span['fingerprint'] = validated.fingerprint
+            if validated.unknown_tables and SQL_VALIDATION_CONFIG['reject_unknown_tables']:
+                SELECT_REJECTIONS.inc(reason='unknown_table')
+                raise ValueError(f"Generated SQL references unknown tables: {', '.join(sorted(validated.unknown_tables))}")
+            if validated.unknown_columns and SQL_VALIDATION_CONFIG['reject_unknown_columns']:
+                SELECT_REJECTIONS.inc(reason='unknown_column')
+                raise ValueError(f"Generated SQL references unknown columns: {', '.join(sorted(validated.unknown_columns))}")
 
-def process_natural_query(natural_query, return_csv_id=False):
-    try:
-        cache_query_to_file(natural_query)
-        relevant_tables = infer_relevant_tables(natural_query)
-        relevant_tables = infer_relevant_tables(natural_query)
-        schema = db_get_schema(target_tables=relevant_tables)
-        sql_query = llm_generate_sql(natural_query, schema)
-
-        # Improved SQL validation
-        schema_columns = set(re.findall(r"- (\w+):", schema))
-        sql_keywords = {
-            'SELECT', 'FROM', 'WHERE', 'AND', 'OR', 'NOT', 'IN', 'BETWEEN',
-            'LIKE', 'IS', 'NULL', 'GROUP', 'BY', 'ORDER', 'HAVING', 'LIMIT',
-            'OFFSET', 'JOIN', 'INNER', 'OUTER', 'LEFT', 'RIGHT', 'FULL',
-            'UNION', 'ALL', 'EXISTS', 'CASE', 'WHEN', 'THEN', 'ELSE', 'END',
-            'AS', 'ON', 'DISTINCT', 'ASC', 'DESC', 'AVG', 'SUM', 'COUNT',
-            'MIN', 'MAX', 'DATE', 'YEAR', 'MONTH', 'DAY', 'NOW', 'CURRENT_DATE',
-            'INTERVAL', 'CURRENT_TIMESTAMP', 'DATE_ADD', 'DATE_SUB', 'IF',
-            'NULLIF', 'COALESCE', 'EXTRACT', 'CAST', 'CONVERT', 'WITH', 'RECURSIVE', 
-            'RTM', 'WEEK', 'CURDATE', 'CHAR_LENGTH', 'LENGTH', 'CONCAT', 'SUBSTRING',
-            'UPPER', 'LOWER', 'TRIM', 'LTRIM', 'RTRIM',
-            'REPLACE', 'LOCATE', 'POSITION', 'REPEAT',
-            'MOD', 'ROUND', 'FLOOR', 'CEIL', 'ABS', 'POWER', 'RAND',
-            'ROW_NUMBER', 'RANK', 'DENSE_RANK', 'NTILE',
-            'LAG', 'LEAD', 'FIRST_VALUE', 'LAST_VALUE',
-            'PARTITION', 'OVER', 'WINDOW', 'DAM', 'Total_Volume'
-        }
-        
-        # Extract column references more accurately
-        column_refs = set()
-        # Find column references after FROM
-        from_pos = sql_query.upper().find('FROM')
-        if from_pos == -1:
-            raise ValueError("SQL query must contain a FROM clause")
-        
-        # Split into parts we care about (after FROM)
-        remaining_query = sql_query[from_pos:]
-        
-        # Skip table references and aliases
-        table_refs = set()
-        table_match = re.search(r'FROM\s+([\w,`"\s]+)(?:\s+WHERE|\s+GROUP|\s+ORDER|\s+HAVING|\s+LIMIT|$)', 
-                              remaining_query, re.IGNORECASE)
-        if table_match:
-            tables_part = table_match.group(1)
-            # Extract table names and aliases
-            for table_ref in re.findall(r'([\w`"]+)(?:\s+AS\s+([\w`"]+))?', tables_part):
-                table_refs.update(r.strip('`"') for r in table_ref if r)
-        
-        # Find column references in various clauses
-        for part in re.split(r'WHERE|GROUP BY|ORDER BY|HAVING|LIMIT', remaining_query, flags=re.IGNORECASE):
-            if not part.strip():
-                continue
-            
-            # Find potential column references (words that might be columns)
-            for word in re.findall(r'\b([a-zA-Z_][a-zA-Z0-9_]*)\b', part):
-                word_upper = word.upper()
-                if (word_upper not in sql_keywords and 
-                    not word.isdigit() and 
-                    word not in table_refs and
-                    not word.startswith(('"', "'", "`"))):
-                    column_refs.add(word)
-        
-        # Check for unknown columns
-        unknown_columns = column_refs - schema_columns
-        #if unknown_columns:
-            #raise ValueError(f"Generated SQL references unknown columns: {', '.join(unknown_columns)}")
+        # Same answer, index-friendly form: sargable date ranges, default LIMIT, redundant subqueries removed
+        executed_sql, rewrites, rollup_route = sql_query, [], None
+        if SQL_REWRITE_CONFIG['enabled']:
+            with trace.span('sql_rewrite') as span:
+                executed_sql, rewrites = rewrite_sql(sql_query, date_columns=SQL_REWRITE_CONFIG['date_columns'],
+                                                     default_limit=SQL_REWRITE_CONFIG['default_limit'],
+                                                     tree=validated.tree)
+                span['rules'] = [r['rule'] for r in rewrites]
+
+        # Answer eligible raw-table aggregates from the matching daily/hourly/monthly rollup
+        if rollup_manager is not None:
+            with trace.span('rollup_route') as span:
+                executed_sql, rollup_route = rollup_manager.route(executed_sql)
+                span['table'] = rollup_route['table'] if rollup_route else None
+
+        with trace.span('db_execute_query') as span:
+            explain = random.random() < INDEX_ADVISOR_CONFIG['explain_sample_rate']
+            span['explained'] = explain
+            results = db_execute_query(executed_sql, columnar=columnar, explain=explain,
+                                       cancel_token=cancel_token)
+            # A timeout or cancellation is not the rewrite's fault; re-running would only repeat it
+            if executed_sql != sql_query and not results.get("success") \
+                    and not results.get("timed_out") and not results.get("cancelled"):
+                logger.warning(f"Rewritten query failed, falling back to the generated SQL: {results.get('error')}")
+                executed_sql, rewrites, rollup_route = sql_query, [], None
+                results = db_execute_query(sql_query, columnar=columnar, explain=explain,
+                                           cancel_token=cancel_token)
+            span['rows'] = results.get("row_count", 0)
+            span['success'] = results.get("success", False)
+        if rollup_route:
+            ROLLUP_ROUTES.inc(grain=rollup_route['grain'])
+        progress('rows_fetched', success=results.get("success", False), row_count=results.get("row_count", 0))
 
-        results = db_execute_query(sql_query)
+        # Only remember SQL that MySQL actually accepted
+        if sql_cache is not None and not sql_cached and results.get("success"):
+            with trace.span('sql_cache_store'):
+                sql_cache.put(cache_key, natural_query, sql_query, LLM_CONFIG['model_name'])
         
+        # Typed column arrays are for the graph path only; keep them out of the JSON response
+        column_arrays = results.pop('column_arrays', None)
+        kinds = results.pop('column_kinds', None)
+
         # Generate graph if data is suitable
         graph_data = None
-        if results.get("success") and results.get("rows"):
-            graph_config = detect_graph_type(results['columns'], results['rows'])
-            if graph_config:
-                graph_data = generate_graph(results['columns'], results['rows'], graph_config)
+        graph_id = None
+        graph_config = None
+        series = None
+        if graph_mode != 'none' and results.get("success") and results.get("row_count"):
+            with trace.span('detect_graph_type') as span:
+                graph_config = detect_graph_type(results['columns'], column_arrays)
+                span['graph_type'] = graph_config['type'] if graph_config else None
+            if graph_config and graph_mode == 'data':
+                with trace.span('chart_data') as span:
+                    series = chart_data(results['columns'], column_arrays, graph_config,
+                                        chart_points or CHART_DATA_CONFIG['default_points'])
+                    span['points'] = series['points'] if series else 0
+                progress('graph_ready', graph_type=graph_config['type'], rendered=False)
+            elif graph_config:
+                with trace.span('generate_graph') as span:
+                    graph_id, png, span['cached'] = render_graph(results['columns'], column_arrays, graph_config)
+                    graph_data = base64.b64encode(png).decode('utf-8') if png else None
+                    span['rendered'] = graph_data is not None
+                progress('graph_ready', graph_type=graph_config['type'], rendered=graph_data is not None)
         
-        # Cache results for CSV export if requested
+        # Cache results for CSV export if requested (and for the lazy image endpoint in data mode)
         csv_id = None
-        if return_csv_id and results.get("success") and results.get("rows"):
-            csv_id = f"query_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            query_results_cache[csv_id] = {
-                'columns': results['columns'],
-                'rows': results['rows'],
-                'natural_query': natural_query,
-                'sql_query': sql_query,
-                'timestamp': datetime.now(),
-                'graph_data': graph_data
-            }
+        if (return_csv_id or series) and results.get("success") and results.get("row_count"):
+            csv_id = f"query_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+            with trace.span('cache_results', rows=results['row_count']):
+                query_results_cache.put(
+                    csv_id,
+                    results['columns'],
+                    None if columnar else results['rows'],
+                    column_arrays=column_arrays if columnar else None,
+                    column_kinds=kinds,
+                    graph_config=graph_config,
+                    graph_id=graph_id if graph_data else None,
+                    natural_query=natural_query,
+                    sql_query=executed_sql,
+                    timestamp=datetime.now()
+                )
         
-        result = {"natural_query": natural_query, "generated_sql": sql_query, "results": results}
+        if columnar and column_arrays is not None:
+            # Column-oriented JSON: one list per column instead of a list of row tuples
+            with trace.span('serialize_columns'):
+                results['data'] = {name: column_to_json(array, kind)
+                                   for name, array, kind in zip(results['columns'], column_arrays, kinds)}
+
+        result = {"natural_query": natural_query, "generated_sql": sql_query, "results": results,
+                  "sql_cached": sql_cached, "llm_metrics": llm_metrics}
+        if executed_sql != sql_query:
+            result['executed_sql'] = executed_sql
+        if rewrites:
+            result['rewrites'] = rewrites
+            limit = next((r['limit'] for r in rewrites if r['rule'] == 'default_limit'), None)
+            if limit is not None and results.get('row_count') == limit:
+                results['truncated'] = True  # The default LIMIT cut the result short
+        if rollup_route:
+            result['rollup'] = rollup_route
         if csv_id:
             result['csv_id'] = csv_id
         if graph_data:
             result['graph'] = graph_data
-            
-        return result
+            result['graph_id'] = graph_id
+            result['graph_url'] = f'/graphs/{graph_id}'
+        if series:
+            result['graph_config'] = graph_config
+            result['chart_data'] = series
+            if csv_id:
+                result['graph_url'] = f'/graph/{csv_id}'
     except Exception as e:
         logger.error(f"Query processing failed: {e}")
-        return {"natural_query": natural_query, "error": str(e), "success": False}
+        result = {"natural_query": natural_query, "error": str(e), "success": False}
+
+    result['timings'] = trace.to_dict()
+    success = results.get("success", False) and 'error' not in result
+    QUERIES.inc(status='success' if success else 'error')
+    log_query_timings(natural_query, sql_query, success, trace)
+    return result
+
+def log_query_timings(natural_query, sql_query, success, trace):
+    """Queue one structured performance entry per request on the background JSONL writer"""
+    if query_log_writer is None:
+        return
+    sql_query = sql_query or ''
+    query_log_writer.write({
+        'timestamp': datetime.fromtimestamp(trace.started_at).isoformat(),
+        'natural_query': natural_query[:100] + '...' if len(natural_query) > 100 else natural_query,
+        'sql_query': sql_query[:200] + '...' if len(sql_query) > 200 else sql_query,
+        'execution_time_seconds': round(trace.total_ms / 1000, 4),
+        'success': success,
+        'stages': trace.stages
+    })
     
 # Initialize database connection
 db_connect()
 
+if LLM_CONFIG['warmup_on_startup']:
+    threading.Thread(target=llm_warmup, name='llm-warmup', daemon=True).start()
+
+if rollup_manager is not None:
+    rollup_manager.start()
+
 app = Flask(__name__)
 CORS(app)
 
@@ -774,39 +1203,187 @@ def query():
         data = request.get_json()
         natural_query = data.get('query', '').strip()
         include_csv_id = data.get('include_csv_id', False)
+        graph_mode = data.get('graph_mode', 'image')
+        result_format = data.get('result_format', RESULT_CONFIG['default_format'])
+        chart_points = data.get('chart_points')
+        request_id = data.get('request_id')  # Lets a synchronous caller cancel via /query/cancel
         
         if not natural_query:
             return jsonify({'error': 'Query cannot be empty'}), 400
+        if graph_mode not in ('image', 'data', 'none'):
+            return jsonify({'error': "graph_mode must be 'image', 'data' or 'none'"}), 400
+        if result_format not in ('rows', 'columnar'):
+            return jsonify({'error': "result_format must be 'rows' or 'columnar'"}), 400
+        if chart_points is not None:
+            try:
+                chart_points = min(max(int(chart_points), 3), CHART_DATA_CONFIG['max_points'])
+            except (TypeError, ValueError):
+                return jsonify({'error': 'chart_points must be an integer'}), 400
+
+        if data.get('async', False):
+            job_id = uuid.uuid4().hex  # Also the job's cancel token
+            job = job_queue.submit(process_natural_query, natural_query, return_csv_id=include_csv_id,
+                                   graph_mode=graph_mode, chart_points=chart_points, result_format=result_format,
+                                   cancel_token=job_id, description=natural_query, job_id=job_id)
+            return jsonify({
+                'job_id': job.job_id,
+                'status': job.status,
+                'status_url': f'/jobs/{job.job_id}',
+                'events_url': f'/jobs/{job.job_id}/events',
+                'cancel_url': f'/jobs/{job.job_id}/cancel'
+            }), 202
             
-        result = process_natural_query(natural_query, return_csv_id=include_csv_id)
+        cancel_token = request_cancel_token(request_id) if request_id else None
+        try:
+            result = process_natural_query(natural_query, return_csv_id=include_csv_id,
+                                           graph_mode=graph_mode, chart_points=chart_points,
+                                           result_format=result_format, cancel_token=cancel_token)
+        finally:
+            query_canceller.release(cancel_token)  # Also drops a cancel that arrived after the SQL finished
         return jsonify(result)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Poll an async query job; the pipeline result is included once it has finished"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    return jsonify(job.to_dict())
+
+def request_cancel_token(request_id):
+    """Cancel token of a synchronous /query call, scoped to the client that sent it: another
+    client posting the same request_id to /query/cancel names a different token"""
+    return f"request:{request.remote_addr}:{request_id}"
+
+def cancel_job(job_id):
+    """Cancel a job and KILL its statement if it is running; returns the job or None"""
+    job = job_queue.cancel(job_id)
+    if job is not None and job.finished_at is None:
+        query_canceller.cancel(job_id)
+    return job
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def job_cancel(job_id):
+    """Cancel an async query job: a queued job never runs, a running one has its SQL killed"""
+    job = cancel_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    return jsonify(job.to_dict(include_result=False))
+
+@app.route('/query/cancel', methods=['POST'])
+def query_cancel():
+    """Cancel a synchronous /query call by the request_id it was sent with (from the same client)"""
+    request_id = (request.get_json(silent=True) or {}).get('request_id')
+    if not request_id:
+        return jsonify({'error': 'request_id is required'}), 400
+    killed = query_canceller.cancel(request_cancel_token(request_id))
+    return jsonify({'request_id': request_id, 'cancelled': True, 'killed': killed})
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Server-sent events stream of job stages, ending with the final result"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+
+    def stream():
+        last_seq = -1
+        try:
+            while True:
+                events = job_queue.wait_for_events(job, last_seq, timeout=JOB_CONFIG['sse_heartbeat_seconds'])
+                if not events:
+                    if job.finished_at is not None:
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                for event in events:
+                    last_seq = event['seq']
+                    if event['stage'] in ('done', 'failed', 'cancelled'):
+                        payload = app.json.dumps(job.to_dict())
+                    else:
+                        payload = app.json.dumps(event)
+                    yield f"id: {event['seq']}\nevent: {event['stage']}\ndata: {payload}\n\n"
+        except GeneratorExit:
+            # Client dropped the stream (noticed at the next write, so within one heartbeat)
+            if EXECUTION_CONFIG['cancel_on_disconnect'] and job.finished_at is None:
+                logger.info(f"Events client for job {job_id} disconnected; cancelling")
+                GUARDRAIL_EVENTS.inc(event='disconnect')
+                cancel_job(job_id)
+            raise
+
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
 @app.route('/export-csv/<csv_id>')
 def export_csv(csv_id):
     try:
-        if csv_id not in query_results_cache:
-            return jsonify({'error': 'CSV data not found or expired'}), 404
-        
-        cached_data = query_results_cache[csv_id]
-        columns = cached_data['columns']
-        rows = cached_data['rows']
-        
-        # Generate CSV content
-        csv_content = generate_csv_from_results(columns, rows)
-        
-        # Create response
-        response = make_response(csv_content)
-        response.headers['Content-Type'] = 'text/csv'
-        response.headers['Content-Disposition'] = f'attachment; filename=query_results_{csv_id}.csv'
-        
-        return response
+        cached_data = query_results_cache.get(csv_id)
+        if cached_data is not None:
+            rows = cached_data['rows']
+            if rows is None:
+                rows = iter_rows(cached_data['column_arrays'], cached_data.get('column_kinds'))
+            chunks = iter_csv_chunks(cached_data['columns'], rows)
+        else:
+            # Result too large to keep (or evicted): stream it straight from MySQL again
+            sql_query = query_results_cache.get_sql(csv_id)
+            if sql_query is None:
+                return jsonify({'error': 'CSV data not found or expired'}), 404
+            chunks = iter_query_csv_chunks(sql_query)
+
+        # Produce the header chunk now so query/connection errors still become a JSON 500
+        chunks = itertools.chain([next(chunks, '')], chunks)
+
+        headers = {'Content-Disposition': f'attachment; filename=query_results_{csv_id}.csv'}
+        if request.args.get('gzip', '').lower() in ('1', 'true', 'yes'):
+            chunks = gzip_chunks(chunks)
+            headers['Content-Encoding'] = 'gzip'
+
+        return Response(count_export_bytes(chunks), mimetype='text/csv', headers=headers)
         
     except Exception as e:
         logger.error(f"CSV export failed: {e}")
         return jsonify({'error': 'Failed to generate CSV file'}), 500
 
+@app.route('/graph/<csv_id>')
+def graph_image(csv_id):
+    """PNG of a cached result's graph, rendered on first request when the query used graph_mode='data'"""
+    try:
+        cached_data = query_results_cache.get(csv_id)
+        if cached_data is None:
+            return jsonify({'error': 'Result not found or expired'}), 404
+
+        graph_id = cached_data.get('graph_id')
+        png = graph_cache.get(graph_id) if graph_id else None
+        if png is None:
+            column_arrays = cached_data['column_arrays']
+            if column_arrays is None:
+                column_arrays = to_column_arrays(cached_data['rows'], len(cached_data['columns']))
+            graph_config = cached_data.get('graph_config') or detect_graph_type(cached_data['columns'], column_arrays)
+            if not graph_config:
+                return jsonify({'error': 'Result is not chartable'}), 404
+            graph_id, png, _ = render_graph(cached_data['columns'], column_arrays, graph_config)
+            if png is None:
+                return jsonify({'error': 'Failed to render graph'}), 500
+
+        return graph_response(graph_id, png, RESULT_CACHE_CONFIG['ttl_seconds'])
+    except Exception as e:
+        logger.error(f"Graph rendering failed: {e}")
+        return jsonify({'error': 'Failed to render graph'}), 500
+
+@app.route('/graphs/<graph_id>')
+def graph_by_id(graph_id):
+    """Rendered graph by content fingerprint; immutable, so clients and proxies may cache it"""
+    png = graph_cache.get(graph_id)
+    if png is None:
+        return jsonify({'error': 'Graph not found or evicted'}), 404
+    return graph_response(graph_id, png, GRAPH_CACHE_CONFIG['max_age_seconds'])
+
+@app.route('/graph-cache/stats')
+def graph_cache_stats():
+    """Hit/miss counters and occupancy of the rendered graph cache"""
+    return jsonify(graph_cache.get_stats())
+
 @app.route('/schema')
 def schema():
     try:
@@ -815,9 +1392,99 @@ def schema():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.teardown_appcontext
-def cleanup(error):
-    db_close()
+@app.route('/pool-stats')
+def pool_stats():
+    """Connection pool occupancy and checkout wait metrics"""
+    if db_pool is None:
+        return jsonify({'error': 'Connection pool not initialized'}), 503
+    return jsonify(db_pool.get_stats())
+
+@app.route('/results-cache/stats')
+def results_cache_stats():
+    """Occupancy, evictions and spill usage of the CSV export result cache"""
+    return jsonify(query_results_cache.get_stats())
+
+@app.route('/sql-cache/stats')
+def sql_cache_stats():
+    """Hit/miss counters and occupancy of the natural query -> SQL cache"""
+    if sql_cache is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(sql_cache.get_stats(), enabled=True))
+
+@app.route('/sql-cache/clear', methods=['POST'])
+def sql_cache_clear():
+    if sql_cache is None:
+        return jsonify({'enabled': False})
+    sql_cache.clear()
+    return jsonify({'success': True})
+
+@app.route('/graph-stats')
+def graph_stats():
+    """Render counts, failures and average render time of the chart renderer"""
+    return jsonify(chart_renderer.get_stats())
+
+@app.route('/guardrails/stats')
+def guardrails_stats():
+    """Execution limits in force and query cancellation counters"""
+    return jsonify(dict(query_canceller.get_stats(), config=EXECUTION_CONFIG))
+
+@app.route('/rollups/stats')
+def rollups_stats():
+    """Rollup tables, refresh watermarks and routing counters"""
+    if rollup_manager is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(rollup_manager.get_stats(), enabled=True))
+
+@app.route('/rollups/refresh', methods=['POST'])
+def rollups_refresh():
+    """Refresh the rollups now; {"full": true} rebuilds them from scratch"""
+    if rollup_manager is None:
+        return jsonify({'enabled': False})
+    data = request.get_json(silent=True) or {}
+    rollup_manager.refresh(full=bool(data.get('full', False)))
+    return jsonify(dict(rollup_manager.get_stats(), enabled=True))
+
+@app.route('/index-advisor')
+def index_advisor_report():
+    """Composite index recommendations and sargable rewrites from the access patterns of executed queries"""
+    if index_advisor is None:
+        return jsonify({'enabled': False})
+    report = dict(index_advisor.get_stats(), enabled=True)
+    patterns = index_advisor.patterns()
+    indexes = {}
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                for table in sorted({p['table'] for p in patterns}):
+                    try:
+                        indexes.update(existing_indexes(cursor, [table]))
+                    except mysql.connector.Error:
+                        continue  # Derived tables and CTE names have no indexes
+            finally:
+                cursor.close()
+    except (mysql.connector.Error, PoolTimeoutError) as e:
+        report['existing_indexes_error'] = str(e)
+    report['existing_indexes'] = indexes
+    report['recommendations'] = index_advisor.recommendations(indexes)
+    if request.args.get('patterns'):
+        report['patterns'] = patterns
+    return jsonify(report)
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus text exposition of query, LLM, SQL, cache and pool metrics"""
+    return Response(generate_latest(), content_type=METRICS_CONTENT_TYPE)
+
+atexit.register(db_close)
+atexit.register(job_queue.shutdown)
+atexit.register(chart_renderer.shutdown)
+atexit.register(query_results_cache.close)
+if rollup_manager is not None:
+    atexit.register(rollup_manager.stop)
+if query_log_writer is not None:
+    atexit.register(query_log_writer.close)
+atexit.register(llm_metrics_writer.close)
 
 if __name__ == '__main__':
     app.run(debug=True, host='localhost', port=5000)
\ No newline at end of file